@@ -0,0 +1,130 @@
+"""Batch solving of many diet profiles against the same dish catalog."""
+import pandas as pd
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from constants import DIET, VEGAN, VEGETARIAN
+from data_builder import get_catalog_data, get_problem_data
+from data_provider import get_diet_info_data
+from feasibility import InfeasibleDietError, assert_feasible
+from model import get_abstract_model
+from solver import PersistentSolver
+from solver_backends import SolverOptions
+
+# Result of a profile: its position in the profiles table, the cost of its diet (None if
+# no diet was found), the (day, meal, dish) selections of the diet and the error that
+# prevented finding it (None if it was found).
+ProfileResult = Tuple[int, Optional[float], List[Tuple[str, str, str]], Optional[str]]
+
+# Time limit of the solve of each profile [s], unless other options are given.
+DEFAULT_PROFILE_TIME_LIMIT = 60.0
+
+# Worker state: the catalog (converted once by the parent process) and a persistent
+# solver per combination of diet flags (vegetarian, vegan), since those flags define
+# which variables the model has.
+_catalog_data: Optional[Dict[str, Any]] = None
+_options: Optional[SolverOptions] = None
+_solvers: Dict[Tuple[int, int], PersistentSolver] = {}
+
+
+def solve_batch(
+        diet_profiles_df: pd.DataFrame,
+        max_workers: Optional[int] = None,
+        options: Optional[SolverOptions] = None,
+) -> Iterator[ProfileResult]:
+    """Solve many diet profiles in parallel, yielding each result as soon as it is ready.
+
+    The profiles table has one row per profile and the columns of
+    `data_provider.get_diet_info_data`. The catalog is read and converted only once.
+    Each worker builds a model the first time it sees a combination of diet flags and
+    re-solves it for the next profiles, only changing the diet information.
+
+    Each profile is solved with the options (by default, within
+    `DEFAULT_PROFILE_TIME_LIMIT`). A profile that cannot be solved (e.g. an infeasible
+    diet) yields its error, and the other profiles go on.
+    """
+    if options is None:
+        options = SolverOptions(time_limit=DEFAULT_PROFILE_TIME_LIMIT)
+    catalog_data = get_catalog_data()
+    diet_profiles = diet_profiles_df.to_dict('records')
+    with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(catalog_data, options),
+    ) as executor:
+        futures = [
+            executor.submit(_solve_profile, position, diet_info)
+            for position, diet_info in enumerate(diet_profiles)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _init_worker(catalog_data: Dict[str, Any], options: SolverOptions) -> None:
+    global _catalog_data, _options
+    _catalog_data = catalog_data
+    _options = options
+    _solvers.clear()
+
+
+def get_profile_solver(
+        solvers: Dict[Tuple[int, int], PersistentSolver],
+        catalog_data: Dict[str, Any],
+        diet_info: Dict[str, Any],
+        options: Optional[SolverOptions] = None,
+) -> PersistentSolver:
+    """Return the persistent solver of the diet flags of a profile, set to its diet
+    information. A solver is built with the options (and added to `solvers`) the first
+    time a combination of diet flags is seen."""
+    diet_flags = (int(diet_info[VEGETARIAN]), int(diet_info[VEGAN]))
+    solver = solvers.get(diet_flags)
+    if solver is None:
+        problem_data = get_problem_data(
+            diet_info_df=pd.DataFrame([diet_info]),
+            catalog_data=catalog_data,
+        )
+        concrete_model = get_abstract_model().create_instance(
+            name=DIET,
+            data=problem_data,
+        )
+        solver = solvers[diet_flags] = PersistentSolver(
+            concrete_model, tee=False, options=options
+        )
+    else:
+        solver.update_diet_info(**diet_info)
+    return solver
+
+
+def _solve_profile(position: int, diet_info: Dict[str, Any]) -> ProfileResult:
+    try:
+        assert_feasible(get_problem_data(
+            diet_info_df=pd.DataFrame([diet_info]),
+            catalog_data=_catalog_data,
+        ))
+        solver = get_profile_solver(_solvers, _catalog_data, diet_info, options=_options)
+        solver.set_options(_options)
+        solver.solve()
+    except (InfeasibleDietError, ValueError) as error:
+        return position, None, [], str(error)
+    except Exception as error:
+        # Any other failure is reported with the profile, and the batch goes on.
+        return position, None, [], f'{type(error).__name__}: {error}'
+    if not solver.solution_exists():
+        return position, None, [], (
+            f'No diet found ({solver.get_termination_condition()})'
+        )
+    return position, solver.get_cost(), solver.get_selected_dishes(), None
+
+
+# Throughput check: solves copies of the default profile with different minimum protein.
+if __name__ == '__main__':
+    base_profile = get_diet_info_data()
+    profiles_df = pd.concat([base_profile] * 16, ignore_index=True)
+    profiles_df['protein_min'] += range(len(profiles_df))
+
+    start = time.perf_counter()
+    for position, cost, _, error in solve_batch(profiles_df):
+        print(f'Profile {position}: {cost if error is None else error}')
+    elapsed = time.perf_counter() - start
+    print(f'{len(profiles_df) / elapsed:.2f} profiles/second')
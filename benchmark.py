@@ -0,0 +1,379 @@
+"""Benchmark of the pipeline on synthetic catalogs of different sizes.
+
+Each case generates a catalog (see `catalog_generator`), or uses the bundled one, and
+measures the time and memory of loading it, converting it, building the model, solving
+it and extracting the solution, as well as the end-to-end latency. Cases can be run with
+several solver backends to compare them. Results are written to a JSON file, to track
+regressions across releases.
+
+Example of usage:
+$ python benchmark.py --cases 1000x7 10000x28 --output benchmark_results.json
+$ python benchmark.py --cases bundledx7 1000x7 --solvers highs scip
+$ python benchmark.py --cases 1000x7 1000x28 1000x90 --symmetry-breaking off on
+$ python benchmark.py --cases 10000x7 50000x7 --convert-only
+$ python benchmark.py --import-budget
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from catalog_generator import generate_dishes, write_dishes
+from constants import (
+    DIET,
+    ENGINE_MATRIX,
+    ENGINE_PYOMO,
+    MODEL_VERSION,
+    PHASE_BUILD,
+    PHASE_EXTRACT,
+    PHASE_SOLVE,
+    SOLVER_AUTO,
+    SOLVER_DECOMPOSITION,
+    SOLVER_HEURISTIC,
+    SOLVER_HIGHS,
+    SOLVER_PATTERNS,
+    SOLVER_SCIP,
+)
+from data_builder import get_catalog_data, get_problem_data
+from data_converter_pyomo import dish_arrays_to_pyomo_dict, dishes_to_arrays
+from data_provider import get_dishes_data, get_meals_data, get_nutrients_data
+from model import get_abstract_model, set_symmetry_breaking
+from model_matrix import get_matrix_model
+from profiling import PhaseProfiler, get_import_time, get_model_stats
+from solver import Solver
+from solver_backends import SolverOptions, get_available_backends
+
+# Name of the cases that use the bundled catalog instead of a synthetic one.
+BUNDLED_CATALOG = 'bundled'
+# Formats in which synthetic catalogs can be written (file extensions).
+CATALOG_FORMATS = ['json', 'ndjson', 'parquet', 'arrow']
+
+# Cases (number of dishes, number of days) run by default.
+DEFAULT_CASES = [
+    (1000, 7),
+    (10000, 7),
+    (100000, 7),
+    (1000, 28),
+    (1000, 365),
+]
+
+# Maximum import time of the command line [s], which must not import the heavy
+# dependencies (see `profiling.HEAVY_MODULES`) until it needs them.
+IMPORT_TIME_BUDGET = 0.1
+
+
+def run_case(
+        num_dishes: Optional[int],
+        num_days: int,
+        engine: str = ENGINE_PYOMO,
+        solve: bool = True,
+        seed: int = 0,
+        solver_backend: str = SOLVER_AUTO,
+        catalog_format: str = 'json',
+        symmetry_breaking: bool = False,
+        time_limit: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Run the pipeline on a synthetic catalog, written in the given format (see
+    `write_dishes`), or on the bundled one if the number of dishes is None, and return
+    the measures of each phase, and the number of nodes of the search if the solver
+    reports it. With `symmetry_breaking`, the pyomo model is strengthened (see
+    `model.set_symmetry_breaking`)."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if num_dishes is None:
+            dishes_path = 'dishes_db.json'
+        else:
+            dishes_path = os.path.join(tmp_dir, f'dishes_db.{catalog_format}')
+            write_dishes(generate_dishes(num_dishes, seed=seed), dishes_path)
+
+        profiler = PhaseProfiler()
+        start = time.perf_counter()
+        catalog_data = get_catalog_data(
+            profiler=profiler,
+            dishes_path=dishes_path,
+            num_days=num_days,
+        )
+
+    problem_data = get_problem_data(catalog_data=catalog_data)
+    with profiler.phase(PHASE_BUILD):
+        if engine == ENGINE_MATRIX:
+            matrix_model = get_matrix_model(problem_data)
+            concrete_model = matrix_model.to_kernel_block()
+        else:
+            concrete_model = get_abstract_model().create_instance(
+                name=DIET,
+                data=problem_data,
+            )
+            if symmetry_breaking:
+                set_symmetry_breaking(concrete_model)
+    if engine == ENGINE_MATRIX:
+        profiler.record_model_stats({
+            'variables': matrix_model.num_variables,
+            'constraints': matrix_model.num_constraints,
+            'nonzeros': matrix_model.num_nonzeros,
+        })
+    else:
+        profiler.record_model_stats(get_model_stats(concrete_model))
+
+    backend_name = None
+    plan = None
+    nodes = None
+    if solve:
+        solver = Solver(
+            concrete_model=concrete_model,
+            tee=False,
+            backend=solver_backend,
+            options=SolverOptions(time_limit=time_limit),
+        )
+        with profiler.phase(PHASE_SOLVE):
+            solver.solve()
+        backend_name = solver.backend.name
+        nodes = solver.get_node_count()
+        profiler.record_solver_time(solver.get_solver_time())
+        if solver.solution_exists():
+            with profiler.phase(PHASE_EXTRACT):
+                plan = solver.get_plan()
+    latency = time.perf_counter() - start
+
+    return {
+        'num_dishes': num_dishes if num_dishes is not None else BUNDLED_CATALOG,
+        'num_days': num_days,
+        'engine': engine,
+        'catalog_format': catalog_format if num_dishes is not None else 'json',
+        'solver': backend_name,
+        'symmetry_breaking': symmetry_breaking,
+        'seed': seed,
+        'latency': latency,
+        'cost': plan.cost if plan is not None else None,
+        'gap': plan.gap if plan is not None else None,
+        'nodes': nodes,
+        **profiler.get_report(),
+    }
+
+
+def run_conversion_case(
+        num_dishes: int,
+        seed: int = 0,
+        repeats: int = 3,
+) -> Dict[str, Any]:
+    """Measure the conversion of a synthetic catalog: to arrays (see
+    `data_converter_pyomo.dishes_to_arrays`), and from them to the pyomo dict. Returns
+    the best wall time [s] of each step over the repeats."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dishes_path = os.path.join(tmp_dir, 'dishes_db.json')
+        write_dishes(generate_dishes(num_dishes, seed=seed), dishes_path)
+        dishes_df = get_dishes_data(dishes_path)
+    meals = get_meals_data()
+    nutrients = get_nutrients_data()
+
+    to_arrays_times = []
+    to_pyomo_dict_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        dish_arrays = dishes_to_arrays(dishes_df, meals, nutrients)
+        to_arrays_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        dish_arrays_to_pyomo_dict(dish_arrays)
+        to_pyomo_dict_times.append(time.perf_counter() - start)
+    return {
+        'num_dishes': num_dishes,
+        'seed': seed,
+        'repeats': repeats,
+        'to_arrays': min(to_arrays_times),
+        'to_pyomo_dict': min(to_pyomo_dict_times),
+    }
+
+
+def run_benchmark(
+        cases: List[Tuple[Optional[int], int]],
+        engine: str = ENGINE_PYOMO,
+        solve: bool = True,
+        seed: int = 0,
+        solver_backends: Optional[List[str]] = None,
+        catalog_format: str = 'json',
+        symmetry_breaking: Optional[List[bool]] = None,
+        time_limit: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Run all the cases, with each solver backend and each symmetry breaking setting
+    (off by default), and return them with the information of the environment.
+    Backends that are not available are skipped."""
+    if solver_backends is None:
+        solver_backends = [SOLVER_AUTO]
+    if symmetry_breaking is None:
+        symmetry_breaking = [False]
+    available_backends = get_available_backends() + [SOLVER_AUTO]
+    for solver_backend in solver_backends:
+        if solver_backend not in available_backends:
+            print(f'Skipping solver {solver_backend}, which is not available.')
+    solver_backends = [
+        solver_backend
+        for solver_backend in solver_backends
+        if solver_backend in available_backends
+    ]
+
+    results = []
+    for num_dishes, num_days in cases:
+        for solver_backend, breaks_symmetry in itertools.product(
+                solver_backends, symmetry_breaking
+        ):
+            print(
+                f'Running {num_dishes or BUNDLED_CATALOG} dishes x {num_days} days '
+                f'({engine}, {solver_backend}'
+                f'{", symmetry breaking" if breaks_symmetry else ""})...'
+            )
+            results.append(run_case(
+                num_dishes,
+                num_days,
+                engine,
+                solve,
+                seed,
+                solver_backend,
+                catalog_format,
+                breaks_symmetry,
+                time_limit,
+            ))
+    return {
+        'model_version': MODEL_VERSION,
+        'git_revision': _get_git_revision(),
+        'python_version': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cases': results,
+    }
+
+
+def check_import_budget(module: str = 'main') -> None:
+    """Raise `SystemExit` if importing the module takes longer than
+    `IMPORT_TIME_BUDGET` or imports a heavy dependency."""
+    import_time, heavy_modules = get_import_time(module)
+    print(f'Import of {module}: {import_time * 1000:.1f} ms '
+          f'(budget: {IMPORT_TIME_BUDGET * 1000:.0f} ms)')
+    if heavy_modules:
+        raise SystemExit(f'{module} imports {", ".join(heavy_modules)}')
+    if import_time > IMPORT_TIME_BUDGET:
+        raise SystemExit(f'The import of {module} exceeds the budget')
+
+
+def _get_git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_case(case: str) -> Tuple[Optional[int], int]:
+    num_dishes, num_days = case.split('x')
+    if num_dishes == BUNDLED_CATALOG:
+        return None, int(num_days)
+    return int(num_dishes), int(num_days)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the diet problem pipeline.')
+    parser.add_argument(
+        '--cases',
+        nargs='+',
+        type=_parse_case,
+        default=DEFAULT_CASES,
+        metavar='DISHESxDAYS',
+        help=f'Cases to run, e.g. 1000x7 10000x28 ({BUNDLED_CATALOG}x7 for the bundled '
+             'catalog).',
+    )
+    parser.add_argument(
+        '--engine',
+        choices=[ENGINE_PYOMO, ENGINE_MATRIX],
+        default=ENGINE_PYOMO,
+    )
+    parser.add_argument(
+        '--no-solve',
+        action='store_true',
+        help='Only load, convert and build the model.',
+    )
+    parser.add_argument(
+        '--solvers',
+        nargs='+',
+        choices=[
+            SOLVER_AUTO,
+            SOLVER_HIGHS,
+            SOLVER_SCIP,
+            SOLVER_HEURISTIC,
+            SOLVER_PATTERNS,
+            SOLVER_DECOMPOSITION,
+        ],
+        default=[SOLVER_AUTO],
+        help='Solver backends to run each case with.',
+    )
+    parser.add_argument(
+        '--catalog-format',
+        choices=CATALOG_FORMATS,
+        default='json',
+        help='Format in which the synthetic catalogs are written and loaded.',
+    )
+    parser.add_argument(
+        '--symmetry-breaking',
+        nargs='+',
+        choices=['off', 'on'],
+        default=['off'],
+        help='Symmetry breaking settings to run each case with (pyomo engine only).',
+    )
+    parser.add_argument(
+        '--time-limit',
+        type=float,
+        help='Maximum solving time of each case [s].',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument(
+        '--convert-only',
+        action='store_true',
+        help='Only measure the conversion of the catalog of each case (best of 3).',
+    )
+    parser.add_argument(
+        '--import-budget',
+        action='store_true',
+        help='Only check the import time of the command line against its budget.',
+    )
+    args = parser.parse_args()
+
+    if args.import_budget:
+        check_import_budget()
+        raise SystemExit(0)
+
+    if args.convert_only:
+        conversions = []
+        for num_dishes, _ in args.cases:
+            if num_dishes is None:
+                parser.error('--convert-only needs synthetic catalogs')
+            print(f'Converting {num_dishes} dishes...')
+            conversions.append(run_conversion_case(num_dishes, seed=args.seed))
+            print(conversions[-1])
+        with open(args.output, 'wt') as f:
+            json.dump({
+                'model_version': MODEL_VERSION,
+                'git_revision': _get_git_revision(),
+                'python_version': platform.python_version(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'conversions': conversions,
+            }, f, indent=2)
+        raise SystemExit(0)
+
+    benchmark = run_benchmark(
+        cases=args.cases,
+        engine=args.engine,
+        solve=not args.no_solve,
+        seed=args.seed,
+        solver_backends=args.solvers,
+        catalog_format=args.catalog_format,
+        symmetry_breaking=[setting == 'on' for setting in args.symmetry_breaking],
+        time_limit=args.time_limit,
+    )
+    with open(args.output, 'wt') as f:
+        json.dump(benchmark, f, indent=2)
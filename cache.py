@@ -0,0 +1,241 @@
+"""Content-addressed cache of diet solutions.
+
+Solutions are keyed on a canonical hash of the problem data (the pyomo dict built by
+`data_builder.get_problem_data`) and the model version, and stored on disk as one JSON
+file per entry. The store is bounded in size, evicting the least recently used entries.
+An index file per catalog gives its most recently used entry, for warm starts.
+
+Built models are not stored: a hit returns the diet without building the model, and
+the model of a miss differs from the cached ones in its parameters.
+
+Several processes can share a directory: an entry evicted by another process is
+skipped as if it had never been stored.
+"""
+import contextlib
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from constants import (
+    DAYS,
+    DISHES,
+    MEALS,
+    MODEL_VERSION,
+    NUTRIENT_MAX,
+    NUTRIENT_MIN,
+    NUTRIENTS,
+)
+
+# Keys of the problem data that describe the catalog (and not the diet profile).
+CATALOG_KEYS = (DAYS, MEALS, NUTRIENTS, DISHES)
+# Indexed parameters of the problem data that describe the diet profile.
+DIET_INDEXED_KEYS = (NUTRIENT_MIN, NUTRIENT_MAX)
+
+
+class CachedSolution:
+    """Optimal diet stored in the cache: its cost and (day, meal, dish) selections."""
+
+    def __init__(self, cost: float, selections: List[Tuple[str, str, str]]):
+        self.cost: float = cost
+        self.selections: List[Tuple[str, str, str]] = selections
+
+
+class SolutionCache:
+    """On-disk cache of optimal diets, with LRU eviction and hit/miss counters."""
+
+    def __init__(
+            self,
+            directory: str = './.diet_cache',
+            max_size_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.directory: str = directory
+        self.max_size_bytes: int = max_size_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get(self, problem_data: Dict[Optional[str], Any]) -> Optional[CachedSolution]:
+        """Return the cached solution of the problem, or None if it is not cached."""
+        problem_key = get_problem_key(problem_data)
+        entry = self._read_entry(problem_key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._write_index(entry['catalog_key'], problem_key)
+        return _entry_to_solution(entry)
+
+    def get_warm_start(
+            self,
+            problem_data: Dict[Optional[str], Any],
+    ) -> Optional[CachedSolution]:
+        """Return the most recently used solution of a problem with the same catalog.
+
+        It is not necessarily optimal (nor feasible) for the given problem, but it is a
+        good starting point for the solver when only the diet profile changed.
+        """
+        catalog_key = get_catalog_key(problem_data)
+        try:
+            with open(self._get_index_path(catalog_key), 'rt') as f:
+                problem_key = f.read().strip()
+        except FileNotFoundError:
+            return None
+        # The entry may have been evicted (and the older ones of the catalog with it).
+        entry = self._read_entry(problem_key, touch=False)
+        if entry is None or entry['catalog_key'] != catalog_key:
+            return None
+        return _entry_to_solution(entry)
+
+    def put(
+            self,
+            problem_data: Dict[Optional[str], Any],
+            solution: CachedSolution,
+    ) -> None:
+        """Store the optimal solution of a problem, evicting old entries if needed."""
+        catalog_key = get_catalog_key(problem_data)
+        problem_key = get_problem_key(problem_data)
+        entry = {
+            'catalog_key': catalog_key,
+            'cost': solution.cost,
+            'selections': [list(selection) for selection in solution.selections],
+        }
+        _write_atomically(self._get_path(problem_key), json.dumps(entry))
+        self._write_index(catalog_key, problem_key)
+        self._evict()
+
+    def clear(self) -> None:
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(('.json', '.catalog')):
+                _remove(os.path.join(self.directory, file_name))
+
+    def _write_index(self, catalog_key: str, problem_key: str) -> None:
+        """Record the entry of a problem as the most recently used of its catalog."""
+        _write_atomically(self._get_index_path(catalog_key), problem_key)
+
+    def _read_entry(self, problem_key: str, touch: bool = True) -> Optional[dict]:
+        path = self._get_path(problem_key)
+        try:
+            with open(path, 'rt') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        if touch:
+            # The modification time of an entry is the time of its last use.
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(path)
+        return entry
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the entries and the index files
+        fit in the size limit, and the index files of the catalogs without entries."""
+        entry_stats = self._get_stats('.json')
+        index_stats = self._get_stats('.catalog')
+        total_size = sum(size for _, size in entry_stats.values())
+        total_size += sum(size for _, size in index_stats.values())
+        problem_keys = sorted(entry_stats, key=lambda key: entry_stats[key][0])
+        for problem_key in problem_keys:
+            if total_size <= self.max_size_bytes:
+                break
+            _remove(self._get_path(problem_key))
+            total_size -= entry_stats.pop(problem_key)[1]
+
+        # The index of a catalog points to its most recently used entry: once it is
+        # evicted, so are the older ones of the catalog. (An index removed while
+        # another process stores a new entry only costs a warm start.)
+        for catalog_key in index_stats:
+            index_path = self._get_index_path(catalog_key)
+            try:
+                with open(index_path, 'rt') as f:
+                    problem_key = f.read().strip()
+            except FileNotFoundError:
+                continue
+            if problem_key not in entry_stats:
+                _remove(index_path)
+
+    def _get_stats(self, extension: str) -> Dict[str, Tuple[float, int]]:
+        """Return the modification time and size of the files with an extension, by
+        key, skipping the ones removed meanwhile."""
+        stats = {}
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(extension):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                continue
+            stats[file_name[:-len(extension)]] = (stat.st_mtime, stat.st_size)
+        return stats
+
+    def _get_path(self, problem_key: str) -> str:
+        return os.path.join(self.directory, f'{problem_key}.json')
+
+    def _get_index_path(self, catalog_key: str) -> str:
+        return os.path.join(self.directory, f'{catalog_key}.catalog')
+
+
+def get_problem_key(problem_data: Dict[Optional[str], Any]) -> str:
+    """Return the hash that identifies a problem (data and model version)."""
+    return _hash_data(problem_data[None])
+
+
+def get_catalog_key(problem_data: Dict[Optional[str], Any]) -> str:
+    """Return the hash that identifies the catalog of a problem.
+
+    The catalog is made of the sets (days, meals, nutrients and dishes) and the indexed
+    parameters, leaving out the parameters of the diet profile.
+    """
+    catalog_data = {
+        key: component
+        for key, component in problem_data[None].items()
+        if key in CATALOG_KEYS
+        or (None not in component and key not in DIET_INDEXED_KEYS)
+    }
+    return _hash_data(catalog_data)
+
+
+def _remove(path: str) -> None:
+    """Remove a file, unless another process already did."""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+def _write_atomically(path: str, content: str) -> None:
+    """Write a file and rename it, so that concurrent readers never see it partial."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wt') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _hash_data(data: Dict[str, Any]) -> str:
+    canonical_data = json.dumps(
+        [MODEL_VERSION, _to_canonical(data)],
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(canonical_data.encode()).hexdigest()
+
+
+def _to_canonical(obj: Any) -> Any:
+    """Convert pyomo data (dicts keyed by strings, tuples or None) to a JSON-friendly
+    structure that does not depend on the insertion order of dicts."""
+    if isinstance(obj, dict):
+        return sorted(
+            ([repr(key), _to_canonical(item)] for key, item in obj.items()),
+            key=lambda pair: pair[0],
+        )
+    if isinstance(obj, (list, tuple)):
+        return [_to_canonical(item) for item in obj]
+    if isinstance(obj, bool):
+        return int(obj)
+    if hasattr(obj, 'item'):
+        # NumPy scalars.
+        return _to_canonical(obj.item())
+    return obj
+
+
+def _entry_to_solution(entry: dict) -> CachedSolution:
+    return CachedSolution(
+        cost=entry['cost'],
+        selections=[tuple(selection) for selection in entry['selections']],
+    )
@@ -0,0 +1,108 @@
+"""Seeded generator of synthetic dish catalogs, with the schema of `dishes_db.json`."""
+import json
+import numpy as np
+import os
+import pandas as pd
+from typing import Any, Dict, List
+
+# Share of dishes per meal, and mean and standard deviation of their calories [kcal] and
+# cost [€], roughly following the bundled catalog.
+MEALS_PROFILE = {
+    'breakfast': {'share': 0.2, 'calories': (270, 90), 'cost': (2.2, 0.6)},
+    'lunch': {'share': 0.4, 'calories': (320, 100), 'cost': (3.2, 0.8)},
+    'dinner': {'share': 0.4, 'calories': (430, 100), 'cost': (4.3, 0.9)},
+}
+VEGETARIAN_SHARE = 0.64
+VEGAN_SHARE_OF_VEGETARIAN = 0.6
+
+# Energy of each macronutrient [kcal/g].
+KCAL_PER_GRAM = {'protein': 4, 'carbs': 4, 'fat': 9}
+
+
+def generate_dishes(num_dishes: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Generate a catalog of dishes, with the same fields as `dishes_db.json`.
+
+    The same number of dishes and seed always lead to the same catalog. Macronutrients
+    are consistent with the calories of the dish, and more protein makes it costlier.
+
+    Example of extract of output:
+    [
+        {
+            'name': 'Dish 0 (lunch)',
+            'calories': 315,
+            'meal': 'lunch',
+            'protein': 18,
+            'carbs': 35,
+            'fat': 11,
+            'vegetarian': True,
+            'vegan': False,
+            'cost': 3.4,
+        },
+        ...
+    ]
+    """
+    rng = np.random.default_rng(seed)
+    meals = list(MEALS_PROFILE)
+    meal_index = rng.choice(
+        len(meals),
+        size=num_dishes,
+        p=[MEALS_PROFILE[meal]['share'] for meal in meals],
+    )
+
+    calories_mean, calories_std = np.array(
+        [MEALS_PROFILE[meal]['calories'] for meal in meals]
+    ).T
+    calories = np.clip(
+        rng.normal(calories_mean[meal_index], calories_std[meal_index]), 100, 900
+    ).round()
+
+    # Split of the calories between protein, carbs and fat.
+    energy_split = rng.dirichlet([2, 5, 3], size=num_dishes)
+    macros = {
+        macro: (calories * energy_split[:, position] / KCAL_PER_GRAM[macro]).round()
+        for position, macro in enumerate(KCAL_PER_GRAM)
+    }
+
+    vegetarian = rng.random(num_dishes) < VEGETARIAN_SHARE
+    vegan = vegetarian & (rng.random(num_dishes) < VEGAN_SHARE_OF_VEGETARIAN)
+
+    cost_mean, cost_std = np.array([MEALS_PROFILE[meal]['cost'] for meal in meals]).T
+    protein_premium = 0.02 * (macros['protein'] - macros['protein'].mean())
+    cost = np.clip(
+        rng.normal(cost_mean[meal_index], cost_std[meal_index]) + protein_premium,
+        0.5,
+        None,
+    ).round(1)
+
+    return [
+        {
+            'name': f'Dish {position} ({meals[meal_index[position]]})',
+            'calories': int(calories[position]),
+            'meal': meals[meal_index[position]],
+            'protein': int(macros['protein'][position]),
+            'carbs': int(macros['carbs'][position]),
+            'fat': int(macros['fat'][position]),
+            'vegetarian': bool(vegetarian[position]),
+            'vegan': bool(vegan[position]),
+            'cost': float(cost[position]),
+        }
+        for position in range(num_dishes)
+    ]
+
+
+def write_dishes(dishes: List[Dict[str, Any]], path: str) -> None:
+    """Write a catalog of dishes to a file readable by `get_dishes_data`, in the format
+    given by its extension: JSON (default), newline-delimited JSON (`.ndjson`,
+    `.jsonl`), Parquet (`.parquet`) or Arrow IPC (`.arrow`, `.feather`)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.ndjson', '.jsonl'):
+        with open(path, 'wt') as f:
+            for dish in dishes:
+                f.write(json.dumps(dish) + '\n')
+    elif extension == '.parquet':
+        pd.DataFrame(dishes).to_parquet(path, index=False)
+    elif extension in ('.arrow', '.feather'):
+        pd.DataFrame(dishes).to_feather(path)
+    else:
+        with open(path, 'wt') as f:
+            json.dump(dishes, f, indent=2)
@@ -0,0 +1,442 @@
+"""Column generation over day menus, for long horizons.
+
+The days of the diet are interchangeable: they only interact through
+`constraint_maximum_selections_per_dish`. Instead of a binary per (dish, meal, day), the
+master problem has a variable per day menu (a dish for each meal meeting the daily
+nutrient bounds) with the number of days it is eaten, under the selections cap of each
+dish. Its LP relaxation is solved over a pool of menus, and new menus are priced with
+the duals of the caps: first by replacing a dish of the menus in use, and, when that
+finds none, by a single-day subproblem, until no menu improves the master problem.
+The Lagrangian bound of each subproblem is a lower bound of the optimal cost. Then, the
+master problem is solved with integer days over the menus generated (price-and-branch):
+the diet found is feasible, but not proven optimal unless the gap is closed.
+
+The menus generated are kept in a `PatternPool`, keyed by the catalog and the profile
+class (see `get_pool_key`), and reused by the next solves: only the menus that meet the
+current nutrient bounds are loaded.
+"""
+import hashlib
+import highspy
+import json
+import numpy as np
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from model_matrix import MatrixModel, get_instance_matrix_model, load_solution
+from solver_backends import SolverOptions, run_highs
+
+# Tolerance on the reduced cost of the menus and on the nutrient bounds, relative to
+# their magnitude.
+TOLERANCE = 1e-9
+# Cost per day of the artificial menu that keeps the master problem feasible, relative
+# to the most expensive menu.
+ARTIFICIAL_COST_FACTOR = 1e4
+
+
+class PatternPool:
+    """Day menus generated by column generation, kept across solves.
+
+    Menus are tuples with the dish of each meal, in the order of the meals, grouped by
+    the catalog and profile class they were generated for (see `get_pool_key`).
+
+    Example of `patterns`:
+        {'3f1c...': {('Avocado Toast', 'Lentil Soup', 'Grilled Salmon'), ...}}
+    """
+
+    def __init__(self):
+        self.patterns: Dict[str, Set[Tuple[str, ...]]] = {}
+
+    @property
+    def size(self) -> int:
+        return sum(len(patterns) for patterns in self.patterns.values())
+
+    def get(self, key: str) -> Set[Tuple[str, ...]]:
+        return self.patterns.get(key, set())
+
+    def add(self, key: str, patterns: Iterable[Tuple[str, ...]]) -> None:
+        self.patterns.setdefault(key, set()).update(patterns)
+
+
+class PatternResult:
+    """Diet found by column generation, with the lower bound of the optimal cost.
+
+    The solution has a value per column of the matrix model (None if no feasible diet
+    was found). `reused_patterns` menus came from the pool and `new_patterns` were
+    priced, in `iterations` rounds; the time is the wall time [s]. The gap is relative
+    to the cost of the diet: `(cost - lower_bound) / cost`.
+    """
+
+    def __init__(
+            self,
+            cost: Optional[float],
+            lower_bound: float,
+            solution: Optional[np.ndarray],
+            reused_patterns: int,
+            new_patterns: int,
+            iterations: int,
+            time: float,
+    ):
+        self.cost: Optional[float] = cost
+        self.lower_bound: float = lower_bound
+        self.solution: Optional[np.ndarray] = solution
+        self.reused_patterns: int = reused_patterns
+        self.new_patterns: int = new_patterns
+        self.iterations: int = iterations
+        self.time: float = time
+
+    @property
+    def gap(self) -> Optional[float]:
+        if self.cost is None:
+            return None
+        return (self.cost - self.lower_bound) / max(abs(self.cost), 1e-9)
+
+
+def get_pool_key(matrix_model: MatrixModel) -> str:
+    """Return the hash that identifies the catalog and profile class of a model: its
+    dishes, meals, nutrients, the nutrients of each dish and the admissible dishes of
+    each meal (which depend on the diet flags). The nutrient bounds, the costs, the
+    days and the selections cap are left out, since a menu stays a menu when they
+    change."""
+    columns = matrix_model.get_day_columns(0)
+    digest = hashlib.sha256(json.dumps([
+        matrix_model.dishes, matrix_model.meals, matrix_model.nutrients
+    ]).encode())
+    for array in (
+            matrix_model.nutrient_matrix,
+            matrix_model.var_dish[columns],
+            matrix_model.var_meal[columns],
+    ):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def solve_patterns(
+        matrix_model: MatrixModel,
+        pool: Optional[PatternPool] = None,
+        time_limit: Optional[float] = None,
+        mip_gap: Optional[float] = None,
+        max_iterations: int = 1000,
+) -> PatternResult:
+    """Solve the diet problem by column generation over day menus (see the module
+    docstring), starting from the menus of the pool that meet the nutrient bounds and
+    adding the new ones to it.
+
+    Pricing stops when no menu improves the master problem, after `max_iterations`
+    rounds or when the time limit is reached; the rest of the time limit is left to the
+    integer master problem, which stops at `mip_gap`.
+    """
+    start = time.perf_counter()
+    deadline = None if time_limit is None else start + time_limit
+    generation = _ColumnGeneration(matrix_model)
+    pool_key = get_pool_key(matrix_model)
+    reused_patterns = 0
+    if pool is not None:
+        reused_patterns = generation.load_patterns(pool.get(pool_key))
+
+    lower_bound = -np.inf
+    iterations = 0
+    while iterations < max_iterations:
+        iterations += 1
+        generation.solve_master()
+        if generation.price_by_swaps():
+            continue
+        day_bound, new_patterns = generation.price(_get_remaining_time(deadline))
+        if day_bound is None:
+            # No day menu meets the nutrient bounds.
+            return PatternResult(
+                None, np.inf, None, reused_patterns, 0, iterations,
+                time.perf_counter() - start,
+            )
+        lower_bound = max(lower_bound, generation.get_lagrangian_bound(day_bound))
+        if not new_patterns or _get_remaining_time(deadline) == 0:
+            break
+    num_new_patterns = len(generation.patterns) - reused_patterns
+    if pool is not None:
+        pool.add(pool_key, generation.get_pattern_dishes())
+
+    solution = generation.solve_integer_master(_get_remaining_time(deadline), mip_gap)
+    elapsed = time.perf_counter() - start
+    if solution is None:
+        return PatternResult(
+            None, lower_bound, None, reused_patterns, num_new_patterns, iterations,
+            elapsed,
+        )
+    cost = float(matrix_model.cost @ solution)
+    return PatternResult(
+        cost=cost,
+        lower_bound=min(lower_bound, cost),
+        solution=solution,
+        reused_patterns=reused_patterns,
+        new_patterns=num_new_patterns,
+        iterations=iterations,
+        time=elapsed,
+    )
+
+
+def solve_model_patterns(
+        model: Any,
+        pool: Optional[PatternPool] = None,
+        options: Optional[SolverOptions] = None,
+) -> PatternResult:
+    """Run column generation on a model built from `model.get_abstract_model` or
+    `MatrixModel.to_kernel_block`, loading the diet found into its variables."""
+    if options is None:
+        options = SolverOptions()
+    matrix_model = get_instance_matrix_model(model)
+    result = solve_patterns(
+        matrix_model,
+        pool=pool,
+        time_limit=options.time_limit,
+        mip_gap=options.mip_gap,
+    )
+    if result.solution is not None:
+        load_solution(model, matrix_model, result.solution)
+    return result
+
+
+class _ColumnGeneration:
+    """Master problem over the day menus generated so far, kept in a HiGHS instance
+    to which new menus are added as columns, and pricing subproblem of a day.
+
+    A menu is the admissible (dish, meal) pair chosen for each meal, as positions in
+    the columns of the first day of the matrix model. The rows of the master problem
+    are the number of days and the selections of each selectable dish.
+    """
+
+    def __init__(self, matrix_model: MatrixModel):
+        self.matrix_model: MatrixModel = matrix_model
+        self.num_days: int = len(matrix_model.days)
+        self.day_columns: List[np.ndarray] = [
+            matrix_model.get_day_columns(day) for day in range(self.num_days)
+        ]
+        first_columns = self.day_columns[0]
+        day_rows = matrix_model.get_day_rows(0)
+        self.pair_cost: np.ndarray = matrix_model.cost[first_columns]
+        self.pair_dish: np.ndarray = matrix_model.var_dish[first_columns]
+        self.pair_meal: np.ndarray = matrix_model.var_meal[first_columns]
+        self.day_matrix = matrix_model.matrix[day_rows][:, first_columns]
+        self.day_lower: np.ndarray = matrix_model.row_lower[day_rows]
+        self.day_upper: np.ndarray = matrix_model.row_upper[day_rows]
+        for day in range(1, self.num_days):
+            rows = matrix_model.get_day_rows(day)
+            if not (
+                    np.array_equal(matrix_model.row_lower[rows], self.day_lower)
+                    and np.array_equal(matrix_model.row_upper[rows], self.day_upper)
+                    and np.array_equal(
+                        matrix_model.cost[self.day_columns[day]], self.pair_cost
+                    )
+            ):
+                raise ValueError('Column generation needs interchangeable days.')
+        # Position of the selections row of the dish of each pair in the master.
+        self.pair_row: np.ndarray = 1 + np.searchsorted(
+            matrix_model.selectable_dishes, self.pair_dish
+        )
+        self.pair_positions: Dict[Tuple[str, str], int] = {
+            (matrix_model.dishes[dish], matrix_model.meals[meal]): pair
+            for pair, (dish, meal) in enumerate(zip(
+                self.pair_dish.tolist(), self.pair_meal.tolist()
+            ))
+        }
+        # Nutrients of each pair, and admissible pairs of each meal, to price menus by
+        # replacing dishes.
+        num_meals = len(matrix_model.meals)
+        self.pair_nutrients: np.ndarray = matrix_model.nutrient_matrix[self.pair_dish]
+        self.nutrient_lower: np.ndarray = self.day_lower[num_meals:]
+        self.nutrient_upper: np.ndarray = self.day_upper[num_meals:]
+        self.nutrient_tolerance: np.ndarray = TOLERANCE * np.maximum(
+            np.maximum(np.abs(self.nutrient_lower), np.abs(self.nutrient_upper)), 1
+        )
+        self.meal_pairs: List[np.ndarray] = [
+            np.flatnonzero(self.pair_meal == meal) for meal in range(num_meals)
+        ]
+        self.patterns: List[Tuple[int, ...]] = []
+        self._pattern_set: Set[Tuple[int, ...]] = set()
+
+        num_dish_rows = len(matrix_model.selectable_dishes)
+        selections_max = matrix_model.dish_selections_max
+        self.master = highspy.Highs()
+        self.master.setOptionValue('output_flag', False)
+        self.master.addRows(
+            1 + num_dish_rows,
+            np.concatenate([[self.num_days], np.full(num_dish_rows, -np.inf)]),
+            np.concatenate([[self.num_days], np.full(num_dish_rows, selections_max)]),
+            0, np.array([], dtype=np.int32), np.array([], dtype=np.int32),
+            np.array([]),
+        )
+        # Artificial menu, without dishes, that makes the master problem feasible
+        # until enough menus are generated.
+        most_expensive_menu = sum(
+            float(self.pair_cost[self.pair_meal == meal].max(initial=0))
+            for meal in range(len(matrix_model.meals))
+        )
+        self.master.addCol(
+            ARTIFICIAL_COST_FACTOR * (most_expensive_menu + 1), 0, highspy.kHighsInf,
+            1, np.array([0], dtype=np.int32), np.array([1.0]),
+        )
+        self.row_dual: np.ndarray = np.zeros(1 + num_dish_rows)
+
+    def load_patterns(self, pattern_dishes: Iterable[Tuple[str, ...]]) -> int:
+        """Add the menus (as the dish of each meal) that are still admissible and meet
+        the nutrient bounds. Returns the number of menus added."""
+        meals = self.matrix_model.meals
+        num_patterns = len(self.patterns)
+        for dishes in pattern_dishes:
+            pairs = tuple(
+                self.pair_positions.get(dish_meal) for dish_meal in zip(dishes, meals)
+            )
+            if None in pairs or len(pairs) != len(meals):
+                continue
+            if self._meets_nutrient_bounds(self.pair_nutrients[list(pairs)].sum(axis=0)):
+                self._add_pattern(pairs)
+        return len(self.patterns) - num_patterns
+
+    def get_pattern_dishes(self) -> List[Tuple[str, ...]]:
+        """Return the menus generated, as the dish of each meal."""
+        dishes = self.matrix_model.dishes
+        return [
+            tuple(dishes[self.pair_dish[pair]] for pair in pattern)
+            for pattern in self.patterns
+        ]
+
+    def solve_master(self) -> None:
+        """Solve the LP relaxation of the master problem, keeping its duals."""
+        self.master.run()
+        self.row_dual = np.array(self.master.getSolution().row_dual)
+
+    def price_by_swaps(self) -> int:
+        """Look for menus with a negative reduced cost by replacing the dish of a meal
+        of each menu used by the master problem, trying every admissible dish of the
+        meal at once. Returns the number of menus added.
+
+        It is much faster than `price` on big catalogs, but it does not prove that no
+        improving menu is left, nor give a lower bound.
+        """
+        day_cost = self.pair_cost - self.row_dual[self.pair_row]
+        days_per_pattern = np.array(self.master.getSolution().col_value[1:])
+        num_patterns = len(self.patterns)
+        for position in np.flatnonzero(days_per_pattern > TOLERANCE):
+            pattern = self.patterns[position]
+            activity = self.pair_nutrients[list(pattern)].sum(axis=0)
+            reduced_cost = day_cost[list(pattern)].sum() - self.row_dual[0]
+            for meal, pair in enumerate(pattern):
+                candidates = self.meal_pairs[meal]
+                candidate_activity = self.pair_nutrients[candidates] + (
+                    activity - self.pair_nutrients[pair]
+                )
+                candidate_cost = reduced_cost - day_cost[pair] + day_cost[candidates]
+                candidate_cost[~self._meets_nutrient_bounds(candidate_activity)] = np.inf
+                best = int(np.argmin(candidate_cost))
+                if candidate_cost[best] < -TOLERANCE * max(abs(reduced_cost), 1):
+                    self._add_pattern(
+                        pattern[:meal] + (int(candidates[best]),) + pattern[meal + 1:]
+                    )
+        return len(self.patterns) - num_patterns
+
+    def price(self, time_limit: Optional[float]) -> Tuple[Optional[float], int]:
+        """Look for menus with a negative reduced cost with the current duals, adding
+        every one that the search finds. Returns the lower bound of the cost of the
+        cheapest menu with the duals (None if no day menu exists) and the number of
+        menus added."""
+        day_cost = self.pair_cost - self.row_dual[self.pair_row]
+        found: List[Tuple[int, ...]] = []
+
+        def on_solution(
+                objective: float, bound: float, solution: np.ndarray, _: float
+        ) -> None:
+            if objective - self.row_dual[0] < -TOLERANCE * max(abs(objective), 1):
+                found.append(tuple(np.flatnonzero(solution > 0.5).tolist()))
+
+        highs = run_highs(
+            day_cost,
+            self.day_matrix,
+            self.day_lower,
+            self.day_upper,
+            SolverOptions(time_limit=time_limit, mip_gap=0.0),
+            on_solution=on_solution,
+        )
+        model_status = highs.getModelStatus()
+        if model_status == highspy.HighsModelStatus.kInfeasible:
+            return None, 0
+        if model_status == highspy.HighsModelStatus.kOptimal:
+            on_solution(
+                highs.getInfo().objective_function_value, 0.0,
+                np.array(highs.getSolution().col_value), 0.0,
+            )
+        num_patterns = len(self.patterns)
+        for pairs in found:
+            # Pairs in the order of the meals, as the menus of the pool.
+            self._add_pattern(tuple(sorted(pairs, key=self.pair_meal.__getitem__)))
+        return highs.getInfo().mip_dual_bound, len(self.patterns) - num_patterns
+
+    def get_lagrangian_bound(self, day_bound: float) -> float:
+        """Return the lower bound of the optimal cost given by relaxing the selections
+        caps with the current duals: every day costs at least the cheapest menu with
+        the duals (`day_bound`), and the caps give back their duals."""
+        cap_duals = self.row_dual[1:]
+        return (
+            self.num_days * day_bound
+            + self.matrix_model.dish_selections_max * float(cap_duals.sum())
+        )
+
+    def solve_integer_master(
+            self,
+            time_limit: Optional[float],
+            mip_gap: Optional[float],
+    ) -> Optional[np.ndarray]:
+        """Solve the master problem with an integer number of days per menu (without
+        the artificial menu), and return its diet as a solution of the matrix model,
+        or None if no diet was found among the menus generated."""
+        num_patterns = len(self.patterns)
+        if num_patterns == 0:
+            return None
+        master = self.master
+        master.changeColBounds(0, 0, 0)
+        master.changeColsIntegrality(
+            num_patterns,
+            np.arange(1, num_patterns + 1, dtype=np.int32),
+            np.array([highspy.HighsVarType.kInteger] * num_patterns),
+        )
+        if time_limit is not None:
+            master.setOptionValue('time_limit', float(time_limit))
+        if mip_gap is not None:
+            master.setOptionValue('mip_rel_gap', float(mip_gap))
+        master.run()
+        if master.getInfo().primal_solution_status != 2:
+            return None
+
+        days_per_pattern = np.round(master.getSolution().col_value[1:]).astype(int)
+        solution = np.zeros(self.matrix_model.num_variables)
+        day = 0
+        for pattern, num_days in zip(self.patterns, days_per_pattern.tolist()):
+            for _ in range(num_days):
+                solution[self.day_columns[day][list(pattern)]] = 1
+                day += 1
+        return solution
+
+    def _meets_nutrient_bounds(self, activity: np.ndarray) -> np.ndarray:
+        """Return whether the nutrients of menus (in the last axis) are within the
+        daily bounds."""
+        return np.all(
+            (activity >= self.nutrient_lower - self.nutrient_tolerance)
+            & (activity <= self.nutrient_upper + self.nutrient_tolerance),
+            axis=-1,
+        )
+
+    def _add_pattern(self, pairs: Tuple[int, ...]) -> None:
+        if pairs in self._pattern_set:
+            return
+        self._pattern_set.add(pairs)
+        self.patterns.append(pairs)
+        rows, counts = np.unique(self.pair_row[list(pairs)], return_counts=True)
+        self.master.addCol(
+            float(self.pair_cost[list(pairs)].sum()), 0, highspy.kHighsInf,
+            len(rows) + 1,
+            np.concatenate([[0], rows]).astype(np.int32),
+            np.concatenate([[1.0], counts]).astype(float),
+        )
+
+
+def _get_remaining_time(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return max(deadline - time.perf_counter(), 0.0)
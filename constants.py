@@ -1,24 +1,72 @@
 """Constants definition."""
 
+# Version of the model formulation. Increase it whenever the formulation changes, so
+# that cached solutions of previous versions are not reused.
+MODEL_VERSION = 2
+
 # Commmon
 DAYS = 'days'
 DIET = 'diet'
 DISHES = 'dishes'
+# Dishes data as arrays (see `data_converter_pyomo.DishArrays`), beside the pyomo dict.
+DISH_ARRAYS = 'dish_arrays'
 MEALS = 'meals'
+NUTRIENTS = 'nutrients'
+
+# Build engines
+ENGINE_MATRIX = 'matrix'
+ENGINE_PYOMO = 'pyomo'
+
+# Solver backends
+SOLVER_AUTO = 'auto'
+SOLVER_DECOMPOSITION = 'decomposition'
+SOLVER_HEURISTIC = 'heuristic'
+SOLVER_HIGHS = 'highs'
+SOLVER_PATTERNS = 'patterns'
+SOLVER_SCIP = 'scip'
+
+# Pipeline phases
+PHASE_BUILD = 'build'
+PHASE_CHECK = 'check'
+PHASE_CONVERT = 'convert'
+PHASE_DUMP = 'dump'
+PHASE_EXTRACT = 'extract'
+PHASE_LOAD = 'load'
+PHASE_PRESOLVE = 'presolve'
+PHASE_PRINT_SOLUTION = 'print_solution'
+PHASE_SOLVE = 'solve'
+
+# Status of a plan job (see `work_queue`)
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+
+# Outcomes of a price update on a live plan
+PRICE_UPDATE_BOUND = 'bound'
+PRICE_UPDATE_RESOLVED = 'resolved'
+PRICE_UPDATE_UNAFFECTED = 'unaffected'
+
+# Sparse index sets
+ADMISSIBLE_DISH_MEAL = 'admissible_dish_meal'
+ADMISSIBLE_DISHES_MEAL = 'admissible_dishes_meal'
+ADMISSIBLE_MEALS_DISH = 'admissible_meals_dish'
+
+# Separator of the meals of a dish suitable for several meals (e.g. 'lunch|dinner').
+MEAL_SEPARATOR = '|'
 
 # Parameters
-CALORIES_DISH = 'calories_dish'
 CALORIES_MAX = 'calories_max'
 CALORIES_MIN = 'calories_min'
-CARBS_DISH = 'carbs_dish'
 CARBS_MAX = 'carbs_max'
 CARBS_MIN = 'carbs_min'
 COST_DISH = 'cost_dish'
 DISH_SELECTIONS_MAX = 'dish_selections_max'
-FAT_DISH = 'fat_dish'
 FAT_MAX = 'fat_max'
 FAT_MIN = 'fat_min'
-PROTEIN_DISH = 'protein_dish'
+NUTRIENT_DISH = 'nutrient_dish'
+NUTRIENT_MAX = 'nutrient_max'
+NUTRIENT_MIN = 'nutrient_min'
 PROTEIN_MAX = 'protein_max'
 PROTEIN_MIN = 'protein_min'
 SUITABLE = 'suitable'
@@ -32,20 +80,17 @@ VEGETARIAN_DISH = 'vegetarian_dish'
 USE_DISH_MEAL_DAY = 'use_dish_meal_day'
 
 # Constraints
-CONSTRAINT_MAXIMUM_CALORIES_PER_DAY = 'constraint_maximum_calories_per_day'
-CONSTRAINT_MAXIMUM_CARBS_PER_DAY = 'constraint_maximum_carbs_per_day'
+CONSTRAINT_DAY_ORDER = 'constraint_day_order'
+CONSTRAINT_DISCARDED_DISH_MEAL = 'constraint_discarded_dish_meal'
 CONSTRAINT_MAXIMUM_DISHES_PER_MEAL = 'constraint_maximum_dishes_per_meal'
-CONSTRAINT_MAXIMUM_FAT_PER_DAY = 'constraint_maximum_fat_per_day'
-CONSTRAINT_MAXIMUM_PROTEIN_PER_DAY = 'constraint_maximum_protein_per_day'
 CONSTRAINT_MAXIMUM_SELECTIONS_PER_DISH = 'constraint_maximum_selections_per_dish'
-CONSTRAINT_MINIMUM_CALORIES_PER_DAY = 'constraint_minimum_calories_per_day'
-CONSTRAINT_MINIMUM_CARBS_PER_DAY = 'constraint_minimum_carbs_per_day'
 CONSTRAINT_MINIMUM_DISHES_PER_MEAL = 'constraint_minimum_dishes_per_meal'
-CONSTRAINT_MINIMUM_FAT_PER_DAY = 'constraint_minimum_fat_per_day'
-CONSTRAINT_MINIMUM_PROTEIN_PER_DAY = 'constraint_minimum_protein_per_day'
-CONSTRAINT_SUIT_MEAL_TYPE = 'constraint_suit_meal_type'
-CONSTRAINT_VEGETARIANISM = 'constraint_vegetarianism'
-CONSTRAINT_VEGANISM = 'constraint_veganism'
+CONSTRAINT_NUTRIENTS_PER_DAY = 'constraint_nutrients_per_day'
+CONSTRAINT_ORBIT_FIXING = 'constraint_orbit_fixing'
 
 # Objective
 OBJECTIVE_FUNCTION = 'objective_function'
+
+# Build actions
+BUILD_INDEX_SPACE = 'build_index_space'
+RELEASE_INDEX_SPACE = 'release_index_space'
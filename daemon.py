@@ -0,0 +1,231 @@
+"""Long-lived local daemon that solves diets for thin command line clients.
+
+Importing pandas, pyomo and HiGHS, reading the catalog and building the model take much
+longer than solving the model again with another diet information. The daemon does it
+once: it keeps the converted catalog and a persistent solver per combination of diet
+flags (see `batch.get_profile_solver`) in memory, and serves requests on a Unix socket.
+`python main.py --daemon SOCKET` sends its arguments to it instead of solving.
+
+Requests and responses are JSON objects, one per line. Only the standard library is
+imported at the top, so that the client starts fast.
+
+Example of usage:
+$ python daemon.py --socket /tmp/diet.sock &
+$ python main.py --daemon /tmp/diet.sock --diet-info '{"calories_max": 1200}'
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+from typing import Any, Dict, Optional
+
+# Options of `main.py` that the daemon supports, with their default value.
+DAEMON_OPTIONS = {
+    'diet_info': {},
+    'time_limit': None,
+    'mip_gap': None,
+    'output': None,
+}
+
+
+def get_daemon_request(
+        parser: argparse.ArgumentParser,
+        args: argparse.Namespace,
+) -> Dict[str, Any]:
+    """Build the request of the arguments of `main.py`, raising `ValueError` if they
+    include options that the daemon does not support.
+
+    Example of output:
+        {'diet_info': {'calories_max': 1200}, 'time_limit': None, 'mip_gap': None,
+         'output': '/home/user/plan.json'}
+    """
+    unsupported = [
+        name for name, value in vars(args).items()
+        if name not in DAEMON_OPTIONS and name != 'daemon'
+        and value != parser.get_default(name)
+    ]
+    if unsupported:
+        raise ValueError(
+            'Options not supported with --daemon: '
+            + ', '.join('--' + name.replace('_', '-') for name in unsupported)
+        )
+    request = {name: getattr(args, name) for name in DAEMON_OPTIONS}
+    if request['output'] is not None:
+        # The daemon may run in another directory.
+        request['output'] = os.path.abspath(request['output'])
+    return request
+
+
+def request_plan(socket_path: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Send a request to the daemon and return its response: the output of the solve
+    (as `main.py` prints it), the plan (see `Plan.to_dict`, None if no diet was found)
+    and the error, if any (e.g. an infeasible diet)."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        with client.makefile('rwb') as stream:
+            stream.write(json.dumps(request).encode() + b'\n')
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ConnectionError('The daemon closed the connection without a response')
+    return json.loads(line)
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """Remove the socket left at a path by a daemon that no longer runs. Raises
+    `FileExistsError` if the path is not a socket, or a daemon accepts connections on
+    it."""
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f'{socket_path} exists and is not a socket')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+        except FileNotFoundError:
+            return
+    raise FileExistsError(f'A daemon is already listening on {socket_path}')
+
+
+class DietDaemon(socketserver.UnixStreamServer):
+    """Unix socket server that solves the requests one at a time (the solvers are not
+    thread-safe), with the catalog and the models kept in memory."""
+
+    def __init__(self, socket_path: str, threads: Optional[int] = None):
+        # Imported here, so that the clients (which import this module) start fast.
+        from batch import get_profile_solver
+        from data_builder import get_catalog_data
+        from data_provider import get_diet_info_data
+        from solver_backends import SolverOptions
+
+        self._get_profile_solver = get_profile_solver
+        self.threads: Optional[int] = threads
+        self.catalog_data: Dict[str, Any] = get_catalog_data()
+        self.default_diet_info: Dict[str, Any] = get_diet_info_data().to_dict(
+            'records'
+        )[0]
+        self.solvers: Dict[Any, Any] = {}
+        # Build the model of the default diet flags before the first request.
+        self._get_profile_solver(
+            self.solvers,
+            self.catalog_data,
+            self.default_diet_info,
+            options=SolverOptions(threads=threads),
+        )
+        super().__init__(socket_path, DietRequestHandler)
+
+    def solve(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Solve a request (see `get_daemon_request`), capturing what is printed."""
+        from feasibility import InfeasibleDietError
+
+        response: Dict[str, Any] = {'output': '', 'plan': None, 'error': None}
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                response['plan'] = self._solve_plan(request)
+        except (InfeasibleDietError, ValueError) as error:
+            response['error'] = str(error)
+        except Exception as error:
+            # Any other failure (of the solver, the export...) is reported to the
+            # client, and the daemon keeps serving.
+            response['error'] = f'{type(error).__name__}: {error}'
+        response['output'] = output.getvalue()
+        return response
+
+    def _solve_plan(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        import pandas as pd
+        from data_builder import get_problem_data
+        from feasibility import assert_feasible
+        from solver_backends import SolverOptions
+
+        unknown = set(request) - set(DAEMON_OPTIONS)
+        if unknown:
+            raise ValueError(f'Unknown options: {", ".join(sorted(unknown))}')
+        request = {**DAEMON_OPTIONS, **request}
+        diet_info = dict(self.default_diet_info)
+        for name, value in request['diet_info'].items():
+            if name not in diet_info:
+                raise ValueError(f'Unknown diet information: {name}')
+            diet_info[name] = value
+
+        assert_feasible(get_problem_data(
+            diet_info_df=pd.DataFrame([diet_info]),
+            catalog_data=self.catalog_data,
+        ))
+        options = SolverOptions(
+            time_limit=request['time_limit'],
+            mip_gap=request['mip_gap'],
+            threads=self.threads,
+        )
+        solver = self._get_profile_solver(
+            self.solvers, self.catalog_data, diet_info, options=options
+        )
+        solver.set_options(options)
+        solver.solve()
+        if not solver.solution_exists():
+            print(f'No diet found ({solver.get_termination_condition()}).')
+            return None
+        plan = solver.get_plan()
+        plan.print()
+        if request['output'] is not None:
+            plan.export(request['output'])
+        return plan.to_dict()
+
+
+def _get_error_response(error: str) -> Dict[str, Any]:
+    return {'output': '', 'plan': None, 'error': error}
+
+
+class DietRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            response = self._get_response(line)
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+    def _get_response(self, line: bytes) -> Dict[str, Any]:
+        """Solve the request of a line, or return the error if it is not valid."""
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return _get_error_response(f'Invalid request: {error}')
+        if not isinstance(request, dict):
+            return _get_error_response('Invalid request: not a JSON object')
+        return self.server.solve(request)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve diet solves on a Unix socket.')
+    parser.add_argument('--socket', required=True, help='Path of the Unix socket.')
+    parser.add_argument(
+        '--threads',
+        type=int,
+        help='Maximum number of threads of the solver.',
+    )
+    args = parser.parse_args()
+
+    try:
+        remove_stale_socket(args.socket)
+    except FileExistsError as error:
+        parser.error(str(error))
+    # Stop on SIGTERM as on Ctrl+C, removing the socket.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with DietDaemon(args.socket, threads=args.threads) as daemon:
+        print(f'Listening on {args.socket}', flush=True)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(args.socket)
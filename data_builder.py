@@ -1,9 +1,19 @@
+import pandas as pd
 from typing import Any, Dict, Optional
 
-from constants import DAYS, MEALS
+from constants import (
+    DAYS,
+    DISH_ARRAYS,
+    MEALS,
+    NUTRIENTS,
+    PHASE_CONVERT,
+    PHASE_LOAD,
+    PHASE_PRESOLVE,
+)
 from data_converter_pyomo import (
     diet_info_to_pyomo_dict,
-    dishes_to_pyomo_dict,
+    dish_arrays_to_pyomo_dict,
+    dishes_to_arrays,
     unindexed_component_to_pyomo,
 )
 from data_provider import (
@@ -11,29 +21,97 @@ from data_provider import (
     get_diet_info_data,
     get_dishes_data,
     get_meals_data,
+    get_nutrients_data,
 )
+from presolve import CatalogPresolver
+from profiling import PhaseProfiler
 
 
-def get_problem_data() -> Dict[Optional[str], Any]:
-    """Build the problem data, as a pyomo dict."""
+def get_problem_data(
+        diet_info_df: Optional[pd.DataFrame] = None,
+        catalog_data: Optional[Dict[str, Any]] = None,
+        profiler: Optional[PhaseProfiler] = None,
+        presolver: Optional[CatalogPresolver] = None,
+) -> Dict[Optional[str], Any]:
+    """Build the problem data, as a pyomo dict.
 
-    days_list = get_days_data()
-    days_dict = unindexed_component_to_pyomo(key=DAYS, to_convert=days_list)
+    By default, the diet information comes from `get_diet_info_data` and the catalog is
+    read and converted. Both can be given instead, so that a catalog converted once
+    (see `get_catalog_data`) can be reused for many diet profiles.
 
-    meals_list = get_meals_data()
-    meals_dict = unindexed_component_to_pyomo(key=MEALS, to_convert=meals_list)
+    If a presolver is given, the catalog read is presolved for its diet profile (a given
+    catalog data is used as is).
 
-    dishes_df = get_dishes_data()
-    dishes_dict = dishes_to_pyomo_dict(dishes_df, meals_list)
+    The arrays of the dishes of the catalog (see `data_converter_pyomo.DishArrays`) are
+    kept beside the pyomo dict, under `DISH_ARRAYS`, for the builders that consume them
+    directly (pyomo only reads the namespace None).
+    """
+    if catalog_data is None:
+        catalog_data = get_catalog_data(profiler, presolver=presolver)
 
-    diet_info_df = get_diet_info_data()
-    diet_info_dict = diet_info_to_pyomo_dict(diet_info_df)
+    if diet_info_df is None:
+        if presolver is not None:
+            diet_info_df = presolver.diet_info_df
+        else:
+            diet_info_df = get_diet_info_data()
+    diet_info_dict = diet_info_to_pyomo_dict(
+        diet_info_df,
+        nutrients=catalog_data[NUTRIENTS][None],
+    )
 
-    return {
+    catalog_data = dict(catalog_data)
+    dish_arrays = catalog_data.pop(DISH_ARRAYS, None)
+    problem_data = {
         None: {
-            **days_dict,
-            **meals_dict,
-            **dishes_dict,
+            **catalog_data,
             **diet_info_dict,
         }
     }
+    if dish_arrays is not None:
+        problem_data[DISH_ARRAYS] = dish_arrays
+    return problem_data
+
+
+def get_catalog_data(
+        profiler: Optional[PhaseProfiler] = None,
+        dishes_path: str = 'dishes_db.json',
+        num_days: int = 7,
+        presolver: Optional[CatalogPresolver] = None,
+) -> Dict[str, Any]:
+    """Build the part of the problem data that does not depend on the diet profile
+    (days, meals, nutrients and dishes), as a pyomo dict, with the arrays of the dishes
+    under `DISH_ARRAYS`.
+
+    If a presolver is given, the dishes that cannot improve the optimal diet of its diet
+    profile are removed, so the data is only valid for that profile.
+    """
+    if profiler is None:
+        profiler = PhaseProfiler(enabled=False)
+
+    with profiler.phase(PHASE_LOAD):
+        days_list = get_days_data(num_days)
+        meals_list = get_meals_data()
+        nutrients_list = get_nutrients_data()
+        dishes_df = get_dishes_data(dishes_path)
+
+    if presolver is not None:
+        with profiler.phase(PHASE_PRESOLVE):
+            dishes_df = presolver.presolve(dishes_df, meals_list, len(days_list))
+
+    with profiler.phase(PHASE_CONVERT):
+        days_dict = unindexed_component_to_pyomo(key=DAYS, to_convert=days_list)
+        meals_dict = unindexed_component_to_pyomo(key=MEALS, to_convert=meals_list)
+        nutrients_dict = unindexed_component_to_pyomo(
+            key=NUTRIENTS,
+            to_convert=nutrients_list,
+        )
+        dish_arrays = dishes_to_arrays(dishes_df, meals_list, nutrients_list)
+        dishes_dict = dish_arrays_to_pyomo_dict(dish_arrays)
+
+    return {
+        **days_dict,
+        **meals_dict,
+        **nutrients_dict,
+        **dishes_dict,
+        DISH_ARRAYS: dish_arrays,
+    }
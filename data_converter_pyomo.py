@@ -1,18 +1,53 @@
+import itertools
+import numpy as np
 import pandas as pd
 from typing import Any, Dict, List, Optional
 
 from constants import (
-    CALORIES_DISH,
-    CARBS_DISH,
     COST_DISH,
     DISHES,
-    FAT_DISH,
-    PROTEIN_DISH,
+    MEAL_SEPARATOR,
+    NUTRIENT_DISH,
+    NUTRIENT_MAX,
+    NUTRIENT_MIN,
     SUITABLE,
     SUITABLE_MEAL,
     VEGAN_DISH,
     VEGETARIAN_DISH
 )
+from data_provider import get_nutrient_names
+
+COLUMNS_INDEXED_BY_DISH = [
+    VEGETARIAN_DISH,
+    VEGAN_DISH,
+    COST_DISH,
+]
+
+
+class DishArrays:
+    """Dishes data as arrays, with a row per dish (in the order of `dishes`).
+
+    - columns: Values of each column of `COLUMNS_INDEXED_BY_DISH`, by column name.
+    - nutrient_matrix: Amount of each nutrient of each dish (dishes x nutrients).
+    - meal_matrix: One-hot matrix of meals (dishes x meals), True if the dish is
+      suitable for the meal.
+    """
+
+    def __init__(
+            self,
+            dishes: List[str],
+            meals: List[str],
+            nutrients: List[str],
+            columns: Dict[str, np.ndarray],
+            nutrient_matrix: np.ndarray,
+            meal_matrix: np.ndarray,
+    ):
+        self.dishes: List[str] = dishes
+        self.meals: List[str] = meals
+        self.nutrients: List[str] = nutrients
+        self.columns: Dict[str, np.ndarray] = columns
+        self.nutrient_matrix: np.ndarray = nutrient_matrix
+        self.meal_matrix: np.ndarray = meal_matrix
 
 
 def unindexed_component_to_pyomo(
@@ -22,76 +57,143 @@ def unindexed_component_to_pyomo(
     return {key: {None: to_convert}}
 
 
+def get_meal_matrix(dishes_df: pd.DataFrame, meals: List[str]) -> np.ndarray:
+    """Return the one-hot matrix of meals (dishes x meals) of the dishes data.
+
+    The suitable meals of a dish are one meal, or several ones joined by
+    `MEAL_SEPARATOR` (e.g. 'lunch|dinner'). Only the distinct values are split, so the
+    cost does not grow with the number of dishes beyond an array indexing.
+    """
+    suitable_meals = pd.Categorical(dishes_df[SUITABLE_MEAL])
+    category_matrix = np.array(
+        [
+            [meal in category.split(MEAL_SEPARATOR) for meal in meals]
+            for category in suitable_meals.categories
+        ],
+        dtype=bool,
+    ).reshape(len(suitable_meals.categories), len(meals))
+    # Dishes without meal (code -1) are suitable for none.
+    category_matrix = np.vstack([category_matrix, np.zeros(len(meals), dtype=bool)])
+    return category_matrix[suitable_meals.codes]
+
+
+def get_nutrient_matrix(dishes_df: pd.DataFrame, nutrients: List[str]) -> np.ndarray:
+    """Return the amount of each nutrient of each dish (dishes x nutrients)."""
+    return dishes_df[
+        [get_nutrient_names(nutrient)[0] for nutrient in nutrients]
+    ].to_numpy(dtype=float).reshape(len(dishes_df), len(nutrients))
+
+
+def dishes_to_arrays(
+        dishes_df: pd.DataFrame,
+        meals: List[str],
+        nutrients: List[str],
+) -> DishArrays:
+    """Convert dishes data to arrays, in a single pass over its columns."""
+    return DishArrays(
+        dishes=dishes_df.index.tolist(),
+        meals=list(meals),
+        nutrients=list(nutrients),
+        columns={
+            param_name: dishes_df[param_name].to_numpy()
+            for param_name in COLUMNS_INDEXED_BY_DISH
+        },
+        nutrient_matrix=get_nutrient_matrix(dishes_df, nutrients),
+        meal_matrix=get_meal_matrix(dishes_df, meals),
+    )
+
+
 def dishes_to_pyomo_dict(
         dishes_df: pd.DataFrame,
-        meals: List[str]
+        meals: List[str],
+        nutrients: List[str],
 ) -> Dict[Optional[str], Any]:
-    """Convert dishes data to a pyomo dict.
+    """Convert dishes data to a pyomo dict (see `dish_arrays_to_pyomo_dict`)."""
+    return dish_arrays_to_pyomo_dict(dishes_to_arrays(dishes_df, meals, nutrients))
+
+
+def dish_arrays_to_pyomo_dict(dish_arrays: DishArrays) -> Dict[Optional[str], Any]:
+    """Convert the arrays of the dishes to a pyomo dict, which only the pyomo model
+    needs (the matrix engine and the feasibility check consume the arrays).
+
+    Parameter 'suitable' is sparse: only the pairs (dish, meal) where the dish is
+    suitable for the meal are given (the rest default to 0).
 
     Example of extract of output:
     {
-        'calories_dish': {
-            'dish_0': 450,
-            'dish_1': 300,
+        'cost_dish': {
+            'dish_0': 4.5,
+            'dish_1': 3.0,
         },
-        'protein_dish': {
-            'dish_0': 35,
-            'dish_1': 12,
+        'nutrient_dish': {
+            ('dish_0', 'calories'): 450,
+            ('dish_0', 'protein'): 35,
+            ...
         },
         'suitable': {
-            ('dish_0', 'breakfast'): 0,
-            ('dish_0', 'lunch'): 0,
             ('dish_0', 'dinner'): 1,
-            ('dish_1', 'breakfast'): 0,
             ('dish_1', 'lunch'): 1,
-            ('dish_1', 'dinner'): 0,
         },
         ...
     }
     """
-    dishes_names = list(dishes_df.index.values)
-    dict_ = unindexed_component_to_pyomo(key=DISHES, to_convert=dishes_names)
-
-    COLUMNS_INDEXED_BY_DISH = [
-        CALORIES_DISH,
-        PROTEIN_DISH,
-        CARBS_DISH,
-        FAT_DISH,
-        VEGETARIAN_DISH,
-        VEGAN_DISH,
-        COST_DISH,
-    ]
+    dishes = dish_arrays.dishes
+    meals = dish_arrays.meals
+    dict_ = unindexed_component_to_pyomo(key=DISHES, to_convert=dishes)
     dict_.update({
-        param_name: dishes_df[param_name].to_dict()
-        for param_name in COLUMNS_INDEXED_BY_DISH
+        param_name: dict(zip(dishes, column.tolist()))
+        for param_name, column in dish_arrays.columns.items()
     })
+    dict_[NUTRIENT_DISH] = dict(zip(
+        itertools.product(dishes, dish_arrays.nutrients),
+        dish_arrays.nutrient_matrix.ravel().tolist(),
+    ))
 
-    # Parameter 'suitable' needs a special treatment.
+    pair_dish, pair_meal = np.nonzero(dish_arrays.meal_matrix)
     dict_[SUITABLE] = {
-        (dish, meal): int(dishes_df.loc[dish, SUITABLE_MEAL] == meal)
-        for dish in dishes_df.index for meal in meals
+        (dishes[dish], meals[meal]): 1
+        for dish, meal in zip(pair_dish.tolist(), pair_meal.tolist())
     }
 
     return dict_
 
 
-def diet_info_to_pyomo_dict(diet_info_df: pd.DataFrame) -> Dict[Optional[str], Any]:
+def diet_info_to_pyomo_dict(
+        diet_info_df: pd.DataFrame,
+        nutrients: List[str],
+) -> Dict[Optional[str], Any]:
     """Convert diet information to pyomo.
 
+    The daily bounds of the nutrients ('<nutrient>_min' and '<nutrient>_max') are
+    gathered in the parameters 'nutrient_min' and 'nutrient_max', indexed by nutrient.
+
     Example of extract of output:
     {
-        'calories_min': {
-            None: 250,
+        'nutrient_min': {
+            'calories': 250,
+            'protein': 100,
         },
-        'calories_max': {
-            None: 500,
+        'nutrient_max': {
+            'calories': 500,
+            'protein': 1000,
         },
-        'protein_min': {
-            None: 100,
+        'vegetarian': {
+            None: 0,
         },
         ...
     }
     """
     diet_info = diet_info_df.iloc[0]
-    dict_ = {key: {None: info} for key, info in diet_info.items()}
+    dict_ = {NUTRIENT_MIN: {}, NUTRIENT_MAX: {}}
+    bound_names = set()
+    for nutrient in nutrients:
+        _, min_name, max_name = get_nutrient_names(nutrient)
+        dict_[NUTRIENT_MIN][nutrient] = diet_info[min_name]
+        dict_[NUTRIENT_MAX][nutrient] = diet_info[max_name]
+        bound_names.update((min_name, max_name))
+    dict_.update({
+        key: {None: info}
+        for key, info in diet_info.items()
+        if key not in bound_names
+    })
     return dict_
@@ -1,21 +1,20 @@
 import json
+import os
 import pandas as pd
+from pandas.api.types import union_categoricals
 
-from typing import List
+from typing import List, Tuple
 
 from constants import (
-    CALORIES_DISH,
     CALORIES_MAX,
     CALORIES_MIN,
-    CARBS_DISH,
     CARBS_MAX,
     CARBS_MIN,
     COST_DISH,
     DISH_SELECTIONS_MAX,
-    FAT_DISH,
     FAT_MAX,
     FAT_MIN,
-    PROTEIN_DISH,
+    MEAL_SEPARATOR,
     PROTEIN_MAX,
     PROTEIN_MIN,
     SUITABLE_MEAL,
@@ -26,9 +25,66 @@ from constants import (
 )
 
 
-def get_days_data() -> List[str]:
-    """Get a list with the string that represents each day of the diet."""
-    return ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+# Nutrients bounded per day in the diet, with the field of the dishes in the catalog
+# files that gives the amount of each one. The daily bounds of a nutrient are the diet
+# information '<nutrient>_min' and '<nutrient>_max' (see `get_nutrient_names`).
+NUTRIENT_FIELDS = {
+    'calories': 'calories',
+    'protein': 'protein',
+    'carbs': 'carbs',
+    'fat': 'fat',
+}
+
+
+def get_nutrient_names(nutrient: str) -> Tuple[str, str, str]:
+    """Return the names of the dishes data column of a nutrient and of its daily lower
+    and upper bounds in the diet information.
+
+    Example of output: ('calories_dish', 'calories_min', 'calories_max')
+    """
+    return f'{nutrient}_dish', f'{nutrient}_min', f'{nutrient}_max'
+
+
+# Fields of each dish in the catalog files, with the parameter they are renamed to (the
+# name is the index of the dishes data).
+DISH_FIELDS = {
+    'name': None,
+    'meal': SUITABLE_MEAL,
+    **{
+        field: get_nutrient_names(nutrient)[0]
+        for nutrient, field in NUTRIENT_FIELDS.items()
+    },
+    'vegetarian': VEGETARIAN_DISH,
+    'vegan': VEGAN_DISH,
+    'cost': COST_DISH,
+}
+# Compact types of the dishes data. The cost is kept in double precision, since the
+# objective adds it up.
+DISH_FIELD_TYPES = {
+    SUITABLE_MEAL: 'category',
+    **{get_nutrient_names(nutrient)[0]: 'float32' for nutrient in NUTRIENT_FIELDS},
+    VEGETARIAN_DISH: 'bool',
+    VEGAN_DISH: 'bool',
+    COST_DISH: 'float64',
+}
+# Size of the blocks in which newline-delimited JSON catalogs are read [bytes].
+NDJSON_BLOCK_SIZE = 16 * 1024 * 1024
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def get_days_data(num_days: int = 7) -> List[str]:
+    """Get a list with the string that represents each day of the diet.
+
+    Diets of up to a week use the names of the weekdays. Longer diets also include the
+    number of the week (e.g. 'monday_1', ..., 'sunday_1', 'monday_2', ...).
+    """
+    if num_days <= len(WEEKDAYS):
+        return WEEKDAYS[:num_days]
+    return [
+        f'{WEEKDAYS[day % len(WEEKDAYS)]}_{day // len(WEEKDAYS) + 1}'
+        for day in range(num_days)
+    ]
 
 
 def get_meals_data() -> List[str]:
@@ -36,42 +92,111 @@ def get_meals_data() -> List[str]:
     return ['breakfast', 'lunch', 'dinner']
 
 
-def get_dishes_data() -> pd.DataFrame:
-    """Get dishes data.
+def get_nutrients_data() -> List[str]:
+    """Get a list with the nutrients bounded per day in the diet (see
+    `NUTRIENT_FIELDS`)."""
+    return list(NUTRIENT_FIELDS)
+
+
+def get_dishes_data(path: str = 'dishes_db.json') -> pd.DataFrame:
+    """Get dishes data, from a file with a list of dishes.
+
+    The format is given by the extension of the file:
+    - `.json`: A JSON list of dishes (e.g. `dishes_db.json`).
+    - `.ndjson` or `.jsonl`: One JSON dish per line, read in blocks of
+      `NDJSON_BLOCK_SIZE` bytes.
+    - `.parquet`, `.arrow` or `.feather`: Columnar files, memory-mapped, from which
+      only the columns of `DISH_FIELDS` are read.
+
+    Dishes suitable for several meals give them joined with `MEAL_SEPARATOR` (e.g.
+    'lunch|dinner'), or as a list of meals in `.json` files.
 
     The return data is structured as a dataframe, where the index is the name of the
-    dish and each column represents information about the dish.
+    dish and each column represents information about the dish. Columns are downcast
+    to compact types: the meal is categorical, the flags are booleans and the nutrients
+    are 32-bit floats.
 
     Example of extract of output
-                    calories_dish  suitable_meal  protein_dish  ...
+                    suitable_meal  calories_dish  protein_dish  ...
     name
-    Dish1           250            Lunch          15            ...
-    Dish2           400            Dinner         25            ...
+    Dish1           Lunch          250            15            ...
+    Dish2           Dinner         400            25            ...
     """
-    dishes_df = _read_dishes_data()
-    dishes_df.set_index('name', inplace=True)
-    dishes_df.rename(columns={
-        'calories': CALORIES_DISH,
-        'meal': SUITABLE_MEAL,
-        'protein': PROTEIN_DISH,
-        'carbs': CARBS_DISH,
-        'fat': FAT_DISH,
-        'vegetarian': VEGETARIAN_DISH,
-        'vegan': VEGAN_DISH,
-        'cost': COST_DISH,
-    }, inplace=True)
-    # dishes_df[VEGETARIAN_DISH] = dishes_df[VEGETARIAN_DISH].astype(int)
-    # dishes_df[VEGAN_DISH] = dishes_df[VEGAN_DISH].astype(int)
-    return dishes_df
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.ndjson', '.jsonl'):
+        return _read_dishes_ndjson(path)
+    if extension in ('.parquet', '.arrow', '.feather'):
+        return _read_dishes_columnar(path)
+    return _to_dishes_df(_read_dishes_data(path))
 
 
-def _read_dishes_data() -> pd.DataFrame:
-    with open('dishes_db.json', 'r') as file:
+def _read_dishes_data(path: str) -> pd.DataFrame:
+    with open(path, 'r') as file:
         data = json.load(file)
     dishes_df = pd.DataFrame(data)
     return dishes_df
 
 
+def _read_dishes_ndjson(path: str) -> pd.DataFrame:
+    """Read a newline-delimited JSON catalog as a stream of blocks of about
+    `NDJSON_BLOCK_SIZE` bytes, downcasting each block as it is read, so that only one
+    block of raw rows is in memory at a time."""
+    import pyarrow.json as pa_json
+
+    reader = pa_json.open_json(
+        path, read_options=pa_json.ReadOptions(block_size=NDJSON_BLOCK_SIZE)
+    )
+    chunks = [
+        _to_dishes_df(batch.select(list(DISH_FIELDS)).to_pandas())
+        for batch in reader
+    ]
+    if not chunks:
+        return _to_dishes_df(pd.DataFrame(columns=list(DISH_FIELDS)))
+
+    # Chunks may have different meal categories.
+    meals = union_categoricals([chunk[SUITABLE_MEAL] for chunk in chunks])
+    dishes_df = pd.concat(chunks)
+    dishes_df[SUITABLE_MEAL] = meals
+    return dishes_df
+
+
+def _read_dishes_columnar(path: str) -> pd.DataFrame:
+    """Read a Parquet or Arrow IPC (Feather) catalog, memory-mapped, only loading the
+    columns that the model uses."""
+    import pyarrow as pa
+    import pyarrow.parquet as pa_parquet
+
+    columns = list(DISH_FIELDS)
+    if path.lower().endswith('.parquet'):
+        table = pa_parquet.read_table(path, columns=columns, memory_map=True)
+    else:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all().select(columns)
+    return _to_dishes_df(table.to_pandas())
+
+
+def _to_dishes_df(raw_dishes_df: pd.DataFrame) -> pd.DataFrame:
+    """Keep the columns of the model, renamed and downcast, indexed by dish name."""
+    raw_dishes_df = raw_dishes_df.assign(meal=_join_meals(raw_dishes_df['meal']))
+    dishes_df = pd.DataFrame({
+        param_name: raw_dishes_df[field].astype(DISH_FIELD_TYPES[param_name])
+        for field, param_name in DISH_FIELDS.items()
+        if param_name is not None
+    })
+    dishes_df.index = pd.Index(raw_dishes_df['name'].astype(str), name='name')
+    return dishes_df
+
+
+def _join_meals(meals: pd.Series) -> pd.Series:
+    """Join the lists of meals of the dishes suitable for several meals with
+    `MEAL_SEPARATOR` (e.g. ['lunch', 'dinner'] -> 'lunch|dinner')."""
+    if meals.dtype != object:
+        return meals
+    return meals.map(
+        lambda meal: meal if isinstance(meal, str) else MEAL_SEPARATOR.join(meal)
+    )
+
+
 def get_diet_info_data() -> pd.DataFrame:
     """Get diet information data.
 
@@ -0,0 +1,110 @@
+"""Debug dumps of the model, as a replacement of a full `pprint`."""
+from fnmatch import fnmatch
+from itertools import islice
+from typing import Any, List, Optional, TextIO
+
+from pyomo.core.expr.numeric_expr import SumExpression
+from pyomo.environ import Block, Constraint, Objective, Param, Set, Var, value
+
+# Entries longer than this are truncated in the dump.
+MAX_ENTRY_LENGTH = 200
+
+
+class ModelDumper:
+    """Writes a compact representation of a model, for debugging.
+
+    The dump is streamed to `path` (if given), with a summary line per component (type,
+    size, index and doc) followed by its first `sample_size` entries. Components can be
+    filtered by name with glob patterns (e.g. `['constraint_*']`). Optionally, the whole
+    model is exported in LP or MPS format (given by the extension of `export_path`).
+
+    Example of extract of output (sample_size=1):
+    use_dish_meal_day (Var): size=525, index=SetProduct_OrderedSet
+        Equals 1 if a dish is used in a meal of a day and 0 otherwise.
+        ('Avocado Toast', 'breakfast', 'monday'): value=None, bounds=(0, 1)
+    """
+
+    def __init__(
+            self,
+            path: Optional[str] = './concrete_model_dump.txt',
+            components: Optional[List[str]] = None,
+            sample_size: int = 0,
+            export_path: Optional[str] = None,
+    ):
+        self.path: Optional[str] = path
+        self.components: Optional[List[str]] = components
+        self.sample_size: int = sample_size
+        self.export_path: Optional[str] = export_path
+
+    def dump(self, model: Any) -> None:
+        """Dump the model. Models that are not pyomo blocks (e.g. kernel blocks built
+        by the matrix engine) only support the LP/MPS export."""
+        if self.path is not None and isinstance(model, Block):
+            with open(self.path, 'wt') as f:
+                for component in model.component_objects(descend_into=True):
+                    if self._is_selected(component.name):
+                        self._write_component(f, component)
+
+        if self.export_path is not None:
+            if isinstance(model, Block):
+                model.write(
+                    self.export_path,
+                    io_options={'symbolic_solver_labels': True},
+                )
+            else:
+                model.write(self.export_path, symbolic_solver_labels=True)
+
+    def _is_selected(self, name: str) -> bool:
+        if self.components is None:
+            return True
+        return any(fnmatch(name, pattern) for pattern in self.components)
+
+    def _write_component(self, f: TextIO, component: Any) -> None:
+        summary = f'{component.name} ({component.ctype.__name__}): size={len(component)}'
+        if component.is_indexed():
+            summary += f', index={component.index_set().name}'
+        f.write(summary + '\n')
+        if component.doc:
+            f.write(f'    {component.doc.strip().splitlines()[0]}\n')
+
+        if self.sample_size <= 0:
+            return
+        if component.is_indexed():
+            entries = islice(component.items(), self.sample_size)
+            for index, component_data in entries:
+                data = _format_data(component.ctype, component_data, self.sample_size)
+                entry = f'{index}: {data}'
+                f.write(f'    {_truncate(entry)}\n')
+        else:
+            entry = _format_data(component.ctype, component, self.sample_size)
+            f.write(f'    {_truncate(entry)}\n')
+
+
+def _format_data(ctype: Any, component_data: Any, sample_size: int) -> str:
+    if ctype is Var:
+        return f'value={component_data.value}, bounds={component_data.bounds}'
+    if ctype is Param:
+        return f'value={value(component_data)}'
+    if ctype is Set:
+        members = list(islice(component_data, sample_size))
+        return f'members={members}...'
+    if ctype is Constraint:
+        body = _format_expression(component_data.body, sample_size)
+        return f'{component_data.lb} <= {body} <= {component_data.ub}'
+    if ctype is Objective:
+        return _format_expression(component_data.expr, sample_size)
+    return str(component_data)
+
+
+def _format_expression(expr: Any, sample_size: int) -> str:
+    """Format an expression, only writing the first terms of sums."""
+    if isinstance(expr, SumExpression) and expr.nargs() > sample_size:
+        terms = ' + '.join(str(term) for term in islice(expr.args, sample_size))
+        return f'{terms} + ... ({expr.nargs()} terms)'
+    return str(expr)
+
+
+def _truncate(entry: str) -> str:
+    if len(entry) <= MAX_ENTRY_LENGTH:
+        return entry
+    return entry[:MAX_ENTRY_LENGTH - 3] + '...'
@@ -0,0 +1,366 @@
+"""Day decomposition of the diet problem, for long horizons.
+
+The only constraint that couples the days is `constraint_maximum_selections_per_dish`.
+It is relaxed with Lagrangian multipliers (one per dish), which splits the model into
+independent per-day subproblems, solved concurrently on a pool of workers. Multipliers
+are updated with subgradient steps. Every iteration gives a lower bound of the optimal
+cost of the full model, and the per-day plans are repaired into a feasible diet, which
+gives an upper bound.
+
+It is also a solver backend (`--solver decomposition`, see
+`solver_backends.DecompositionBackend`).
+"""
+import highspy
+import numpy as np
+import time
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse import csr_matrix
+from typing import Any, Dict, List, Optional, Tuple
+
+from model_matrix import (
+    MatrixModel,
+    get_instance_matrix_model,
+    get_matrix_model,
+    load_solution,
+)
+from solver_backends import SolverOptions, run_highs
+
+# Relative gap between the best diet and the best lower bound to stop at, by default.
+DEFAULT_GAP_TOLERANCE = 1e-3
+
+# Worker state: the model, sent once to each worker.
+_matrix_model: Optional[MatrixModel] = None
+
+
+class DecompositionResult:
+    """Best diet found by the decomposition, with the bounds of the optimal cost.
+
+    The gap is relative to the cost of the diet: `(cost - lower_bound) / cost`. The
+    optimal cost of the full model is between `lower_bound` and `cost`. The solution has
+    a value per column of the matrix model (None if no diet was found), and the time is
+    the wall time of the decomposition [s].
+    """
+
+    def __init__(
+            self,
+            cost: Optional[float],
+            lower_bound: float,
+            selections: List[Tuple[str, str, str]],
+            iterations: int,
+            solution: Optional[np.ndarray] = None,
+            time: float = 0.0,
+    ):
+        self.cost: Optional[float] = cost
+        self.lower_bound: float = lower_bound
+        self.selections: List[Tuple[str, str, str]] = selections
+        self.iterations: int = iterations
+        self.solution: Optional[np.ndarray] = solution
+        self.time: float = time
+
+    @property
+    def gap(self) -> Optional[float]:
+        if self.cost is None:
+            return None
+        return (self.cost - self.lower_bound) / max(abs(self.cost), 1e-9)
+
+
+def solve_by_days(
+        problem_data: Dict[Optional[str], Any],
+        max_iterations: int = 50,
+        gap_tolerance: float = DEFAULT_GAP_TOLERANCE,
+        step_scale: float = 1.0,
+        repair_every: int = 5,
+        max_workers: Optional[int] = None,
+) -> DecompositionResult:
+    """Solve the diet problem with a Lagrangian decomposition by days.
+
+    Stops when the relative gap between the best diet found and the best lower bound is
+    below `gap_tolerance`, or after `max_iterations` subgradient iterations. The per-day
+    plans are repaired into a feasible diet every `repair_every` iterations.
+    """
+    return solve_matrix_by_days(
+        get_matrix_model(problem_data),
+        max_iterations=max_iterations,
+        gap_tolerance=gap_tolerance,
+        step_scale=step_scale,
+        repair_every=repair_every,
+        max_workers=max_workers,
+    )
+
+
+def solve_model_by_days(
+        model: Any,
+        options: Optional[SolverOptions] = None,
+) -> DecompositionResult:
+    """Run the decomposition on a model built from `model.get_abstract_model` or
+    `MatrixModel.to_kernel_block`, within the time limit and gap of the options (and
+    with as many worker processes as their threads), loading the diet found into its
+    variables."""
+    if options is None:
+        options = SolverOptions()
+    matrix_model = get_instance_matrix_model(model)
+    result = solve_matrix_by_days(
+        matrix_model,
+        gap_tolerance=(
+            options.mip_gap if options.mip_gap is not None else DEFAULT_GAP_TOLERANCE
+        ),
+        max_workers=options.threads,
+        time_limit=options.time_limit,
+    )
+    if result.solution is not None:
+        load_solution(model, matrix_model, result.solution)
+    return result
+
+
+def solve_matrix_by_days(
+        matrix_model: MatrixModel,
+        max_iterations: int = 50,
+        gap_tolerance: float = DEFAULT_GAP_TOLERANCE,
+        step_scale: float = 1.0,
+        repair_every: int = 5,
+        max_workers: Optional[int] = None,
+        time_limit: Optional[float] = None,
+) -> DecompositionResult:
+    """Solve a matrix model with the decomposition by days (see `solve_by_days`). With
+    a time limit, the last iteration is the one that reaches it."""
+    start = time.perf_counter()
+    num_days = len(matrix_model.days)
+    num_dishes = len(matrix_model.dishes)
+    selections_max = matrix_model.dish_selections_max
+    day_columns = [matrix_model.get_day_columns(day) for day in range(num_days)]
+    # Days with the same subproblem (all of them, unless their data differs) share the
+    # same Lagrangian costs, so only one day of each group has to be solved.
+    representative_days = _get_representative_days(matrix_model)
+    unique_days = sorted(set(representative_days))
+
+    multipliers = np.zeros(num_dishes)
+    best_lower_bound = -np.inf
+    best_cost = np.inf
+    best_solution = None
+    solution = None
+    repaired = False
+    lagrangian_cost = matrix_model.cost
+
+    with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(matrix_model,),
+    ) as executor:
+        iteration = 0
+        while iteration < max_iterations:
+            iteration += 1
+            lagrangian_cost = matrix_model.cost + multipliers[matrix_model.var_dish]
+            unique_day_results = dict(zip(unique_days, executor.map(
+                _solve_day,
+                unique_days,
+                [lagrangian_cost[day_columns[day]] for day in unique_days],
+            )))
+            if any(day_result is None for day_result in unique_day_results.values()):
+                # A day is infeasible even without the selections cap.
+                return DecompositionResult(
+                    None, np.inf, [], iteration, time=time.perf_counter() - start
+                )
+            day_results = [unique_day_results[day] for day in representative_days]
+
+            solution = np.zeros(matrix_model.num_variables)
+            for columns, (_, day_solution) in zip(day_columns, day_results):
+                solution[columns] = day_solution
+            lower_bound = (
+                sum(day_bound for day_bound, _ in day_results)
+                - selections_max * multipliers.sum()
+            )
+            best_lower_bound = max(best_lower_bound, lower_bound)
+
+            # Subgradient of the relaxed selections cap.
+            selections = np.bincount(
+                matrix_model.var_dish, weights=solution, minlength=num_dishes
+            )
+            subgradient = selections - selections_max
+            subgradient[multipliers <= 0] = np.maximum(
+                subgradient[multipliers <= 0], 0
+            )
+            norm = float(subgradient @ subgradient)
+
+            # The relaxed solution respects the cap with complementary slackness when
+            # the norm is 0: it is evaluated before stopping.
+            out_of_time = (
+                time_limit is not None and time.perf_counter() - start >= time_limit
+            )
+            last_iteration = iteration == max_iterations or norm == 0 or out_of_time
+            repaired = iteration % repair_every == 0 or last_iteration
+            if repaired:
+                best_cost, best_solution = _update_incumbent(
+                    matrix_model, solution, lagrangian_cost, best_cost, best_solution
+                )
+
+            if (np.isfinite(best_cost)
+                    and best_cost - best_lower_bound <= gap_tolerance * abs(best_cost)):
+                break
+            if norm == 0 or out_of_time:
+                break
+
+            # Subgradient step (Polyak).
+            if np.isfinite(best_cost):
+                target = best_cost
+            else:
+                target = lower_bound + 0.1 * abs(lower_bound) + 1
+            step = step_scale * (target - lower_bound) / norm
+            multipliers = np.maximum(multipliers + step * subgradient, 0)
+
+    if best_solution is None and solution is not None and not repaired:
+        # The last relaxed solution is always repaired before reporting no diet.
+        best_cost, best_solution = _update_incumbent(
+            matrix_model, solution, lagrangian_cost, best_cost, best_solution
+        )
+    if best_solution is None:
+        return DecompositionResult(
+            None, best_lower_bound, [], iteration, time=time.perf_counter() - start
+        )
+    keys = matrix_model.variable_keys()
+    return DecompositionResult(
+        cost=best_cost,
+        lower_bound=min(best_lower_bound, best_cost),
+        selections=[
+            (day, meal, dish)
+            for (dish, meal, day), value in zip(keys, best_solution)
+            if value > 0.5
+        ],
+        iterations=iteration,
+        solution=best_solution,
+        time=time.perf_counter() - start,
+    )
+
+
+def _get_representative_days(matrix_model: MatrixModel) -> List[int]:
+    """Return, for each day, the first day with the same subproblem."""
+    representative_days = []
+    first_day_by_signature = {}
+    for day in range(len(matrix_model.days)):
+        columns = matrix_model.get_day_columns(day)
+        rows = matrix_model.get_day_rows(day)
+        day_matrix = matrix_model.matrix[rows][:, columns]
+        signature = b''.join(array.tobytes() for array in (
+            matrix_model.var_dish[columns],
+            matrix_model.var_meal[columns],
+            matrix_model.cost[columns],
+            day_matrix.indptr,
+            day_matrix.indices,
+            day_matrix.data,
+            matrix_model.row_lower[rows],
+            matrix_model.row_upper[rows],
+        ))
+        representative_days.append(first_day_by_signature.setdefault(signature, day))
+    return representative_days
+
+
+def _init_worker(matrix_model: MatrixModel) -> None:
+    global _matrix_model
+    _matrix_model = matrix_model
+
+
+def _solve_day(day: int, day_cost: np.ndarray) -> Optional[Tuple[float, np.ndarray]]:
+    return _solve_day_subproblem(_matrix_model, day, day_cost)
+
+
+def _solve_day_subproblem(
+        matrix_model: MatrixModel,
+        day: int,
+        day_cost: np.ndarray,
+        remaining_selections: Optional[np.ndarray] = None,
+) -> Optional[Tuple[float, np.ndarray]]:
+    """Solve the subproblem of a day, with the given cost of each variable of the day.
+
+    If the remaining selections of each dish are given, the subproblem also respects
+    them. Returns a lower bound of its optimal objective and its solution (for the
+    columns of the day), or None if it is infeasible.
+    """
+    columns = matrix_model.get_day_columns(day)
+    rows = matrix_model.get_day_rows(day)
+    row_upper = matrix_model.row_upper[rows]
+    if remaining_selections is not None:
+        num_dish_rows = len(matrix_model.selectable_dishes)
+        dish_rows = np.arange(
+            matrix_model.num_constraints - num_dish_rows, matrix_model.num_constraints
+        )
+        rows = np.concatenate([rows, dish_rows])
+        row_upper = np.concatenate([
+            row_upper, remaining_selections[matrix_model.selectable_dishes]
+        ])
+    return _solve_binary_program(
+        cost=day_cost,
+        matrix=matrix_model.matrix[rows][:, columns],
+        row_lower=matrix_model.row_lower[rows],
+        row_upper=row_upper,
+    )
+
+
+def _update_incumbent(
+        matrix_model: MatrixModel,
+        solution: np.ndarray,
+        cost: np.ndarray,
+        best_cost: float,
+        best_solution: Optional[np.ndarray],
+) -> Tuple[float, Optional[np.ndarray]]:
+    """Repair the solution of the relaxation, and return the best cost and diet among
+    the repaired one and the incumbent."""
+    feasible_solution = _repair(matrix_model, solution, cost)
+    if feasible_solution is not None:
+        feasible_cost = float(matrix_model.cost @ feasible_solution)
+        if feasible_cost < best_cost:
+            return feasible_cost, feasible_solution
+    return best_cost, best_solution
+
+
+def _repair(
+        matrix_model: MatrixModel,
+        solution: np.ndarray,
+        cost: np.ndarray,
+) -> Optional[np.ndarray]:
+    """Turn the solution of the relaxation into a feasible diet, or None if it fails.
+
+    Days are kept in order while they respect the selections cap. The days that would
+    exceed it are solved again with the selections that remain for each dish.
+    """
+    num_dishes = len(matrix_model.dishes)
+    selections = np.zeros(num_dishes)
+    repaired_solution = solution.copy()
+    for day in range(len(matrix_model.days)):
+        columns = matrix_model.get_day_columns(day)
+        day_selections = np.bincount(
+            matrix_model.var_dish[columns],
+            weights=repaired_solution[columns],
+            minlength=num_dishes,
+        )
+        if np.any(selections + day_selections > matrix_model.dish_selections_max):
+            day_result = _solve_day_subproblem(
+                matrix_model,
+                day,
+                cost[columns],
+                remaining_selections=matrix_model.dish_selections_max - selections,
+            )
+            if day_result is None:
+                return None
+            repaired_solution[columns] = day_result[1]
+            day_selections = np.bincount(
+                matrix_model.var_dish[columns],
+                weights=repaired_solution[columns],
+                minlength=num_dishes,
+            )
+        selections += day_selections
+    return repaired_solution
+
+
+def _solve_binary_program(
+        cost: np.ndarray,
+        matrix: csr_matrix,
+        row_lower: np.ndarray,
+        row_upper: np.ndarray,
+) -> Optional[Tuple[float, np.ndarray]]:
+    """Solve `min cost @ x` s.t. `row_lower <= matrix @ x <= row_upper` and x binary.
+    Returns the dual bound of the optimal objective (a valid lower bound) and the
+    solution, or None if it is infeasible."""
+    highs = run_highs(cost, matrix, row_lower, row_upper, SolverOptions(mip_gap=0.0))
+    if highs.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+        return None
+    solution = np.round(highs.getSolution().col_value)
+    return highs.getInfo().mip_dual_bound, solution
@@ -0,0 +1,290 @@
+"""Feasibility check of the diet problem, before the model is built.
+
+Each meal of a day has exactly one dish, so the amount of a nutrient in a day lies
+between the sum over the meals of the least and the most of it that an admissible dish
+of the meal has. Bound propagation tightens those ranges: a dish that cannot be part of
+any day meeting the daily nutrient bounds (with the other meals at their extremes) is
+discarded for that meal, and the ranges are computed again until nothing changes. Then,
+every set of meals needs enough admissible dishes to fill all its days without
+exceeding the maximum selections of each dish.
+
+The check is necessary but not sufficient: a diet that passes it may still be
+infeasible, but one that fails it is certainly infeasible, and the constraints involved
+are named.
+"""
+import itertools
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from constants import (
+    CONSTRAINT_MAXIMUM_DISHES_PER_MEAL,
+    CONSTRAINT_MAXIMUM_SELECTIONS_PER_DISH,
+    CONSTRAINT_MINIMUM_DISHES_PER_MEAL,
+    CONSTRAINT_NUTRIENTS_PER_DAY,
+    DAYS,
+    DISH_SELECTIONS_MAX,
+    MEALS,
+    NUTRIENT_MAX,
+    NUTRIENT_MIN,
+    NUTRIENTS,
+    VEGAN,
+    VEGETARIAN,
+)
+from model_matrix import get_dish_arrays
+
+# Tolerance on the nutrient bounds, relative to their magnitude.
+TOLERANCE = 1e-6
+
+
+class Conflict:
+    """Reason why the diet is infeasible, with the names of the constraints involved
+    (e.g. 'constraint_nutrients_per_day[protein, *]', where '*' stands for every
+    day)."""
+
+    def __init__(self, constraints: List[str], reason: str):
+        self.constraints: List[str] = constraints
+        self.reason: str = reason
+
+    def __str__(self) -> str:
+        return f'{self.reason} (constraints: {", ".join(self.constraints)})'
+
+
+class FeasibilityResult:
+    """Result of the feasibility check.
+
+    `reachable` has, for each nutrient, the least and the most of it that a day can
+    have after the propagation (None if a meal has no admissible dish left), and
+    `admissible` whether each dish is still admissible for each meal (dishes x meals, in
+    the order of the sets of the problem data).
+
+    Example of `reachable`:
+        {'calories': (620.0, 2150.0), 'protein': (21.0, 95.0), ...}
+    """
+
+    def __init__(
+            self,
+            conflicts: List[Conflict],
+            reachable: Dict[str, Optional[Tuple[float, float]]],
+            discarded_pairs: int,
+            admissible: np.ndarray,
+    ):
+        self.conflicts: List[Conflict] = conflicts
+        self.reachable: Dict[str, Optional[Tuple[float, float]]] = reachable
+        self.discarded_pairs: int = discarded_pairs
+        self.admissible: np.ndarray = admissible
+
+    @property
+    def is_feasible(self) -> bool:
+        return not self.conflicts
+
+
+class InfeasibleDietError(ValueError):
+    """The diet information cannot be met by the dish catalog."""
+
+    def __init__(self, conflicts: List[Conflict]):
+        super().__init__(
+            'The diet is infeasible:\n' + '\n'.join(f'- {c}' for c in conflicts)
+        )
+        self.conflicts: List[Conflict] = conflicts
+
+
+def check_feasibility(problem_data: Dict[Optional[str], Any]) -> FeasibilityResult:
+    """Check whether the problem data (as a pyomo dict) can be feasible, by bound
+    propagation over the admissible dishes of each meal (see the module docstring)."""
+    data = problem_data[None]
+    meals = list(data[MEALS][None])
+    nutrients = list(data[NUTRIENTS][None])
+    num_days = len(data[DAYS][None])
+    lower = np.array([data[NUTRIENT_MIN][nutrient] for nutrient in nutrients], float)
+    upper = np.array([data[NUTRIENT_MAX][nutrient] for nutrient in nutrients], float)
+    tolerance = TOLERANCE * np.maximum(np.abs(lower), np.abs(upper)).clip(min=1)
+    nutrient_matrix, _, admissible = get_dish_arrays(problem_data)
+    admissible_pairs = int(admissible.sum())
+
+    conflicts = [
+        Conflict(
+            [_get_constraint_name(CONSTRAINT_NUTRIENTS_PER_DAY, nutrient, '*')],
+            f'The minimum {nutrient} ({lower[k]:g}) is greater than the maximum '
+            f'({upper[k]:g})',
+        )
+        for k, nutrient in enumerate(nutrients)
+        if lower[k] > upper[k] + tolerance[k]
+    ]
+    for m, meal in enumerate(meals):
+        if not admissible[:, m].any():
+            conflicts.append(Conflict(
+                [_get_constraint_name(CONSTRAINT_MINIMUM_DISHES_PER_MEAL, meal, '*')],
+                f'No dish suits {meal}{_describe_diet(data)}',
+            ))
+    if conflicts:
+        return FeasibilityResult(conflicts, dict.fromkeys(nutrients), 0, admissible)
+
+    # Nutrients whose bounds discarded dishes of each meal, to explain empty meals.
+    discarded_by: List[set] = [set() for _ in meals]
+    while True:
+        meal_min, meal_max = _get_meal_ranges(nutrient_matrix, admissible)
+        day_min = meal_min.sum(axis=0)
+        day_max = meal_max.sum(axis=0)
+        conflicts = _get_nutrient_conflicts(
+            nutrients, meals, lower, upper, tolerance, day_min, day_max
+        )
+        if conflicts:
+            break
+
+        # Amount of each nutrient of a day with the dish in the meal, and the other
+        # meals at their least (most) of it: dishes x meals x nutrients.
+        with_min = (day_min - meal_min)[np.newaxis] + nutrient_matrix[:, np.newaxis]
+        with_max = (day_max - meal_max)[np.newaxis] + nutrient_matrix[:, np.newaxis]
+        too_much = with_min > upper + tolerance
+        too_little = with_max < lower - tolerance
+        discarded = admissible & (too_much | too_little).any(axis=2)
+        if not discarded.any():
+            break
+        for m in np.flatnonzero(discarded.any(axis=0)):
+            discarded_by[m].update(
+                (nutrients[k], 'max') for k in np.flatnonzero(
+                    too_much[discarded[:, m], m].any(axis=0))
+            )
+            discarded_by[m].update(
+                (nutrients[k], 'min') for k in np.flatnonzero(
+                    too_little[discarded[:, m], m].any(axis=0))
+            )
+        admissible = admissible & ~discarded
+
+        empty_meals = np.flatnonzero(~admissible.any(axis=0))
+        if len(empty_meals):
+            conflicts = [
+                _get_empty_meal_conflict(meals[m], sorted(discarded_by[m]))
+                for m in empty_meals
+            ]
+            break
+
+    reachable: Dict[str, Optional[Tuple[float, float]]] = dict.fromkeys(nutrients)
+    if admissible.any(axis=0).all():
+        meal_min, meal_max = _get_meal_ranges(nutrient_matrix, admissible)
+        for k, nutrient in enumerate(nutrients):
+            reachable[nutrient] = (
+                float(meal_min[:, k].sum()), float(meal_max[:, k].sum())
+            )
+
+    if not conflicts:
+        conflicts = _get_selection_conflicts(
+            meals, admissible, num_days, data[DISH_SELECTIONS_MAX][None]
+        )
+    return FeasibilityResult(
+        conflicts, reachable, admissible_pairs - int(admissible.sum()), admissible
+    )
+
+
+def assert_feasible(problem_data: Dict[Optional[str], Any]) -> FeasibilityResult:
+    """Check the feasibility of the problem data, raising `InfeasibleDietError` with
+    the conflicts found if it is infeasible."""
+    result = check_feasibility(problem_data)
+    if not result.is_feasible:
+        raise InfeasibleDietError(result.conflicts)
+    return result
+
+
+def _get_meal_ranges(
+        nutrient_matrix: np.ndarray,
+        admissible: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the least and the most of each nutrient among the admissible dishes of
+    each meal (meals x nutrients)."""
+    mask = admissible.T[:, :, np.newaxis]
+    values = nutrient_matrix[np.newaxis]
+    meal_min = np.where(mask, values, np.inf).min(axis=1)
+    meal_max = np.where(mask, values, -np.inf).max(axis=1)
+    return meal_min, meal_max
+
+
+def _get_nutrient_conflicts(
+        nutrients: List[str],
+        meals: List[str],
+        lower: np.ndarray,
+        upper: np.ndarray,
+        tolerance: np.ndarray,
+        day_min: np.ndarray,
+        day_max: np.ndarray,
+) -> List[Conflict]:
+    conflicts = []
+    for k, nutrient in enumerate(nutrients):
+        if day_max[k] < lower[k] - tolerance[k]:
+            conflicts.append(Conflict(
+                [
+                    _get_constraint_name(CONSTRAINT_NUTRIENTS_PER_DAY, nutrient, '*'),
+                    _get_constraint_name(CONSTRAINT_MAXIMUM_DISHES_PER_MEAL, '*', '*'),
+                ],
+                f'The minimum {nutrient} per day ({lower[k]:g}) cannot be reached with '
+                f'one dish per meal ({len(meals)} meals): at most {day_max[k]:g}',
+            ))
+        if day_min[k] > upper[k] + tolerance[k]:
+            conflicts.append(Conflict(
+                [
+                    _get_constraint_name(CONSTRAINT_NUTRIENTS_PER_DAY, nutrient, '*'),
+                    _get_constraint_name(CONSTRAINT_MINIMUM_DISHES_PER_MEAL, '*', '*'),
+                ],
+                f'The maximum {nutrient} per day ({upper[k]:g}) is exceeded by any '
+                f'diet with one dish per meal ({len(meals)} meals): at least '
+                f'{day_min[k]:g}',
+            ))
+    return conflicts
+
+
+def _get_empty_meal_conflict(meal: str, bounds: List[Tuple[str, str]]) -> Conflict:
+    nutrients = sorted({nutrient for nutrient, _ in bounds})
+    return Conflict(
+        [_get_constraint_name(CONSTRAINT_MINIMUM_DISHES_PER_MEAL, meal, '*')] + [
+            _get_constraint_name(CONSTRAINT_NUTRIENTS_PER_DAY, nutrient, '*')
+            for nutrient in nutrients
+        ],
+        f'No dish for {meal} fits in a day within the bounds of '
+        + ', '.join(f'{nutrient} {bound}' for nutrient, bound in bounds),
+    )
+
+
+def _get_selection_conflicts(
+        meals: List[str],
+        admissible: np.ndarray,
+        num_days: int,
+        dish_selections_max: int,
+) -> List[Conflict]:
+    """Return a conflict if some set of meals has not enough admissible dishes to fill
+    all its days, given the maximum selections per dish (only the smallest such sets
+    are reported)."""
+    conflicts = []
+    short_sets: List[Tuple[int, ...]] = []
+    for size in range(1, len(meals) + 1):
+        for meal_set in itertools.combinations(range(len(meals)), size):
+            if any(set(short).issubset(meal_set) for short in short_sets):
+                continue
+            num_dishes = int(admissible[:, list(meal_set)].any(axis=1).sum())
+            needed = len(meal_set) * num_days
+            if num_dishes * dish_selections_max >= needed:
+                continue
+            short_sets.append(meal_set)
+            names = [meals[m] for m in meal_set]
+            conflicts.append(Conflict(
+                [_get_constraint_name(CONSTRAINT_MAXIMUM_SELECTIONS_PER_DISH, '*')] + [
+                    _get_constraint_name(CONSTRAINT_MINIMUM_DISHES_PER_MEAL, meal, '*')
+                    for meal in names
+                ],
+                f'{num_days} days of {" and ".join(names)} need {needed} dishes, but '
+                f'only {num_dishes} dishes fit and each can be selected at most '
+                f'{dish_selections_max} time{"s" if dish_selections_max != 1 else ""}',
+            ))
+    return conflicts
+
+
+def _get_constraint_name(constraint: str, *index: str) -> str:
+    """Return the name of some constraints, where '*' stands for any value of an index
+    (e.g. 'constraint_nutrients_per_day[protein, *]')."""
+    return f'{constraint}[{", ".join(index)}]'
+
+
+def _describe_diet(data: Dict[str, Any]) -> str:
+    if data[VEGAN][None]:
+        return ' in a vegan diet'
+    if data[VEGETARIAN][None]:
+        return ' in a vegetarian diet'
+    return ''
@@ -0,0 +1,397 @@
+"""Fast heuristic for the diet problem: LP-relaxation rounding and local search.
+
+The LP relaxation of the model gives a lower bound of the optimal cost, and its
+solution suggests a dish for each meal of each day. Those dishes are rounded into a
+diet, which is then improved by local search: the dish of a meal of a day is replaced
+by another one while it reduces the violation of the constraints or, once the diet is
+feasible, its cost. The diet found is feasible but not necessarily optimal; the gap
+with the LP bound tells how far from the optimum it can be.
+"""
+import highspy
+import numpy as np
+import time
+from typing import Any, List, Optional, Tuple
+
+from model_matrix import MatrixModel, get_instance_matrix_model, load_solution
+from solver_backends import SolverOptions, run_highs
+
+# Tolerance on the violation of the constraints and on the cost improvements.
+TOLERANCE = 1e-9
+# Number of cheapest dishes of each meal tried when replacing the dishes of two meals
+# of the same day at once.
+PAIR_CANDIDATES = 20
+
+
+class HeuristicResult:
+    """Diet found by the heuristic, with the LP lower bound of the optimal cost.
+
+    The solution has a value per column of the matrix model (None if no feasible diet
+    was found), and the time is the wall time of the heuristic [s]. The gap is relative
+    to the cost of the diet: `(cost - lower_bound) / cost`.
+    """
+
+    def __init__(
+            self,
+            cost: Optional[float],
+            lower_bound: float,
+            solution: Optional[np.ndarray],
+            moves: int,
+            time: float,
+    ):
+        self.cost: Optional[float] = cost
+        self.lower_bound: float = lower_bound
+        self.solution: Optional[np.ndarray] = solution
+        self.moves: int = moves
+        self.time: float = time
+
+    @property
+    def gap(self) -> Optional[float]:
+        if self.cost is None:
+            return None
+        return (self.cost - self.lower_bound) / max(abs(self.cost), 1e-9)
+
+
+def solve_heuristic(
+        matrix_model: MatrixModel,
+        time_limit: Optional[float] = None,
+        max_passes: int = 100,
+) -> HeuristicResult:
+    """Find a feasible diet by rounding the LP relaxation and local search.
+
+    The local search stops when a pass over all the meals of all the days does not
+    improve the diet, after `max_passes` passes, or when the time limit is reached.
+    """
+    start = time.perf_counter()
+    highs = run_highs(
+        cost=matrix_model.cost,
+        matrix=matrix_model.matrix,
+        row_lower=matrix_model.row_lower,
+        row_upper=matrix_model.row_upper,
+        options=SolverOptions(time_limit=time_limit),
+        integer=False,
+    )
+    model_status = highs.getModelStatus()
+    if model_status == highspy.HighsModelStatus.kInfeasible:
+        return HeuristicResult(None, np.inf, None, 0, time.perf_counter() - start)
+    if model_status == highspy.HighsModelStatus.kOptimal:
+        lower_bound = highs.getInfo().objective_function_value
+    else:
+        lower_bound = -np.inf
+    lp_solution = np.array(highs.getSolution().col_value)
+    if len(lp_solution) != matrix_model.num_variables:
+        return HeuristicResult(None, lower_bound, None, 0, time.perf_counter() - start)
+
+    deadline = None if time_limit is None else start + time_limit
+    local_search = _LocalSearch(matrix_model)
+    if not local_search.round(lp_solution):
+        return HeuristicResult(None, lower_bound, None, 0, time.perf_counter() - start)
+    local_search.run(max_passes, deadline)
+    # The running violation is only updated by the moves: check the diet itself.
+    if local_search.get_violation() > TOLERANCE:
+        return HeuristicResult(
+            None, lower_bound, None, local_search.moves, time.perf_counter() - start
+        )
+
+    solution = np.zeros(matrix_model.num_variables)
+    solution[local_search.choice] = 1
+    cost = float(matrix_model.cost @ solution)
+    return HeuristicResult(
+        cost=cost,
+        lower_bound=min(lower_bound, cost),
+        solution=solution,
+        moves=local_search.moves,
+        time=time.perf_counter() - start,
+    )
+
+
+def solve_model_heuristic(
+        model: Any,
+        time_limit: Optional[float] = None,
+) -> HeuristicResult:
+    """Run the heuristic on a model built from `model.get_abstract_model` or
+    `MatrixModel.to_kernel_block`, loading the diet found into its variables."""
+    matrix_model = get_instance_matrix_model(model)
+    result = solve_heuristic(matrix_model, time_limit=time_limit)
+    if result.solution is not None:
+        load_solution(model, matrix_model, result.solution)
+    return result
+
+
+class _LocalSearch:
+    """Diet as the column chosen for each (meal, day) slot, with the totals needed to
+    evaluate the replacement of the dish of a slot in a single vectorized step."""
+
+    def __init__(self, matrix_model: MatrixModel):
+        self.matrix_model: MatrixModel = matrix_model
+        num_days = len(matrix_model.days)
+        num_meals = len(matrix_model.meals)
+        num_nutrients = len(matrix_model.nutrients)
+        self.num_slots: int = num_meals * num_days
+
+        # Columns of each slot, in the same order as the rows of dishes per meal.
+        column_slots = matrix_model.var_meal * num_days + matrix_model.var_day
+        self.slot_columns: List[np.ndarray] = np.split(
+            np.argsort(column_slots, kind='stable'),
+            np.cumsum(np.bincount(column_slots, minlength=self.num_slots))[:-1],
+        )
+        self.slot_day: np.ndarray = np.arange(self.num_slots) % num_days
+        self.slot_candidates: List[np.ndarray] = [
+            columns[np.argsort(matrix_model.cost[columns], kind='stable')][
+                :PAIR_CANDIDATES
+            ]
+            for columns in self.slot_columns
+        ]
+        # Pairs of slots of the same day (slots are sorted by meal, then by day).
+        self.slot_pairs: List[Tuple[int, int]] = [
+            (first_meal * num_days + day, second_meal * num_days + day)
+            for day in range(num_days)
+            for first_meal in range(num_meals)
+            for second_meal in range(first_meal + 1, num_meals)
+        ]
+
+        nutrient_rows = num_meals * num_days + np.arange(num_nutrients * num_days)
+        self.lower: np.ndarray = matrix_model.row_lower[nutrient_rows].reshape(
+            num_nutrients, num_days
+        ).T
+        self.upper: np.ndarray = matrix_model.row_upper[nutrient_rows].reshape(
+            num_nutrients, num_days
+        ).T
+        self.lower_weight: np.ndarray = 1 / np.maximum(np.abs(self.lower), 1)
+        self.upper_weight: np.ndarray = 1 / np.maximum(np.abs(self.upper), 1)
+
+        self.choice: np.ndarray = np.full(self.num_slots, -1)
+        self.totals: np.ndarray = np.zeros((num_days, num_nutrients))
+        self.selections: np.ndarray = np.zeros(len(matrix_model.dishes))
+        self.day_violation: np.ndarray = np.zeros(num_days)
+        self.violation: float = 0.0
+        self.cost: float = 0.0
+        self.moves: int = 0
+
+    def round(self, lp_solution: np.ndarray) -> bool:
+        """Choose the dish of each slot from the LP solution: slots with the most
+        decided LP values first, the highest value (and lowest cost) of each slot that
+        respects the selections cap. Returns False if a slot has no dish."""
+        matrix_model = self.matrix_model
+        if any(len(columns) == 0 for columns in self.slot_columns):
+            return False
+        slot_order = np.argsort(
+            [-lp_solution[columns].max() for columns in self.slot_columns],
+            kind='stable',
+        )
+        for slot in slot_order:
+            columns = self.slot_columns[slot]
+            order = np.lexsort((matrix_model.cost[columns], -lp_solution[columns]))
+            dishes = matrix_model.var_dish[columns[order]]
+            available = self.selections[dishes] < matrix_model.dish_selections_max
+            position = int(np.argmax(available)) if available.any() else 0
+            column = columns[order[position]]
+            self.choice[slot] = column
+            self.selections[matrix_model.var_dish[column]] += 1
+            self.totals[self.slot_day[slot]] += (
+                matrix_model.nutrient_matrix[matrix_model.var_dish[column]]
+            )
+            self.cost += matrix_model.cost[column]
+
+        self.day_violation = np.array([
+            self._get_day_violation(self.totals[day], day)
+            for day in range(len(self.totals))
+        ])
+        self.violation = float(self.day_violation.sum()) + self._get_cap_excess()
+        return True
+
+    def run(self, max_passes: int, deadline: Optional[float]) -> None:
+        """Replace the dishes of the slots while it improves the diet (less violation
+        or, with the same violation, less cost). The dishes of two meals of the same
+        day are only replaced at once when replacing one dish does not improve it."""
+        for _ in range(max_passes):
+            improved = False
+            for slot in range(self.num_slots):
+                improved |= self._improve_slot(slot)
+            if not improved:
+                for slot_pair in self.slot_pairs:
+                    improved |= self._improve_slot_pair(*slot_pair)
+            if not improved:
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+
+    def _improve_slot(self, slot: int) -> bool:
+        matrix_model = self.matrix_model
+        columns = self.slot_columns[slot]
+        day = self.slot_day[slot]
+        current_column = self.choice[slot]
+
+        totals = (
+            self.totals[day]
+            - matrix_model.nutrient_matrix[matrix_model.var_dish[current_column]]
+            + matrix_model.nutrient_matrix[matrix_model.var_dish[columns]]
+        )
+        day_violation = self._get_day_violation(totals, day)
+        violation = (
+            self.violation
+            - self.day_violation[day]
+            + day_violation
+            + self._get_cap_change(current_column, columns)
+        )
+        cost = self.cost - matrix_model.cost[current_column] + matrix_model.cost[columns]
+
+        best = self._get_best_move(violation, cost)
+        if best is None:
+            return False
+        self._move([slot], [columns[best]], totals[best], day_violation[best])
+        self.violation = max(float(violation[best]), 0.0)
+        self.cost = float(cost[best])
+        return True
+
+    def _improve_slot_pair(self, first_slot: int, second_slot: int) -> bool:
+        matrix_model = self.matrix_model
+        first_columns = self.slot_candidates[first_slot]
+        second_columns = self.slot_candidates[second_slot]
+        day = self.slot_day[first_slot]
+        first_current = self.choice[first_slot]
+        second_current = self.choice[second_slot]
+        first_dishes = matrix_model.var_dish[first_columns]
+        second_dishes = matrix_model.var_dish[second_columns]
+        nutrient_matrix = matrix_model.nutrient_matrix
+
+        totals = (
+            self.totals[day]
+            - nutrient_matrix[matrix_model.var_dish[first_current]]
+            - nutrient_matrix[matrix_model.var_dish[second_current]]
+            + nutrient_matrix[first_dishes][:, np.newaxis]
+            + nutrient_matrix[second_dishes][np.newaxis, :]
+        )
+        day_violation = self._get_day_violation(totals, day)
+        violation = (
+            self.violation
+            - self.day_violation[day]
+            + day_violation
+            + self._get_pair_cap_change(
+                first_current, second_current, first_columns, second_columns
+            )
+        )
+        cost = (
+            self.cost
+            - matrix_model.cost[first_current]
+            - matrix_model.cost[second_current]
+            + matrix_model.cost[first_columns][:, np.newaxis]
+            + matrix_model.cost[second_columns][np.newaxis, :]
+        )
+
+        best = self._get_best_move(violation.ravel(), cost.ravel())
+        if best is None:
+            return False
+        first, second = np.unravel_index(best, violation.shape)
+        self._move(
+            [first_slot, second_slot],
+            [first_columns[first], second_columns[second]],
+            totals[first, second],
+            day_violation[first, second],
+        )
+        self.violation = max(float(violation[first, second]), 0.0)
+        self.cost = float(cost[first, second])
+        return True
+
+    def _get_cap_change(self, current_column: int, columns: np.ndarray) -> np.ndarray:
+        """Return the change of the excess over the selections cap if the dish of the
+        current column is replaced by the dish of each column."""
+        matrix_model = self.matrix_model
+        cap = matrix_model.dish_selections_max
+        current_dish = matrix_model.var_dish[current_column]
+        dishes = matrix_model.var_dish[columns]
+        cap_change = (self.selections[dishes] >= cap).astype(float)
+        cap_change -= float(self.selections[current_dish] > cap)
+        cap_change[dishes == current_dish] = 0
+        return cap_change
+
+    def _get_pair_cap_change(
+            self,
+            first_current: int,
+            second_current: int,
+            first_columns: np.ndarray,
+            second_columns: np.ndarray,
+    ) -> np.ndarray:
+        """Return the change of the excess over the selections cap if the dishes of
+        the current columns of two slots are replaced by the dishes of each pair of
+        columns (first x second).
+
+        The dishes involved may be shared (e.g. a candidate of a slot is the current
+        dish of the other one), so the change of each dish is computed from its net
+        change of selections, and split among its occurrences.
+        """
+        matrix_model = self.matrix_model
+        var_dish = matrix_model.var_dish
+        shape = (len(first_columns), len(second_columns))
+        dishes = np.stack([
+            np.full(shape, var_dish[first_current]),
+            np.full(shape, var_dish[second_current]),
+            np.broadcast_to(var_dish[first_columns][:, np.newaxis], shape),
+            np.broadcast_to(var_dish[second_columns][np.newaxis, :], shape),
+        ])
+        weights = np.array([-1, -1, 1, 1]).reshape(1, 4, 1, 1)
+        same_dish = dishes[:, np.newaxis] == dishes[np.newaxis, :]
+        selections_change = (same_dish * weights).sum(axis=1)
+        occurrences = same_dish.sum(axis=1)
+        selections = self.selections[dishes]
+        cap = matrix_model.dish_selections_max
+        excess_change = (
+            np.maximum(selections + selections_change - cap, 0)
+            - np.maximum(selections - cap, 0)
+        )
+        return (excess_change / occurrences).sum(axis=0)
+
+    def get_violation(self) -> float:
+        """Return the violation of the diet (nutrient bounds and selections cap),
+        computed from the dishes chosen instead of the running totals."""
+        matrix_model = self.matrix_model
+        dishes = matrix_model.var_dish[self.choice]
+        totals = np.zeros_like(self.totals)
+        np.add.at(totals, self.slot_day, matrix_model.nutrient_matrix[dishes])
+        selections = np.bincount(dishes, minlength=len(matrix_model.dishes))
+        excess = selections - matrix_model.dish_selections_max
+        return float(
+            sum(self._get_day_violation(totals[day], day) for day in range(len(totals)))
+            + np.maximum(excess, 0).sum()
+        )
+
+    def _get_best_move(self, violation: np.ndarray, cost: np.ndarray) -> Optional[int]:
+        """Return the move with the least violation (and then cost), if it improves the
+        diet."""
+        least_violation = violation <= violation.min() + TOLERANCE
+        best = np.flatnonzero(least_violation)[np.argmin(cost[least_violation])]
+        if violation[best] < self.violation - TOLERANCE or (
+                violation[best] <= self.violation + TOLERANCE
+                and cost[best] < self.cost - TOLERANCE):
+            return int(best)
+        return None
+
+    def _move(
+            self,
+            slots: List[int],
+            columns: List[int],
+            day_totals: np.ndarray,
+            day_violation: float,
+    ) -> None:
+        """Replace the dishes of the slots (of the same day) by the dishes of the
+        columns."""
+        var_dish = self.matrix_model.var_dish
+        for slot, column in zip(slots, columns):
+            self.selections[var_dish[self.choice[slot]]] -= 1
+            self.selections[var_dish[column]] += 1
+            self.choice[slot] = column
+        day = self.slot_day[slots[0]]
+        self.totals[day] = day_totals
+        self.day_violation[day] = day_violation
+        self.moves += 1
+
+    def _get_day_violation(self, totals: np.ndarray, day: int) -> np.ndarray:
+        """Return the violation of the nutrient bounds of a day for each vector of
+        totals (along the last axis), relative to the bounds, so that all the nutrients
+        weigh the same."""
+        below = np.maximum(self.lower[day] - totals, 0) * self.lower_weight[day]
+        above = np.maximum(totals - self.upper[day], 0) * self.upper_weight[day]
+        return (below + above).sum(axis=-1)
+
+    def _get_cap_excess(self) -> float:
+        excess = self.selections - self.matrix_model.dish_selections_max
+        return float(np.maximum(excess, 0).sum())
@@ -1,26 +1,356 @@
-from constants import DIET
-from data_builder import get_problem_data
-from model import get_abstract_model
-from solver import Solver
+import argparse
+import json
+from typing import TYPE_CHECKING, Optional
 
+from constants import (
+    DIET,
+    ENGINE_MATRIX,
+    ENGINE_PYOMO,
+    PHASE_BUILD,
+    PHASE_CHECK,
+    PHASE_DUMP,
+    PHASE_EXTRACT,
+    PHASE_PRINT_SOLUTION,
+    PHASE_SOLVE,
+    SOLVER_AUTO,
+    SOLVER_DECOMPOSITION,
+    SOLVER_HEURISTIC,
+    SOLVER_HIGHS,
+    SOLVER_PATTERNS,
+    SOLVER_SCIP,
+)
+from profiling import PhaseProfiler
 
-def solve_problem():
-    abstract_model = get_abstract_model()
-    problem_data = get_problem_data()
-    concrete_model = abstract_model.create_instance(
-        name=DIET,
-        data=problem_data,
+# The dependencies of the pipeline (pandas, pyomo, HiGHS...) take much longer to import
+# than a solve from the daemon: they are imported only when needed (see
+# `profiling.get_import_time`).
+if TYPE_CHECKING:
+    import pandas as pd
+    from cache import SolutionCache
+    from debug_dump import ModelDumper
+    from plan import Plan
+    from presolve import CatalogPresolver
+    from solver_backends import Incumbent, IncumbentCallback, SolverOptions
+
+
+def solve_problem(
+        engine: str = ENGINE_PYOMO,
+        cache: Optional['SolutionCache'] = None,
+        profiler: Optional[PhaseProfiler] = None,
+        dumper: Optional['ModelDumper'] = None,
+        presolver: Optional['CatalogPresolver'] = None,
+        solver_backend: str = SOLVER_AUTO,
+        solver_options: Optional['SolverOptions'] = None,
+        heuristic_warm_start: bool = False,
+        on_incumbent: Optional['IncumbentCallback'] = None,
+        diet_info_df: Optional['pd.DataFrame'] = None,
+        symmetry_breaking: bool = False,
+) -> Optional['Plan']:
+    """Build and solve the diet problem.
+
+    The model can be built with the reference pyomo abstract model (`ENGINE_PYOMO`) or
+    assembled directly as a sparse matrix (`ENGINE_MATRIX`). Both engines describe the
+    same problem and lead to the same optimum. With `symmetry_breaking`, the pyomo model
+    is strengthened with constraints that sort its identical days (see
+    `model.set_symmetry_breaking`).
+
+    If a cache is given, a problem already solved is not built nor solved again, and
+    otherwise the last solution for the same catalog is used as a warm start (by the
+    HiGHS backend, see `Solver.set_warm_start`).
+
+    If a profiler is given, it records the time and memory of each phase of the
+    execution, and the size of the model.
+
+    If a dumper is given, the built model is dumped for debugging (off by default).
+
+    If a presolver is given, the dishes that cannot improve the optimal diet of its diet
+    profile are removed from the catalog before the model is built.
+
+    Before building the model, the problem data is checked by bound propagation (see
+    `feasibility`), raising `InfeasibleDietError` with the conflicting constraints if
+    the diet information cannot be met.
+
+    The solver backend is selected from the size of the model unless one is given (see
+    `solver_backends.get_backend`), and the solver options apply to any backend. With
+    `heuristic_warm_start`, the exact backend starts from the diet of the heuristic.
+    `on_incumbent` is called with each improved diet found during the search, and can
+    stop it (see `Solver.solve`). Only diets proven optimal are stored in the cache
+    (not those of the heuristic, nor of searches stopped early).
+
+    The diet information comes from `get_diet_info_data`, unless one is given (the one
+    of the presolver, if any, is used otherwise).
+
+    Returns the plan found (or cached), or None if the solver found no diet.
+    """
+    from cache import CachedSolution
+    from data_builder import get_problem_data
+    from feasibility import assert_feasible
+    from model import get_abstract_model, set_symmetry_breaking
+    from model_matrix import get_matrix_model
+    from plan import get_plan_from_selections
+    from profiling import get_model_stats
+    from solver import Solver
+
+    if symmetry_breaking and engine != ENGINE_PYOMO:
+        raise ValueError('Symmetry breaking is only available with the pyomo engine')
+    if profiler is None:
+        profiler = PhaseProfiler(enabled=False)
+
+    problem_data = get_problem_data(
+        diet_info_df=diet_info_df,
+        profiler=profiler,
+        presolver=presolver,
+    )
+    if cache is not None:
+        cached_solution = cache.get(problem_data)
+        if cached_solution is not None:
+            with profiler.phase(PHASE_EXTRACT):
+                plan = get_plan_from_selections(
+                    problem_data, cached_solution.selections
+                )
+            with profiler.phase(PHASE_PRINT_SOLUTION):
+                plan.print()
+            return plan
+    with profiler.phase(PHASE_CHECK):
+        assert_feasible(problem_data)
+
+    if engine == ENGINE_MATRIX:
+        with profiler.phase(PHASE_BUILD):
+            matrix_model = get_matrix_model(problem_data)
+            concrete_model = matrix_model.to_kernel_block()
+        profiler.record_model_stats({
+            'variables': matrix_model.num_variables,
+            'constraints': matrix_model.num_constraints,
+            'nonzeros': matrix_model.num_nonzeros,
+        })
+    elif engine == ENGINE_PYOMO:
+        with profiler.phase(PHASE_BUILD):
+            abstract_model = get_abstract_model()
+            concrete_model = abstract_model.create_instance(
+                name=DIET,
+                data=problem_data,
+            )
+            if symmetry_breaking:
+                set_symmetry_breaking(concrete_model)
+        if profiler.enabled:
+            profiler.record_model_stats(get_model_stats(concrete_model))
+    else:
+        raise ValueError(f'Unknown engine: {engine}')
+
+    if dumper is not None:
+        with profiler.phase(PHASE_DUMP):
+            dumper.dump(concrete_model)
+
+    solver = Solver(
+        concrete_model=concrete_model,
+        backend=solver_backend,
+        options=solver_options,
+        heuristic_warm_start=heuristic_warm_start,
     )
+    if cache is not None:
+        warm_start = cache.get_warm_start(problem_data)
+        if warm_start is not None:
+            solver.set_warm_start(warm_start.selections)
+    with profiler.phase(PHASE_SOLVE):
+        solver.solve(on_incumbent=on_incumbent)
+    profiler.record_solver_time(solver.get_solver_time())
+    if not solver.solution_exists():
+        print(f'No diet found ({solver.get_termination_condition()}).')
+        return None
+    with profiler.phase(PHASE_EXTRACT):
+        plan = solver.get_plan()
+    with profiler.phase(PHASE_PRINT_SOLUTION):
+        plan.print()
+
+    if cache is not None and solver.is_optimal():
+        cache.put(problem_data, CachedSolution(
+            cost=solver.get_cost(),
+            selections=plan.selections,
+        ))
+    return plan
+
+
+def print_incumbent(incumbent: 'Incumbent') -> None:
+    line = f'Incumbent at {incumbent.time:.2f}s: {incumbent.objective:.2f}€'
+    if incumbent.bound is not None:
+        line += f', lower bound {incumbent.bound:.2f}€ (gap: {incumbent.gap:.2%})'
+    print(line, flush=True)
+
 
-    # Dump connfigurations (for debugging)
-    with open('./concrete_model_dump.txt', 'wt') as f:
-        concrete_model.pprint(f)
+def solve_from_args(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Solve the problem in this process, with the arguments of the command line."""
+    from data_provider import get_diet_info_data
+    from debug_dump import ModelDumper
+    from feasibility import InfeasibleDietError
+    from presolve import CatalogPresolver
+    from solver_backends import SolverOptions
 
-    solver = Solver(concrete_model=concrete_model)
-    solver.solve()
-    solver.print_solution()
+    diet_info_df = get_diet_info_data()
+    for diet_info_name, diet_info_value in args.diet_info.items():
+        if diet_info_name not in diet_info_df.columns:
+            parser.error(f'Unknown diet information: {diet_info_name}')
+        diet_info_df[diet_info_name] = diet_info_value
+
+    profiler = PhaseProfiler(
+        enabled=args.report is not None or args.profile is not None,
+        profile_dir=args.profile,
+    )
+    dumper = None
+    if args.dump is not None or args.dump_export is not None:
+        dumper = ModelDumper(
+            path=args.dump,
+            components=args.dump_components,
+            sample_size=args.dump_sample,
+            export_path=args.dump_export,
+        )
+    presolver = None
+    if args.presolve:
+        presolver = CatalogPresolver(diet_info_df)
+    try:
+        plan = solve_problem(
+            engine=args.engine,
+            profiler=profiler,
+            dumper=dumper,
+            presolver=presolver,
+            solver_backend=args.solver,
+            solver_options=SolverOptions(
+                time_limit=args.time_limit,
+                mip_gap=args.mip_gap,
+                threads=args.threads,
+            ),
+            heuristic_warm_start=args.heuristic_warm_start,
+            on_incumbent=print_incumbent if args.incumbents else None,
+            diet_info_df=diet_info_df,
+            symmetry_breaking=args.symmetry_breaking,
+        )
+    except InfeasibleDietError as error:
+        raise SystemExit(str(error))
+    if args.output is not None and plan is not None:
+        plan.export(args.output)
+    if presolver is not None:
+        print('Presolve: ' + str(presolver.get_report()))
+    if args.report is not None:
+        profiler.write_report(args.report)
 
 
 # Press the green button in the gutter to run the script.
 if __name__ == '__main__':
-    solve_problem()
+    parser = argparse.ArgumentParser(description='Solve the diet problem.')
+    parser.add_argument(
+        '--engine',
+        choices=[ENGINE_PYOMO, ENGINE_MATRIX],
+        default=ENGINE_PYOMO,
+        help='How the model is built.',
+    )
+    parser.add_argument(
+        '--solver',
+        choices=[
+            SOLVER_AUTO,
+            SOLVER_HIGHS,
+            SOLVER_SCIP,
+            SOLVER_HEURISTIC,
+            SOLVER_PATTERNS,
+            SOLVER_DECOMPOSITION,
+        ],
+        default=SOLVER_AUTO,
+        help='Solver backend. By default, it is selected from the size of the model.',
+    )
+    parser.add_argument(
+        '--symmetry-breaking',
+        action='store_true',
+        help='Strengthen the model with constraints that sort its identical days.',
+    )
+    parser.add_argument(
+        '--heuristic-warm-start',
+        action='store_true',
+        help='Start the exact solver from the diet found by the heuristic.',
+    )
+    parser.add_argument(
+        '--time-limit',
+        type=float,
+        help='Maximum solving time [s].',
+    )
+    parser.add_argument(
+        '--mip-gap',
+        type=float,
+        help='Relative optimality gap at which the solver stops.',
+    )
+    parser.add_argument(
+        '--incumbents',
+        action='store_true',
+        help='Print each improved diet found during the search.',
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        help='Maximum number of threads of the solver.',
+    )
+    parser.add_argument(
+        '--report',
+        help='Write a JSON report with the time and memory of each phase to this file.',
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='DIR',
+        help='Also write the cProfile stats of each phase to this directory.',
+    )
+    parser.add_argument(
+        '--dump',
+        metavar='FILE',
+        help='Write a summary of the model components to this file (for debugging).',
+    )
+    parser.add_argument(
+        '--dump-components',
+        metavar='PATTERN',
+        nargs='+',
+        help='Only dump the components whose name matches any of these glob patterns.',
+    )
+    parser.add_argument(
+        '--dump-sample',
+        metavar='N',
+        type=int,
+        default=0,
+        help='Number of entries of each component written in the dump.',
+    )
+    parser.add_argument(
+        '--dump-export',
+        metavar='FILE',
+        help='Export the whole model to this LP (.lp) or MPS (.mps) file.',
+    )
+    parser.add_argument(
+        '--output',
+        metavar='FILE',
+        help='Export the plan found to this JSON, CSV or Parquet file (by extension).',
+    )
+    parser.add_argument(
+        '--presolve',
+        action='store_true',
+        help='Remove duplicate and dominated dishes from the catalog before building.',
+    )
+    parser.add_argument(
+        '--diet-info',
+        metavar='JSON',
+        type=json.loads,
+        default={},
+        help='Change the diet information, e.g. \'{"calories_max": 1200}\'.',
+    )
+    parser.add_argument(
+        '--daemon',
+        metavar='SOCKET',
+        help='Solve with the daemon listening on this Unix socket (see daemon.py), '
+             'which keeps the catalog and the models in memory.',
+    )
+    args = parser.parse_args()
+
+    if args.daemon is not None:
+        from daemon import get_daemon_request, request_plan
+        try:
+            daemon_request = get_daemon_request(parser, args)
+        except ValueError as error:
+            parser.error(str(error))
+        daemon_response = request_plan(args.daemon, daemon_request)
+        print(daemon_response['output'], end='')
+        if daemon_response['error'] is not None:
+            raise SystemExit(daemon_response['error'])
+    else:
+        solve_from_args(parser, args)
@@ -1,6 +1,8 @@
+import numpy as np
 from pyomo.environ import (
     AbstractModel,
     Binary,
+    BuildAction,
     Constraint,
     Expression,
     Objective,
@@ -10,43 +12,37 @@ from pyomo.environ import (
     PositiveIntegers,
     Set,
     Var,
+    inequality,
+    value,
 )
-from pyomo.core.expr.relational_expr import InequalityExpression
+from pyomo.core.expr.numeric_expr import LinearExpression
+from pyomo.core.expr.relational_expr import InequalityExpression, RangedExpression
+from typing import Any, Dict, List, Optional, Tuple
 
 from constants import (
-    CALORIES_DISH,
-    CALORIES_MAX,
-    CALORIES_MIN,
-    CARBS_DISH,
-    CARBS_MAX,
-    CARBS_MIN,
-    CONSTRAINT_MAXIMUM_CALORIES_PER_DAY,
-    CONSTRAINT_MAXIMUM_CARBS_PER_DAY,
+    ADMISSIBLE_DISH_MEAL,
+    ADMISSIBLE_DISHES_MEAL,
+    ADMISSIBLE_MEALS_DISH,
+    BUILD_INDEX_SPACE,
+    CONSTRAINT_DAY_ORDER,
+    CONSTRAINT_DISCARDED_DISH_MEAL,
     CONSTRAINT_MAXIMUM_DISHES_PER_MEAL,
-    CONSTRAINT_MAXIMUM_FAT_PER_DAY,
-    CONSTRAINT_MAXIMUM_PROTEIN_PER_DAY,
     CONSTRAINT_MAXIMUM_SELECTIONS_PER_DISH,
-    CONSTRAINT_MINIMUM_CALORIES_PER_DAY,
-    CONSTRAINT_MINIMUM_CARBS_PER_DAY,
     CONSTRAINT_MINIMUM_DISHES_PER_MEAL,
-    CONSTRAINT_MINIMUM_FAT_PER_DAY,
-    CONSTRAINT_MINIMUM_PROTEIN_PER_DAY,
-    CONSTRAINT_SUIT_MEAL_TYPE,
-    CONSTRAINT_VEGETARIANISM,
-    CONSTRAINT_VEGANISM,
+    CONSTRAINT_NUTRIENTS_PER_DAY,
+    CONSTRAINT_ORBIT_FIXING,
     COST_DISH,
     DAYS,
     DIET,
     DISHES,
     DISH_SELECTIONS_MAX,
-    FAT_DISH,
-    FAT_MAX,
-    FAT_MIN,
     MEALS,
+    NUTRIENT_DISH,
+    NUTRIENT_MAX,
+    NUTRIENT_MIN,
+    NUTRIENTS,
     OBJECTIVE_FUNCTION,
-    PROTEIN_DISH,
-    PROTEIN_MAX,
-    PROTEIN_MIN,
+    RELEASE_INDEX_SPACE,
     SUITABLE,
     USE_DISH_MEAL_DAY,
     VEGAN,
@@ -54,6 +50,14 @@ from constants import (
     VEGETARIAN,
     VEGETARIAN_DISH
 )
+from feasibility import Conflict, InfeasibleDietError
+
+# Constraints of the strengthened formulation (see `set_symmetry_breaking`).
+SYMMETRY_BREAKING_CONSTRAINTS = (
+    CONSTRAINT_DAY_ORDER,
+    CONSTRAINT_ORBIT_FIXING,
+    CONSTRAINT_DISCARDED_DISH_MEAL,
+)
 
 
 def get_abstract_model() -> AbstractModel:
@@ -72,63 +76,46 @@ def get_abstract_model() -> AbstractModel:
         name=DISHES,
         doc='Dishes names that can be included in the diet.',
     )
-
-    # Parameters: Values that you know prior to solving the problem, and will not change
-    # during the execution.
-    model.calories_min = Param(
-        name=CALORIES_MIN,
-        doc='Minimum number of calories per day [kcal].',
-        domain=NonNegativeReals
-    )
-    model.calories_max = Param(
-        name=CALORIES_MAX,
-        doc='Maximum number of calories per day [kcal].',
-        domain=NonNegativeReals
-    )
-    model.protein_min = Param(
-        name=PROTEIN_MIN,
-        doc='Minimum amount of protein that a day can contain [g].',
-        domain=NonNegativeReals
+    model.nutrients = Set(
+        name=NUTRIENTS,
+        doc='Nutrients whose amount per day is bounded (e.g. calories, protein).',
     )
-    model.protein_max = Param(
-        name=PROTEIN_MAX,
-        doc='Maximum amount of protein that a day can contain [g].',
-        domain=NonNegativeReals
-    )
-    model.carbs_min = Param(
-        name=CARBS_MIN,
-        doc='Minimum amount of carbs that a day can contain [g].',
-        domain=NonNegativeReals
-    )
-    model.carbs_max = Param(
-        name=CARBS_MAX,
-        doc='Maximum amount of carbs that a day can contain [g].',
-        domain=NonNegativeReals
-    )
-    model.fat_min = Param(
-        name=FAT_MIN,
-        doc='Minimum amount of fat that a day can contain [g].',
+
+    # Parameters: Values that you know prior to solving the problem. The catalog
+    # parameters do not change during the execution, while the diet parameters and dish
+    # costs are mutable, so a persistent solver session can re-plan with different
+    # bounds or prices without rebuilding the model.
+    model.nutrient_min = Param(
+        model.nutrients,
+        name=NUTRIENT_MIN,
+        doc='Minimum amount of each nutrient that a day can contain.',
         domain=NonNegativeReals,
+        mutable=True,
     )
-    model.fat_max = Param(
-        name=FAT_MAX,
-        doc='Maximum amount of fat that a day can contain [g].',
+    model.nutrient_max = Param(
+        model.nutrients,
+        name=NUTRIENT_MAX,
+        doc='Maximum amount of each nutrient that a day can contain.',
         domain=NonNegativeReals,
+        mutable=True,
     )
     model.vegetarian = Param(
         name=VEGETARIAN,
         doc='Equals 1 if the diet is vegetarian and 0 otherwise.',
         domain=Binary,
+        mutable=True,
     )
     model.vegan = Param(
         name=VEGAN,
         doc='Equals 1 if the diet is vegan and 0 otherwise.',
         domain=Binary,
+        mutable=True,
     )
     model.dish_selections_max = Param(
         name=DISH_SELECTIONS_MAX,
         doc='Maximum of times a dish can be selected in the diet.',
         domain=PositiveIntegers,
+        mutable=True,
     )
 
     model.suitable = Param(
@@ -137,29 +124,13 @@ def get_abstract_model() -> AbstractModel:
         name=SUITABLE,
         doc='Equals 1 if the dish is suitable for the meal and 0 otherwise.',
         domain=Binary,
+        default=0,
     )
-    model.calories_dish = Param(
+    model.nutrient_dish = Param(
         model.dishes,
-        name=CALORIES_DISH,
-        doc='Calories of each dish [kcal].',
-        domain=NonNegativeReals,
-    )
-    model.protein_dish = Param(
-        model.dishes,
-        name=PROTEIN_DISH,
-        doc='Protein that each dish contains [g].',
-        domain=NonNegativeReals,
-    )
-    model.carbs_dish = Param(
-        model.dishes,
-        name=CARBS_DISH,
-        doc='Carbs that each dish contains [g].',
-        domain=NonNegativeReals,
-    )
-    model.fat_dish = Param(
-        model.dishes,
-        name=FAT_DISH,
-        doc='Fat that each dish contains [g].',
+        model.nutrients,
+        name=NUTRIENT_DISH,
+        doc='Amount of each nutrient that each dish contains.',
         domain=NonNegativeReals,
     )
     model.vegetarian_dish = Param(
@@ -179,18 +150,51 @@ def get_abstract_model() -> AbstractModel:
         name=COST_DISH,
         doc='Cost per serving of the dish [€].',
         domain=NonNegativeReals,
+        mutable=True,
+    )
+
+    # Sparse index sets: Only the (dish, meal) pairs where the dish may be served,
+    # given its meal suitability and the diet restrictions. Variables are only created
+    # for these pairs, so inadmissible cells never reach the solver.
+    model.admissible_dish_meal = Set(
+        dimen=2,
+        within=model.dishes * model.meals,
+        name=ADMISSIBLE_DISH_MEAL,
+        doc='Pairs (dish, meal) in which the dish can be served.',
+        initialize=admissible_dish_meal,
+    )
+    model.admissible_dishes_meal = Set(
+        model.meals,
+        within=model.dishes,
+        name=ADMISSIBLE_DISHES_MEAL,
+        doc='Dishes that can be served in each meal.',
+        initialize=admissible_dishes_meal,
+    )
+    model.admissible_meals_dish = Set(
+        model.dishes,
+        within=model.meals,
+        name=ADMISSIBLE_MEALS_DISH,
+        doc='Meals in which each dish can be served.',
+        initialize=admissible_meals_dish,
     )
 
     # Variables: Values defined while solving the problem to get the best solution.
     model.use_dish_meal_day = Var(
-        model.dishes,
-        model.meals,
+        model.admissible_dish_meal,
         model.days,
         name=USE_DISH_MEAL_DAY,
         doc='Equals 1 if a dish is used in a meal of a day and 0 otherwise.',
         domain=Binary,
     )
 
+    # Integer-coded index space of the variables, from which the constraints and the
+    # objective are built row by row, and released once the model is built.
+    model.build_index_space = BuildAction(
+        name=BUILD_INDEX_SPACE,
+        doc=build_index_space.__doc__,
+        rule=build_index_space,
+    )
+
     # Constraints: Requirements and forbidden actions to achieve a correct solution.
     model.constraint_minimum_dishes_per_meal = Constraint(
         model.meals,
@@ -206,77 +210,12 @@ def get_abstract_model() -> AbstractModel:
         doc=constraint_maximum_dishes_per_meal.__doc__,
         rule=constraint_maximum_dishes_per_meal,
     )
-    model.constraint_suit_meal_type = Constraint(
-        model.dishes,
-        model.meals,
-        model.days,
-        name=CONSTRAINT_SUIT_MEAL_TYPE,
-        doc=constraint_suit_meal_type.__doc__,
-        rule=constraint_suit_meal_type,
-    )
-    model.constraint_vegetarianism = Constraint(
-        model.dishes,
-        model.meals,
-        model.days,
-        name=CONSTRAINT_VEGETARIANISM,
-        doc=constraint_vegetarianism.__doc__,
-        rule=constraint_vegetarianism,
-    )
-    model.constraint_veganism = Constraint(
-        model.dishes,
-        model.meals,
-        model.days,
-        name=CONSTRAINT_VEGANISM,
-        doc=constraint_veganism.__doc__,
-        rule=constraint_veganism,
-    )
-    model.constraint_minimum_calories_per_day = Constraint(
-        model.days,
-        name=CONSTRAINT_MINIMUM_CALORIES_PER_DAY,
-        doc=constraint_minimum_calories_per_day.__doc__,
-        rule=constraint_minimum_calories_per_day,
-    )
-    model.constraint_maximum_calories_per_day = Constraint(
+    model.constraint_nutrients_per_day = Constraint(
+        model.nutrients,
         model.days,
-        name=CONSTRAINT_MAXIMUM_CALORIES_PER_DAY,
-        doc=constraint_maximum_calories_per_day.__doc__,
-        rule=constraint_maximum_calories_per_day,
-    )
-    model.constraint_minimum_protein_per_day = Constraint(
-        model.days,
-        name=CONSTRAINT_MINIMUM_PROTEIN_PER_DAY,
-        doc=constraint_minimum_protein_per_day.__doc__,
-        rule=constraint_minimum_protein_per_day,
-    )
-    model.constraint_maximum_protein_per_day = Constraint(
-        model.days,
-        name=CONSTRAINT_MAXIMUM_PROTEIN_PER_DAY,
-        doc=constraint_maximum_protein_per_day.__doc__,
-        rule=constraint_maximum_protein_per_day,
-    )
-    model.constraint_minimum_carbs_per_day = Constraint(
-        model.days,
-        name=CONSTRAINT_MINIMUM_CARBS_PER_DAY,
-        doc=constraint_minimum_carbs_per_day.__doc__,
-        rule=constraint_minimum_carbs_per_day,
-    )
-    model.constraint_maximum_carbs_per_day = Constraint(
-        model.days,
-        name=CONSTRAINT_MAXIMUM_CARBS_PER_DAY,
-        doc=constraint_maximum_carbs_per_day.__doc__,
-        rule=constraint_maximum_carbs_per_day,
-    )
-    model.constraint_minimum_fat_per_day = Constraint(
-        model.days,
-        name=CONSTRAINT_MINIMUM_FAT_PER_DAY,
-        doc=constraint_minimum_fat_per_day.__doc__,
-        rule=constraint_minimum_fat_per_day,
-    )
-    model.constraint_maximum_fat_per_day = Constraint(
-        model.days,
-        name=CONSTRAINT_MAXIMUM_FAT_PER_DAY,
-        doc=constraint_maximum_fat_per_day.__doc__,
-        rule=constraint_maximum_fat_per_day,
+        name=CONSTRAINT_NUTRIENTS_PER_DAY,
+        doc=constraint_nutrients_per_day.__doc__,
+        rule=constraint_nutrients_per_day,
     )
     model.constraint_maximum_selections_per_dish = Constraint(
         model.dishes,
@@ -293,148 +232,303 @@ def get_abstract_model() -> AbstractModel:
         sense=minimize,
     )
 
-    return model
-
-
-# Constraints definition
-def constraint_minimum_dishes_per_meal(
-        model: AbstractModel,
-        meal,
-        day,
-) -> InequalityExpression:
-    """Each meal has at least 1 dish."""
-    dishes_per_meal = _get_num_of_dishes_in_meal(model, meal, day)
-    return dishes_per_meal >= 1
-
-
-def constraint_maximum_dishes_per_meal(
-        model: AbstractModel,
-        meal,
-        day,
-) -> InequalityExpression:
-    """Each meal has at most 3 dishes."""
-    dishes_per_meal = _get_num_of_dishes_in_meal(model, meal, day)
-    return dishes_per_meal <= 1
-
+    model.release_index_space = BuildAction(
+        name=RELEASE_INDEX_SPACE,
+        doc=release_index_space.__doc__,
+        rule=release_index_space,
+    )
 
-def constraint_suit_meal_type(
-        model: AbstractModel,
-        dish,
-        meal,
-        day,
-) -> InequalityExpression:
-    """Dishes can only be selected for the meal type they are suitable for."""
-    return model.use_dish_meal_day[dish, meal, day] <= model.suitable[dish, meal]
+    return model
 
 
-def constraint_vegetarianism(
-        model: AbstractModel,
-        dish,
-        meal,
-        day,
-) -> InequalityExpression:
-    """Respect vegetarian diet.
-
-    If the diet is vegetarian, all dishes must be vegetarian. If the diet is not
-    vegetarian, dishes can be either vegetarian or not.
+def set_symmetry_breaking(model: Any, enabled: bool = True) -> None:
+    """Add to (or remove from) an instance of the model the constraints of the
+    strengthened formulation.
+
+    Days have identical constraints, so any permutation of the days of a diet is a diet
+    with the same cost, and the solver explores all of them. The strengthened
+    formulation only keeps the diets whose days are sorted by the rank of the dish of
+    the ordering meal (the meal with the most admissible dishes, whose dishes are ranked
+    by cost), and tightens the model:
+    - constraint_day_order: The rank of each day is not less than the one of the
+      previous day.
+    - constraint_orbit_fixing: Since days are sorted, the dishes of rank up to r (r + 1
+      dishes, each selected at most `dish_selections_max` times) fill the ordering meal
+      of the days before any day with rank r, and the dishes of rank r or more fill it
+      from that day on. Dishes cannot be in the days where they do not fit.
+    - constraint_discarded_dish_meal: Dishes are not used in the meals where they do not
+      fit in any day that meets the daily nutrient bounds (see
+      `feasibility.check_feasibility`).
+
+    The constraints are built with the current values of the parameters, so they have
+    to be enabled again after changing the diet information. Only the solvers that read
+    the pyomo model (SCIP and HiGHS through APPSI) use them.
+    """
+    # Imported here, since the feasibility check uses the model data, not the model.
+    from feasibility import check_feasibility
+    from model_matrix import get_instance_data
+
+    for constraint_name in SYMMETRY_BREAKING_CONSTRAINTS:
+        if model.component(constraint_name) is not None:
+            model.del_component(constraint_name)
+    if not enabled:
+        return
+    feasibility_result = check_feasibility(get_instance_data(model))
+    if not feasibility_result.is_feasible:
+        return
+
+    days = list(model.days)
+    meals = list(model.meals)
+    dish_positions = {dish: position for position, dish in enumerate(model.dishes)}
+    meal_positions = {meal: position for position, meal in enumerate(meals)}
+    admissible = feasibility_result.admissible
+    discarded = [
+        (dish, meal)
+        for dish, meal in model.admissible_dish_meal
+        if not admissible[dish_positions[dish], meal_positions[meal]]
+    ]
+
+    ordering_meal = meals[int(admissible.sum(axis=0).argmax())]
+    ordering_dishes = sorted(
+        (dish for dish in model.admissible_dishes_meal[ordering_meal]
+         if admissible[dish_positions[dish], meal_positions[ordering_meal]]),
+        key=lambda dish: (value(model.cost_dish[dish]), dish),
+    )
+    dish_rank = {dish: rank for rank, dish in enumerate(ordering_dishes)}
+    selections_max = value(model.dish_selections_max)
+    excluded_days = _get_orbit_excluded_days(
+        ordering_dishes, len(days), selections_max
+    )
+
+    def day_rank(day) -> Expression:
+        return sum(
+            rank * model.use_dish_meal_day[dish, ordering_meal, day]
+            for dish, rank in dish_rank.items()
+        )
+
+    def constraint_day_order(model: Any, day) -> InequalityExpression:
+        return day_rank(days[days.index(day) - 1]) <= day_rank(day)
+
+    def constraint_orbit_fixing(model: Any, dish) -> InequalityExpression:
+        return sum(
+            model.use_dish_meal_day[dish, ordering_meal, days[position]]
+            for position in excluded_days[dish]
+        ) <= 0
+
+    def constraint_discarded_dish_meal(model: Any, dish, meal) -> InequalityExpression:
+        return sum(model.use_dish_meal_day[dish, meal, day] for day in days) <= 0
+
+    model.add_component(CONSTRAINT_DAY_ORDER, Constraint(
+        days[1:],
+        name=CONSTRAINT_DAY_ORDER,
+        doc=f'Days are sorted by the rank of the dish of {ordering_meal}.',
+        rule=constraint_day_order,
+    ))
+    model.add_component(CONSTRAINT_ORBIT_FIXING, Constraint(
+        list(excluded_days),
+        name=CONSTRAINT_ORBIT_FIXING,
+        doc=f'Dishes of {ordering_meal} are not in the days where they cannot be.',
+        rule=constraint_orbit_fixing,
+    ))
+    model.add_component(CONSTRAINT_DISCARDED_DISH_MEAL, Constraint(
+        discarded,
+        name=CONSTRAINT_DISCARDED_DISH_MEAL,
+        doc='Dishes are not in the meals where they fit in no day.',
+        rule=constraint_discarded_dish_meal,
+    ))
+
+
+# Sparse index sets definition
+def admissible_dish_meal(model: AbstractModel) -> List[Tuple[str, str]]:
+    """Pairs (dish, meal) where the dish is suitable for the meal and fits the diet.
 
     Note
     ----
     It is assumed that all vegan dishes are also vegetarian.
     """
-    return (
-        model.use_dish_meal_day[dish, meal, day] * (1 - model.vegetarian_dish[dish])
-        <= (1 - model.vegetarian)
-    )
-
-
-def constraint_veganism(
-        model: AbstractModel,
-        dish,
-        meal,
-        day,
-) -> InequalityExpression:
-    """Respect vegan diet.
+    return [
+        (dish, meal)
+        for dish in model.dishes
+        if dish_respects_diet(model, dish)
+        for meal in model.meals
+        if model.suitable[dish, meal]
+    ]
 
-    If the diet is vegan, all dishes must be vegan. If the diet is not vegan, dishes can
-    be either vegan or not.
-    """
-    return (
-        model.use_dish_meal_day[dish, meal, day] * (1 - model.vegan_dish[dish])
-        <= (1 - model.vegan)
-    )
 
+def admissible_dishes_meal(model: AbstractModel, meal) -> List[str]:
+    """Dishes that can be served in a certain meal."""
+    return [
+        dish
+        for dish, admissible_meal in model.admissible_dish_meal
+        if admissible_meal == meal
+    ]
 
-def constraint_minimum_calories_per_day(
-        model: AbstractModel,
-        day,
-) -> InequalityExpression:
-    """Calorie count per day is lower bounded."""
-    daily_calorie_count = _get_daily_metric_count(model, day, model.calories_dish)
-    return daily_calorie_count >= model.calories_min
 
+def admissible_meals_dish(model: AbstractModel, dish) -> List[str]:
+    """Meals in which a certain dish can be served."""
+    return [
+        meal
+        for meal in model.meals
+        if (dish, meal) in model.admissible_dish_meal
+    ]
 
-def constraint_maximum_calories_per_day(
-        model: AbstractModel,
-        day,
-) -> InequalityExpression:
-    """Calorie count per day is upper bounded."""
-    daily_calorie_count = _get_daily_metric_count(model, day, model.calories_dish)
-    return daily_calorie_count <= model.calories_max
 
+def dish_respects_diet(model: AbstractModel, dish) -> bool:
+    """Return whether a dish can be part of the diet (vegetarianism and veganism)."""
+    if value(model.vegetarian) and not model.vegetarian_dish[dish]:
+        return False
+    if value(model.vegan) and not model.vegan_dish[dish]:
+        return False
+    return True
 
-def constraint_minimum_protein_per_day(
-        model: AbstractModel,
-        day,
-) -> InequalityExpression:
-    """Protein count per day is lower bounded."""
-    daily_protein_count = _get_daily_metric_count(model, day, model.protein_dish)
-    return daily_protein_count >= model.protein_min
 
+# Index space definition
+class IndexSpace:
+    """Dishes, meals and days of the variables of an instance coded as dense integers,
+    while the instance is built.
 
-def constraint_maximum_protein_per_day(
-        model: AbstractModel,
-        day,
-) -> InequalityExpression:
-    """Protein count per day is upper bounded."""
-    daily_protein_count = _get_daily_metric_count(model, day, model.protein_dish)
-    return daily_protein_count <= model.protein_max
+    Each variable is a column, described by the position `var_dish` of its dish, and
+    the columns of each (meal, day), day and dish are grouped in contiguous arrays. The
+    amount of each nutrient of each dish is `nutrient_matrix` (dishes x nutrients). The
+    names are only mapped to positions to find the columns of a constraint index.
+    """
+    __slots__ = (
+        'variables',
+        'dish_positions',
+        'meal_positions',
+        'day_positions',
+        'nutrient_positions',
+        'var_dish',
+        'meal_day_columns',
+        'day_columns',
+        'dish_columns',
+        'nutrient_matrix',
+        'nutrient_coefficients',
+    )
+
+    def __init__(self, model: AbstractModel):
+        dishes = list(model.dishes)
+        nutrients = list(model.nutrients)
+        self.dish_positions = _get_positions(dishes)
+        self.meal_positions = _get_positions(list(model.meals))
+        self.day_positions = _get_positions(list(model.days))
+        self.nutrient_positions = _get_positions(nutrients)
+
+        use_dish_meal_day = model.use_dish_meal_day
+        self.variables = list(use_dish_meal_day.values())
+        self.var_dish, var_meal, var_day = (
+            np.fromiter(
+                (positions[key[position]] for key in use_dish_meal_day),
+                dtype=np.int32,
+                count=len(self.variables),
+            )
+            for position, positions in enumerate((
+                self.dish_positions, self.meal_positions, self.day_positions
+            ))
+        )
+
+        num_days = len(self.day_positions)
+        self.meal_day_columns = _group_columns(
+            var_meal * num_days + var_day,
+            len(self.meal_positions) * num_days,
+        )
+        self.day_columns = _group_columns(var_day, num_days)
+        self.dish_columns = _group_columns(self.var_dish, len(dishes))
+
+        nutrient_dish = model.nutrient_dish.extract_values()
+        self.nutrient_matrix = np.fromiter(
+            (nutrient_dish[dish, nutrient] for dish in dishes for nutrient in nutrients),
+            dtype=float,
+            count=len(dishes) * len(nutrients),
+        ).reshape(len(dishes), len(nutrients))
+        # A single float object per (dish, nutrient), shared by all its terms.
+        self.nutrient_coefficients = self.nutrient_matrix.T.tolist()
+
+    def get_meal_expression(self, meal, day) -> LinearExpression:
+        """Return the number of dishes of a meal of a day."""
+        group = self.meal_positions[meal] * len(self.day_positions)
+        group += self.day_positions[day]
+        return self._get_sum(_get_group(self.meal_day_columns, group))
+
+    def get_nutrient_expression(self, nutrient, day) -> LinearExpression:
+        """Return the amount of a nutrient in a day."""
+        nutrient = self.nutrient_positions[nutrient]
+        columns = _get_group(self.day_columns, self.day_positions[day])
+        columns = columns[self.nutrient_matrix[self.var_dish[columns], nutrient] != 0]
+        coefficients = self.nutrient_coefficients[nutrient]
+        dishes = self.var_dish[columns].tolist()
+        variables = self.variables
+        return LinearExpression(
+            constant=0,
+            linear_coefs=[coefficients[dish] for dish in dishes],
+            linear_vars=[variables[column] for column in columns.tolist()],
+        )
+
+    def get_selections_expression(self, dish) -> Optional[LinearExpression]:
+        """Return the number of selections of a dish, or None if it has no variables."""
+        columns = _get_group(self.dish_columns, self.dish_positions[dish])
+        if not len(columns):
+            return None
+        return self._get_sum(columns)
+
+    def _get_sum(self, columns: np.ndarray) -> LinearExpression:
+        variables = self.variables
+        return LinearExpression([variables[column] for column in columns.tolist()])
+
+
+def build_index_space(model: AbstractModel) -> None:
+    """Code the dishes, meals and days of the variables as dense integers, to build
+    the constraints and the objective from arrays."""
+    model.index_space = IndexSpace(model)
+
+
+def release_index_space(model: AbstractModel) -> None:
+    """Release the index space once the model is built."""
+    del model.index_space
 
 
-def constraint_minimum_carbs_per_day(
+# Constraints definition
+def constraint_minimum_dishes_per_meal(
         model: AbstractModel,
+        meal,
         day,
 ) -> InequalityExpression:
-    """Carbs count per day is lower bounded."""
-    daily_carbs_count = _get_daily_metric_count(model, day, model.carbs_dish)
-    return daily_carbs_count >= model.carbs_min
+    """Each meal has at least 1 dish.
 
-
-def constraint_maximum_carbs_per_day(
-        model: AbstractModel,
-        day,
-) -> InequalityExpression:
-    """Carbs count per day is upper bounded."""
-    daily_carbs_count = _get_daily_metric_count(model, day, model.carbs_dish)
-    return daily_carbs_count <= model.carbs_max
+    Raises InfeasibleDietError if no dish suits the meal, instead of a constraint that
+    is always false.
+    """
+    dishes_per_meal = _get_num_of_dishes_in_meal(model, meal, day)
+    if dishes_per_meal.nargs() == 0:
+        raise InfeasibleDietError([Conflict(
+            [f'{CONSTRAINT_MINIMUM_DISHES_PER_MEAL}[{meal}, {day}]'],
+            f'No dish suits {meal} with the diet restrictions',
+        )])
+    return dishes_per_meal >= 1
 
 
-def constraint_minimum_fat_per_day(
+def constraint_maximum_dishes_per_meal(
         model: AbstractModel,
+        meal,
         day,
 ) -> InequalityExpression:
-    """Fat count per day is lower bounded."""
-    daily_fat_count = _get_daily_metric_count(model, day, model.fat_dish)
-    return daily_fat_count >= model.fat_min
+    """Each meal has at most 3 dishes."""
+    dishes_per_meal = _get_num_of_dishes_in_meal(model, meal, day)
+    return dishes_per_meal <= 1
 
 
-def constraint_maximum_fat_per_day(
+def constraint_nutrients_per_day(
         model: AbstractModel,
+        nutrient,
         day,
-) -> InequalityExpression:
-    """Fat count per day is upper bounded."""
-    daily_fat_count = _get_daily_metric_count(model, day, model.fat_dish)
-    return daily_fat_count <= model.fat_max
+) -> RangedExpression:
+    """Amount of each nutrient per day is lower and upper bounded."""
+    daily_nutrient_count = _get_daily_nutrient_count(model, nutrient, day)
+    return inequality(
+        model.nutrient_min[nutrient],
+        daily_nutrient_count,
+        model.nutrient_max[nutrient],
+    )
 
 
 def constraint_maximum_selections_per_dish(
@@ -442,34 +536,70 @@ def constraint_maximum_selections_per_dish(
         dish,
 ) -> InequalityExpression:
     """Number of selections of a dish in the diet is upper bounded."""
-    selections_dish = sum(
-        model.use_dish_meal_day[dish, meal, day]
-        for meal in model.meals
-        for day in model.days
-    )
+    selections_dish = model.index_space.get_selections_expression(dish)
+    if selections_dish is None:
+        return Constraint.Skip
     return selections_dish <= model.dish_selections_max
 
 
 # Objective function definition
 def diet_cost(model: AbstractModel) -> Expression:
-    return sum(
-        model.use_dish_meal_day[dish, meal, day] * model.cost_dish[dish]
-        for dish in model.dishes
-        for meal in model.meals
-        for day in model.days
+    index_space = model.index_space
+    cost_dish = [model.cost_dish[dish] for dish in model.dishes]
+    return LinearExpression(
+        constant=0,
+        linear_coefs=[cost_dish[dish] for dish in index_space.var_dish.tolist()],
+        linear_vars=index_space.variables,
     )
 
 
 # Private auxiliary util functions
+def _get_orbit_excluded_days(
+        ordering_dishes: List[str],
+        num_days: int,
+        selections_max: int,
+) -> Dict[str, List[int]]:
+    """Return, for each dish of the ordering meal (sorted by rank), the positions of the
+    days in which it cannot be when the days are sorted by rank: a day t with the dish
+    of rank r needs t + 1 <= selections_max * (r + 1), and num_days - t <=
+    selections_max * (len(ordering_dishes) - r). Dishes without excluded days are left
+    out."""
+    excluded_days = {}
+    for rank, dish in enumerate(ordering_dishes):
+        positions = [
+            position for position in range(num_days)
+            if position + 1 > selections_max * (rank + 1)
+            or num_days - position > selections_max * (len(ordering_dishes) - rank)
+        ]
+        if positions:
+            excluded_days[dish] = positions
+    return excluded_days
+
+
 def _get_num_of_dishes_in_meal(model: AbstractModel, meal, day):
     """Returns number of dishes that have been selected for a certain meal of a day."""
-    return sum(model.use_dish_meal_day[dish, meal, day] for dish in model.dishes)
+    return model.index_space.get_meal_expression(meal, day)
 
 
-def _get_daily_metric_count(model: AbstractModel, day, metric):
-    """Return the daily count of a certain metric (calories, protein, carb or fat)."""
-    return sum(
-        model.use_dish_meal_day[dish, meal, day] * metric[dish]
-        for dish in model.dishes
-        for meal in model.meals
-    )
+def _get_daily_nutrient_count(model: AbstractModel, nutrient, day):
+    """Return the daily amount of a certain nutrient (e.g. calories or protein)."""
+    return model.index_space.get_nutrient_expression(nutrient, day)
+
+
+def _get_positions(names: List[str]) -> Dict[str, int]:
+    """Return the position of each name in a list."""
+    return {name: position for position, name in enumerate(names)}
+
+
+def _group_columns(keys: np.ndarray, num_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Group the columns by key: return the columns sorted by key and the start of each
+    group (and the end of the last one) in them."""
+    columns = np.argsort(keys, kind='stable').astype(np.int32)
+    starts = np.searchsorted(keys[columns], np.arange(num_groups + 1))
+    return columns, starts
+
+
+def _get_group(groups: Tuple[np.ndarray, np.ndarray], group: int) -> np.ndarray:
+    """Return the columns of a group of `_group_columns`."""
+    columns, starts = groups
+    return columns[starts[group]:starts[group + 1]]
@@ -0,0 +1,351 @@
+"""Matrix-based construction of the diet model.
+
+Alternative build engine to `model.get_abstract_model`. Instead of evaluating a Python
+rule per constraint index, the whole constraint matrix is assembled at once from NumPy
+arrays (nutrient matrix x assignment tensor) and handed to the solver through a pyomo
+kernel `matrix_constraint`. The abstract model remains the reference implementation.
+"""
+import itertools
+import numpy as np
+import pyomo.kernel as pmo
+from pyomo.core.expr.numeric_expr import LinearExpression
+from pyomo.environ import value
+from scipy.sparse import coo_matrix, csr_matrix
+from typing import Any, Dict, List, Optional, Tuple
+
+from constants import (
+    COST_DISH,
+    DAYS,
+    DISHES,
+    DISH_ARRAYS,
+    DISH_SELECTIONS_MAX,
+    MEALS,
+    NUTRIENT_DISH,
+    NUTRIENT_MAX,
+    NUTRIENT_MIN,
+    NUTRIENTS,
+    SUITABLE,
+    VEGAN,
+    VEGAN_DISH,
+    VEGETARIAN,
+    VEGETARIAN_DISH,
+)
+
+
+class MatrixModel:
+    """Diet model expressed as `row_lower <= matrix @ x <= row_upper`.
+
+    Each column of the matrix is an admissible (dish, meal, day) cell, described by the
+    positions `var_dish`, `var_meal` and `var_day` in `dishes`, `meals` and `days`. The
+    amount of each nutrient of each dish is `nutrient_matrix` (dishes x nutrients).
+    Rows are, in this order: one per (meal, day) with the number of dishes in the meal,
+    one per (nutrient, day) with the daily nutrient count, and one per selectable dish
+    (`selectable_dishes`) with the number of times it is selected, up to
+    `dish_selections_max`.
+    """
+
+    def __init__(
+            self,
+            dishes: List[str],
+            meals: List[str],
+            days: List[str],
+            nutrients: List[str],
+            nutrient_matrix: np.ndarray,
+            var_dish: np.ndarray,
+            var_meal: np.ndarray,
+            var_day: np.ndarray,
+            cost: np.ndarray,
+            matrix: csr_matrix,
+            row_lower: np.ndarray,
+            row_upper: np.ndarray,
+            selectable_dishes: np.ndarray,
+            dish_selections_max: float,
+    ):
+        self.dishes: List[str] = dishes
+        self.meals: List[str] = meals
+        self.days: List[str] = days
+        self.nutrients: List[str] = nutrients
+        self.nutrient_matrix: np.ndarray = nutrient_matrix
+        self.var_dish: np.ndarray = var_dish
+        self.var_meal: np.ndarray = var_meal
+        self.var_day: np.ndarray = var_day
+        self.cost: np.ndarray = cost
+        self.matrix: csr_matrix = matrix
+        self.row_lower: np.ndarray = row_lower
+        self.row_upper: np.ndarray = row_upper
+        self.selectable_dishes: np.ndarray = selectable_dishes
+        self.dish_selections_max: float = dish_selections_max
+
+    @property
+    def num_variables(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def num_constraints(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def num_nonzeros(self) -> int:
+        return self.matrix.nnz
+
+    def get_day_rows(self, day: int) -> np.ndarray:
+        """Return the rows of the constraints of a day (meals and nutrients)."""
+        num_day_blocks = len(self.meals) + len(self.nutrients)
+        return np.arange(num_day_blocks) * len(self.days) + day
+
+    def get_day_columns(self, day: int) -> np.ndarray:
+        """Return the columns of the variables of a day."""
+        return np.flatnonzero(self.var_day == day)
+
+    def variable_keys(self) -> List[Tuple[str, str, str]]:
+        """Return the (dish, meal, day) key of each column, in column order."""
+        return [
+            (self.dishes[dish], self.meals[meal], self.days[day])
+            for dish, meal, day in zip(
+                self.var_dish.tolist(), self.var_meal.tolist(), self.var_day.tolist()
+            )
+        ]
+
+    def to_kernel_block(self) -> pmo.block:
+        """Build a pyomo kernel block that can be handed to any pyomo solver.
+
+        Besides the variables, constraints and objective, the block exposes the same
+        attributes as the concrete model built from `get_abstract_model` that are needed
+        to read the solution (`days`, `meals`, `admissible_dishes_meal`, nutrients and
+        cost per dish...), so it can be used with `solver.Solver` as is.
+        """
+        block = pmo.block()
+        block.use_dish_meal_day = pmo.variable_dict(
+            (key, pmo.variable(domain=pmo.Binary)) for key in self.variable_keys()
+        )
+        variables = list(block.use_dish_meal_day.values())
+        block.constraints = pmo.matrix_constraint(
+            self.matrix,
+            lb=self.row_lower,
+            ub=self.row_upper,
+            x=variables,
+        )
+        block.objective_function = pmo.objective(
+            LinearExpression(
+                constant=0,
+                linear_coefs=self.cost.tolist(),
+                linear_vars=variables,
+            ),
+            sense=pmo.minimize,
+        )
+
+        block.matrix_model = self
+        block.days = self.days
+        block.meals = self.meals
+        block.dishes = self.dishes
+        block.nutrients = self.nutrients
+        block.admissible_dishes_meal = {meal: [] for meal in self.meals}
+        for dish, meal in zip(*self._admissible_pairs()):
+            block.admissible_dishes_meal[self.meals[meal]].append(self.dishes[dish])
+        block.nutrient_dish = dict(zip(
+            itertools.product(self.dishes, self.nutrients),
+            self.nutrient_matrix.ravel().tolist(),
+        ))
+        cost_dish = np.zeros(len(self.dishes))
+        cost_dish[self.var_dish] = self.cost
+        block.cost_dish = dict(zip(self.dishes, cost_dish.tolist()))
+        return block
+
+    def _admissible_pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the positions (dish, meal) that have variables, sorted by dish."""
+        first_day = self.var_day == 0
+        return self.var_dish[first_day], self.var_meal[first_day]
+
+
+def get_matrix_model(problem_data: Dict[Optional[str], Any]) -> MatrixModel:
+    """Assemble the diet model matrix from the problem data (as a pyomo dict).
+
+    The model is the same as the one of `model.get_abstract_model`, with variables only
+    for admissible (dish, meal, day) cells and the min/max constraints of each meal and
+    nutrient merged into ranged rows.
+    """
+    data = problem_data[None]
+    days = list(data[DAYS][None])
+    meals = list(data[MEALS][None])
+    dishes = list(data[DISHES][None])
+    nutrients = list(data[NUTRIENTS][None])
+    num_days = len(days)
+    num_meals = len(meals)
+    nutrient_matrix, cost_dish, admissible = get_dish_arrays(problem_data)
+    pair_dish, pair_meal = np.nonzero(admissible)
+
+    var_dish = np.repeat(pair_dish, num_days)
+    var_meal = np.repeat(pair_meal, num_days)
+    var_day = np.tile(np.arange(num_days), len(pair_dish))
+    num_vars = len(var_dish)
+    columns = np.arange(num_vars)
+
+    # Dishes per meal and day.
+    meal_rows = var_meal * num_days + var_day
+    num_meal_rows = num_meals * num_days
+
+    # Nutrient count per day, one block of rows per nutrient.
+    num_nutrients = len(nutrients)
+    nutrient_rows = (
+        num_meal_rows
+        + np.arange(num_nutrients)[:, np.newaxis] * num_days
+        + var_day[np.newaxis, :]
+    )
+    nutrient_coefficients = nutrient_matrix[var_dish].T
+    num_nutrient_rows = num_nutrients * num_days
+
+    # Selections per dish, only for dishes that can be selected.
+    selectable_dishes = np.unique(pair_dish)
+    dish_rows = (
+        num_meal_rows
+        + num_nutrient_rows
+        + np.searchsorted(selectable_dishes, var_dish)
+    )
+    num_rows = num_meal_rows + num_nutrient_rows + len(selectable_dishes)
+
+    matrix = coo_matrix(
+        (
+            np.concatenate([
+                np.ones(num_vars),
+                nutrient_coefficients.ravel(),
+                np.ones(num_vars),
+            ]),
+            (
+                np.concatenate([meal_rows, nutrient_rows.ravel(), dish_rows]),
+                np.concatenate([columns, np.tile(columns, num_nutrients), columns]),
+            ),
+        ),
+        shape=(num_rows, num_vars),
+    ).tocsr()
+    matrix.eliminate_zeros()
+
+    row_lower = np.concatenate([
+        np.ones(num_meal_rows),
+        np.repeat(
+            [data[NUTRIENT_MIN][nutrient] for nutrient in nutrients], num_days
+        ).astype(float),
+        np.full(len(selectable_dishes), -np.inf),
+    ])
+    dish_selections_max = float(data[DISH_SELECTIONS_MAX][None])
+    row_upper = np.concatenate([
+        np.ones(num_meal_rows),
+        np.repeat(
+            [data[NUTRIENT_MAX][nutrient] for nutrient in nutrients], num_days
+        ).astype(float),
+        np.full(len(selectable_dishes), dish_selections_max),
+    ])
+
+    return MatrixModel(
+        dishes=dishes,
+        meals=meals,
+        days=days,
+        nutrients=nutrients,
+        nutrient_matrix=nutrient_matrix,
+        var_dish=var_dish,
+        var_meal=var_meal,
+        var_day=var_day,
+        cost=cost_dish[var_dish],
+        matrix=matrix,
+        row_lower=row_lower,
+        row_upper=row_upper,
+        selectable_dishes=selectable_dishes,
+        dish_selections_max=dish_selections_max,
+    )
+
+
+def get_dish_arrays(
+        problem_data: Dict[Optional[str], Any],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the nutrient matrix (dishes x nutrients), the cost of each dish and
+    whether each dish is admissible for each meal (dishes x meals: suitable for the
+    meal and respecting the diet), in the order of the sets of the problem data.
+
+    They come from the arrays of the dishes of the problem data if it has them (see
+    `data_builder.get_problem_data`), and from its pyomo dict otherwise.
+    """
+    data = problem_data[None]
+    dishes = list(data[DISHES][None])
+    dish_arrays = problem_data.get(DISH_ARRAYS)
+    if dish_arrays is not None:
+        nutrient_matrix = dish_arrays.nutrient_matrix
+        suitable = dish_arrays.meal_matrix
+
+        def dish_column(param_name: str) -> np.ndarray:
+            return dish_arrays.columns[param_name].astype(float)
+    else:
+        nutrient_matrix, suitable = _get_dish_matrices(data)
+
+        def dish_column(param_name: str) -> np.ndarray:
+            param = data[param_name]
+            return np.fromiter((param[dish] for dish in dishes), float, len(dishes))
+
+    cost_dish = dish_column(COST_DISH)
+    respects_diet = np.ones(len(dishes), dtype=bool)
+    if data[VEGETARIAN][None]:
+        respects_diet &= dish_column(VEGETARIAN_DISH).astype(bool)
+    if data[VEGAN][None]:
+        respects_diet &= dish_column(VEGAN_DISH).astype(bool)
+    return nutrient_matrix, cost_dish, suitable & respects_diet[:, np.newaxis]
+
+
+def get_instance_matrix_model(model: Any) -> MatrixModel:
+    """Return the matrix model of a model built from `model.get_abstract_model` (with
+    the current values of its parameters) or `MatrixModel.to_kernel_block`."""
+    if isinstance(getattr(model, 'matrix_model', None), MatrixModel):
+        return model.matrix_model
+    return get_matrix_model(get_instance_data(model))
+
+
+def get_instance_data(model: Any) -> Dict[Optional[str], Any]:
+    """Return the problem data (as a pyomo dict) of a model built from
+    `model.get_abstract_model`, with the current values of its parameters."""
+    data = {
+        DAYS: {None: list(model.days)},
+        MEALS: {None: list(model.meals)},
+        DISHES: {None: list(model.dishes)},
+        NUTRIENTS: {None: list(model.nutrients)},
+        SUITABLE: model.suitable.extract_values(),
+        NUTRIENT_DISH: model.nutrient_dish.extract_values(),
+        COST_DISH: model.cost_dish.extract_values(),
+        VEGETARIAN_DISH: model.vegetarian_dish.extract_values(),
+        VEGAN_DISH: model.vegan_dish.extract_values(),
+    }
+    for param_name in (NUTRIENT_MIN, NUTRIENT_MAX):
+        param = getattr(model, param_name)
+        data[param_name] = {index: value(param[index]) for index in param}
+    for param_name in (VEGETARIAN, VEGAN, DISH_SELECTIONS_MAX):
+        data[param_name] = {None: value(getattr(model, param_name))}
+    return {None: data}
+
+
+def load_solution(model: Any, matrix_model: MatrixModel, solution: np.ndarray) -> None:
+    """Set the values of the variables of the model to the solution of its matrix
+    model (the variables of the model that are not in the matrix model are set to 0)."""
+    use_dish_meal_day = model.use_dish_meal_day
+    for key in use_dish_meal_day:
+        use_dish_meal_day[key].value = 0
+    for key, solution_value in zip(matrix_model.variable_keys(), solution.tolist()):
+        if solution_value > 0.5 and key in use_dish_meal_day:
+            use_dish_meal_day[key].value = 1
+
+
+def _get_dish_matrices(data: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the nutrient matrix (dishes x nutrients) and whether each dish is suitable
+    for each meal (dishes x meals) from the pyomo dict of the problem data."""
+    meals = list(data[MEALS][None])
+    dishes = list(data[DISHES][None])
+    nutrients = list(data[NUTRIENTS][None])
+    nutrient_dish = data[NUTRIENT_DISH]
+    nutrient_matrix = np.fromiter(
+        (nutrient_dish[dish, nutrient] for dish in dishes for nutrient in nutrients),
+        float,
+        len(dishes) * len(nutrients),
+    ).reshape(len(dishes), len(nutrients))
+    # Parameter 'suitable' may be sparse (only the suitable pairs are given).
+    dish_positions = {dish: position for position, dish in enumerate(dishes)}
+    meal_positions = {meal: position for position, meal in enumerate(meals)}
+    suitable = np.zeros((len(dishes), len(meals)), dtype=bool)
+    for (dish, meal), is_suitable in data[SUITABLE].items():
+        if is_suitable and meal in meal_positions:
+            suitable[dish_positions[dish], meal_positions[meal]] = True
+    return nutrient_matrix, suitable
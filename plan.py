@@ -0,0 +1,255 @@
+"""Structured diet plans, extracted from a solved model in bulk."""
+import json
+import numpy as np
+import os
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+from constants import COST_DISH, DAYS, DISHES, MEALS, NUTRIENT_DISH, NUTRIENTS
+from data_provider import get_nutrient_names
+
+DAY = 'day'
+MEAL = 'meal'
+DISH = 'dish'
+
+
+class Plan:
+    """A diet: the dishes selected for each meal of each day, with their nutrients.
+
+    The selections are kept as a dataframe with one row per selected dish, sorted by
+    day and meal, with the columns `day`, `meal`, `dish` and the nutrients and cost of
+    the dish.
+
+    The lower bound of the optimal cost, if the solver reports it, tells how far from
+    the optimum the plan can be (see `gap`).
+
+    Example of extract of `selections_df`:
+        day     meal       dish              calories_dish  protein_dish  ...  cost_dish
+    0   monday  breakfast  Avocado Toast     250            6             ...  2.5
+    1   monday  lunch      Lentil Soup       300            18            ...  3.0
+    """
+
+    def __init__(
+            self,
+            selections_df: pd.DataFrame,
+            days: List[str],
+            meals: List[str],
+            nutrients: List[str],
+            lower_bound: Optional[float] = None,
+    ):
+        self.selections_df: pd.DataFrame = selections_df
+        self.days: List[str] = days
+        self.meals: List[str] = meals
+        self.nutrients: List[str] = nutrients
+        self.lower_bound: Optional[float] = lower_bound
+
+    @property
+    def cost(self) -> float:
+        return float(self.selections_df[COST_DISH].sum())
+
+    @property
+    def gap(self) -> Optional[float]:
+        """Relative gap between the cost of the plan and the lower bound of the optimal
+        cost: `(cost - lower_bound) / cost`."""
+        if self.lower_bound is None:
+            return None
+        return (self.cost - self.lower_bound) / max(abs(self.cost), 1e-9)
+
+    @property
+    def selections(self) -> List[Tuple[str, str, str]]:
+        """The (day, meal, dish) selections of the diet."""
+        return list(self.selections_df[[DAY, MEAL, DISH]].itertuples(
+            index=False, name=None
+        ))
+
+    def get_daily_totals(self) -> pd.DataFrame:
+        """Return the nutrients and cost of each day of the diet.
+
+        Example of extract of output:
+                calories_dish  protein_dish  carbs_dish  fat_dish  cost_dish
+        day
+        monday  1250           52            160         45        7.2
+        """
+        dish_values = get_dish_value_columns(self.nutrients)
+        daily_totals = self.selections_df.groupby(DAY, sort=False)[dish_values].sum()
+        return daily_totals.reindex(self.days, fill_value=0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'cost': self.cost,
+            'lower_bound': self.lower_bound,
+            'gap': self.gap,
+            'selections': self.selections_df.to_dict('records'),
+            'daily_totals': self.get_daily_totals().reset_index().to_dict('records'),
+        }
+
+    def to_json(self, path: str) -> None:
+        with open(path, 'wt') as f:
+            json.dump(self.to_dict(), f, indent=2, default=_to_json_value)
+
+    def to_csv(self, path: str) -> None:
+        self.selections_df.to_csv(path, index=False)
+
+    def to_parquet(self, path: str) -> None:
+        """Write the selections to a Parquet file (requires pyarrow or fastparquet)."""
+        self.selections_df.to_parquet(path, index=False)
+
+    def export(self, path: str) -> None:
+        """Write the plan in the format given by the extension of the path (.json, .csv
+        or .parquet)."""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.json':
+            self.to_json(path)
+        elif extension == '.csv':
+            self.to_csv(path)
+        elif extension == '.parquet':
+            self.to_parquet(path)
+        else:
+            raise ValueError(f'Unknown plan format: {extension}')
+
+    def print(self) -> None:
+        print()
+        print('Diet cost: ' + str(self.cost) + '€')
+        if self.gap is not None:
+            print(f'Lower bound: {self.lower_bound:.2f}€ (gap: {self.gap:.2%})')
+        print()
+
+        dishes_by_day_meal = self.selections_df.groupby([DAY, MEAL], sort=False)[DISH]
+        dishes_by_day_meal = dishes_by_day_meal.apply(list).to_dict()
+        daily_totals = self.get_daily_totals()
+        for day in self.days:
+            print('--------' + day.upper() + '--------')
+            for meal in self.meals:
+                print('----' + meal.upper() + '----')
+                for dish in dishes_by_day_meal.get((day, meal), []):
+                    print(dish)
+                print()
+            print('----STATS DAY----')
+            for nutrient in self.nutrients:
+                daily_total = daily_totals.at[day, get_nutrient_names(nutrient)[0]]
+                print(nutrient.capitalize() + ': ' + _format_total(daily_total))
+            print()
+
+
+def extract_plan(model: Any, lower_bound: Optional[float] = None) -> Plan:
+    """Extract the plan from a solved model, built from `model.get_abstract_model` or
+    `MatrixModel.to_kernel_block`, with the lower bound of the optimal cost, if known.
+
+    The values of all the variables are read in a single pass, and the nutrients and
+    cost of the selected dishes are gathered with array indexing, instead of looking
+    up the parameters of each selection.
+    """
+    days = list(model.days)
+    meals = list(model.meals)
+    nutrients = list(model.nutrients)
+    variable_values = _get_variable_values(model.use_dish_meal_day)
+    keys = list(variable_values.keys())
+    values = np.fromiter(
+        (value or 0 for value in variable_values.values()), float, len(keys)
+    )
+    selected = np.flatnonzero(values > 0.5)
+
+    selections_df = pd.DataFrame(
+        [keys[position] for position in selected], columns=[DISH, MEAL, DAY]
+    )
+    return _build_plan(
+        selections_df,
+        days=days,
+        meals=meals,
+        nutrients=nutrients,
+        dishes=list(model.dishes),
+        nutrient_dish=_get_param_values(model.nutrient_dish),
+        cost_dish=_get_param_values(model.cost_dish),
+        lower_bound=lower_bound,
+    )
+
+
+def get_plan_from_selections(
+        problem_data: Dict[Optional[str], Any],
+        selections: List[Tuple[str, str, str]],
+        lower_bound: Optional[float] = None,
+) -> Plan:
+    """Build the plan of some (day, meal, dish) selections (e.g. of a cached solution)
+    with the nutrients and costs of the problem data (see
+    `data_builder.get_problem_data`), without a model."""
+    data = problem_data[None]
+    return _build_plan(
+        pd.DataFrame(selections, columns=[DAY, MEAL, DISH]),
+        days=list(data[DAYS][None]),
+        meals=list(data[MEALS][None]),
+        nutrients=list(data[NUTRIENTS][None]),
+        dishes=list(data[DISHES][None]),
+        nutrient_dish=data[NUTRIENT_DISH],
+        cost_dish=data[COST_DISH],
+        lower_bound=lower_bound,
+    )
+
+
+def _build_plan(
+        selections_df: pd.DataFrame,
+        days: List[str],
+        meals: List[str],
+        nutrients: List[str],
+        dishes: List[str],
+        nutrient_dish: Dict[Tuple[str, str], float],
+        cost_dish: Dict[str, float],
+        lower_bound: Optional[float],
+) -> Plan:
+    """Add the nutrients and cost of the dishes to the selections (with the columns
+    `day`, `meal` and `dish`), and sort them by day and meal."""
+    dish_positions = pd.Index(dishes).get_indexer(selections_df[DISH])
+    for nutrient in nutrients:
+        selections_df[get_nutrient_names(nutrient)[0]] = np.array(
+            [nutrient_dish[dish, nutrient] for dish in dishes]
+        )[dish_positions]
+    selections_df[COST_DISH] = np.array(
+        [cost_dish[dish] for dish in dishes]
+    )[dish_positions]
+
+    order = np.lexsort([
+        pd.Index(meals).get_indexer(selections_df[MEAL]),
+        pd.Index(days).get_indexer(selections_df[DAY]),
+    ])
+    dish_values = get_dish_value_columns(nutrients)
+    selections_df = selections_df.iloc[order][[DAY, MEAL, DISH] + dish_values]
+    return Plan(
+        selections_df=selections_df.reset_index(drop=True),
+        days=days,
+        meals=meals,
+        nutrients=nutrients,
+        lower_bound=lower_bound,
+    )
+
+
+def get_dish_value_columns(nutrients: List[str]) -> List[str]:
+    """Return the columns of the plan with the values of each dish that are added up
+    per day: its nutrients and cost."""
+    return [get_nutrient_names(nutrient)[0] for nutrient in nutrients] + [COST_DISH]
+
+
+def _get_variable_values(variables: Any) -> Dict[Any, Optional[float]]:
+    """Return the value of each variable of an indexed (or kernel dict) variable."""
+    if hasattr(variables, 'extract_values'):
+        return variables.extract_values()
+    return {key: variable.value for key, variable in variables.items()}
+
+
+def _get_param_values(param: Any) -> Dict[str, Any]:
+    """Return the value of each index of a parameter (or of a dict, in kernel blocks)."""
+    if hasattr(param, 'extract_values'):
+        return param.extract_values()
+    return param
+
+
+def _to_json_value(obj: Any) -> Any:
+    """Convert NumPy scalars, which the json module does not support."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _format_total(total: float) -> str:
+    """Format a daily total as the dish amounts add up: integral totals (e.g. 950)
+    without decimals."""
+    total = float(total)
+    return str(int(total)) if total.is_integer() else str(total)
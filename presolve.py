@@ -0,0 +1,228 @@
+"""Presolve of the dish catalog for a diet profile, before the model is built.
+
+Each meal of a day has exactly one dish, and the only constraint that couples the days
+is the maximum number of selections per dish. So a dish can be dropped from the catalog
+when enough cheaper (or equally cheap) dishes of the same meals are at least as good for
+every daily nutrient bound: any diet using it can swap it for one of them, without
+increasing the cost nor breaking any constraint. The optimum is thus unchanged.
+"""
+import math
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List
+
+from constants import (
+    COST_DISH,
+    DISH_SELECTIONS_MAX,
+    VEGAN,
+    VEGAN_DISH,
+    VEGETARIAN,
+    VEGETARIAN_DISH,
+)
+from data_converter_pyomo import get_meal_matrix, get_nutrient_matrix
+from data_provider import get_nutrient_names, get_nutrients_data
+
+# Reasons why a dish is removed from the catalog.
+REMOVED_INADMISSIBLE = 'inadmissible'
+REMOVED_DUPLICATE = 'duplicate'
+REMOVED_DOMINATED = 'dominated'
+REMOVED_REASONS = (REMOVED_INADMISSIBLE, REMOVED_DUPLICATE, REMOVED_DOMINATED)
+
+
+class CatalogPresolver:
+    """Removes the dishes that cannot improve the optimal diet of a diet profile.
+
+    A dish is removed if:
+    - It is inadmissible: it does not respect the diet or no meal of the diet suits it.
+    - It is a duplicate: another kept dish of the same meals has the same nutrients and
+      cost.
+    - It is dominated: other kept dishes of the same meals are not costlier and at least
+      as good for each daily nutrient bound that can be active (more of a nutrient is
+      better if only its minimum can be active, less if only its maximum can, and equal
+      if both can).
+
+    Duplicates and dominated dishes are only removed when enough kept dishes replace
+    them to cover every day of the diet without exceeding the selections of each dish.
+    Each removed dish is mapped in `substitutes` to the kept dish that replaces it.
+
+    The presolved catalog is only valid for the diet information it was computed with
+    (e.g. it must not be reused after `PersistentSolver.update_diet_info`).
+    """
+
+    def __init__(self, diet_info_df: pd.DataFrame):
+        self.diet_info_df: pd.DataFrame = diet_info_df
+        self.substitutes: Dict[str, str] = {}
+        self.removed: Dict[str, str] = {}
+        self.report: Dict[str, Any] = {}
+
+    def presolve(
+            self,
+            dishes_df: pd.DataFrame,
+            meals: List[str],
+            num_days: int,
+    ) -> pd.DataFrame:
+        """Return the dishes data without the dishes that can be removed.
+
+        The input has the format of `data_provider.get_dishes_data`, and so does the
+        output, so it can be converted with `dishes_to_pyomo_dict` as is.
+        """
+        diet_info = self.diet_info_df.iloc[0]
+        self.substitutes = {}
+        self.removed = {}
+
+        meal_matrix = get_meal_matrix(dishes_df, meals)
+        admissible = meal_matrix.any(axis=1)
+        if diet_info[VEGETARIAN]:
+            admissible &= dishes_df[VEGETARIAN_DISH].astype(bool).to_numpy()
+        if diet_info[VEGAN]:
+            admissible &= dishes_df[VEGAN_DISH].astype(bool).to_numpy()
+        for dish in dishes_df.index[~admissible]:
+            self.removed[dish] = REMOVED_INADMISSIBLE
+        admissible_df = dishes_df[admissible]
+        meal_matrix = meal_matrix[admissible]
+
+        nutrient_names = [
+            get_nutrient_names(nutrient) for nutrient in get_nutrients_data()
+        ]
+        nutrients = get_nutrient_matrix(admissible_df, get_nutrients_data())
+        directions = _get_nutrient_directions(
+            nutrients,
+            meal_matrix,
+            lower=np.array([diet_info[min_name] for _, min_name, _ in nutrient_names]),
+            upper=np.array([diet_info[max_name] for _, _, max_name in nutrient_names]),
+        )
+
+        kept = np.ones(len(admissible_df), dtype=bool)
+        # Dishes can only replace dishes of the same meals, with the same nutrients for
+        # the nutrients whose bounds can both be active.
+        group_keys = pd.DataFrame(
+            np.hstack([nutrients[:, directions == 0], meal_matrix])
+        )
+        groups = group_keys.groupby(list(group_keys.columns), sort=False).indices
+        for group in groups.values():
+            # Enough kept dishes to cover the meals of the group every day, each
+            # selected at most the maximum number of selections.
+            num_replacements = math.ceil(
+                num_days * meal_matrix[group[0]].sum() / diet_info[DISH_SELECTIONS_MAX]
+            )
+            self._presolve_group(
+                group,
+                admissible_df,
+                nutrients,
+                directions,
+                num_replacements,
+                kept,
+            )
+
+        presolved_df = admissible_df[kept]
+        self.report = {
+            'dishes': {'before': len(dishes_df), 'after': len(presolved_df)},
+            'removed': {
+                reason: sum(1 for removed in self.removed.values() if removed == reason)
+                for reason in REMOVED_REASONS
+            },
+            'variables': {
+                'before': int(meal_matrix.sum()) * num_days,
+                'after': int(meal_matrix[kept].sum()) * num_days,
+            },
+        }
+        return presolved_df
+
+    def get_report(self) -> Dict[str, Any]:
+        """Return how much the presolve shrank the catalog and the model.
+
+        Example of output:
+        {
+            'dishes': {'before': 75, 'after': 31},
+            'removed': {'inadmissible': 0, 'duplicate': 2, 'dominated': 42},
+            'variables': {'before': 525, 'after': 217},
+        }
+        """
+        return self.report
+
+    def get_duplicates(self, dish: str) -> List[str]:
+        """Return the removed duplicates of a kept dish, which can replace it in any
+        diet at the same cost."""
+        return [
+            removed_dish
+            for removed_dish, substitute in self.substitutes.items()
+            if substitute == dish and self.removed[removed_dish] == REMOVED_DUPLICATE
+        ]
+
+    def _presolve_group(
+            self,
+            group: np.ndarray,
+            dishes_df: pd.DataFrame,
+            nutrients: np.ndarray,
+            directions: np.ndarray,
+            num_replacements: int,
+            kept: np.ndarray,
+    ) -> None:
+        """Presolve a group of dishes of the same meals and the same nutrients that
+        must be equal, marking the removed ones in `kept`."""
+        costs = dishes_df[COST_DISH].to_numpy(dtype=float)[group]
+        # Nutrients with a single active bound, where a greater score is better.
+        scores = (nutrients[group] * directions)[:, np.abs(directions) == 1]
+        # Dishes that dominate another one come before it.
+        order = np.lexsort(
+            [-scores[:, column] for column in reversed(range(scores.shape[1]))]
+            + [costs]
+        )
+        names = dishes_df.index[group]
+
+        kept_positions: List[int] = []
+        for position in order:
+            dominators = []
+            if len(kept_positions) >= num_replacements:
+                candidates = np.array(kept_positions)
+                dominators = candidates[
+                    np.all(scores[candidates] >= scores[position], axis=1)
+                ].tolist()
+            if len(dominators) < num_replacements:
+                kept_positions.append(position)
+                continue
+
+            kept[group[position]] = False
+            duplicates = [
+                dominator
+                for dominator in dominators
+                if costs[dominator] == costs[position] and np.array_equal(
+                    nutrients[group[dominator]], nutrients[group[position]]
+                )
+            ]
+            substitute = duplicates[0] if duplicates else dominators[0]
+            self.substitutes[names[position]] = names[substitute]
+            self.removed[names[position]] = (
+                REMOVED_DUPLICATE if duplicates else REMOVED_DOMINATED
+            )
+
+
+def _get_nutrient_directions(
+        nutrients: np.ndarray,
+        meal_matrix: np.ndarray,
+        lower: np.ndarray,
+        upper: np.ndarray,
+) -> np.ndarray:
+    """Return, for each nutrient, which daily bounds can be active.
+
+    A bound can be active if some choice of a dish per meal violates it. The direction
+    is 1 if only the minimum can be active, -1 if only the maximum can, 0 if both can,
+    and NaN if none can.
+    """
+    directions = np.full(nutrients.shape[1], np.nan)
+    if len(nutrients) == 0:
+        return directions
+    served_meals = np.flatnonzero(meal_matrix.any(axis=0))
+    day_minimum = sum(
+        nutrients[meal_matrix[:, meal]].min(axis=0) for meal in served_meals
+    )
+    day_maximum = sum(
+        nutrients[meal_matrix[:, meal]].max(axis=0) for meal in served_meals
+    )
+    lower_active = day_minimum < lower
+    upper_active = day_maximum > upper
+
+    directions[lower_active & ~upper_active] = 1
+    directions[~lower_active & upper_active] = -1
+    directions[lower_active & upper_active] = 0
+    return directions
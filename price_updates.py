@@ -0,0 +1,350 @@
+"""Streaming dish price updates on live diet plans.
+
+Dish costs change during the day (e.g. from a supplier feed). Instead of reading the
+catalog, building the model and solving it from scratch for every change and every
+profile, a `LivePlan` keeps the model of a profile in a persistent HiGHS session (see
+`solver.PersistentSolver`), where a price change only changes objective coefficients.
+Most changes do not even need a re-solve: the plan is kept if it is still proven
+optimal with the new prices (see `LivePlan.update_prices`), and only the other plans are
+re-solved, warm-started from their previous diet.
+
+Example of usage (throughput check on the bundled catalog and 4 profiles):
+$ python price_updates.py --updates 500 --profiles 4
+"""
+import argparse
+import numpy as np
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import highspy
+from pyomo.environ import value
+
+from constants import (
+    COST_DISH,
+    DIET,
+    PRICE_UPDATE_BOUND,
+    PRICE_UPDATE_RESOLVED,
+    PRICE_UPDATE_UNAFFECTED,
+)
+from data_builder import get_catalog_data, get_problem_data
+from data_provider import get_diet_info_data
+from model import get_abstract_model
+from plan import Plan, extract_plan
+from solver import PersistentSolver
+from solver_backends import SolverOptions
+
+# A price update: the dish and its new cost [€].
+PriceUpdate = Tuple[str, float]
+
+
+class LivePlan:
+    """Optimal diet of a profile, kept up to date as dish prices change.
+
+    After each solve, an optimality certificate is kept (see `_Certificate`): the
+    lower bound of the search, and the reduced costs of the LP relaxation. A price
+    update is then screened in time proportional to the variables of the dishes
+    changed since the last solve:
+    - PRICE_UPDATE_UNAFFECTED: Only dishes outside the plan became more expensive, so
+      the plan is still optimal.
+    - PRICE_UPDATE_BOUND: The cost of the plan with the new prices is within the gap of
+      a lower bound of the new optimal cost.
+    - PRICE_UPDATE_RESOLVED: Otherwise, the model is re-solved, warm-started from the
+      previous diet.
+    The gap accepted is the one of the solver options (or the one reached at the last
+    solve, if it was stopped by the time limit), so a screened plan is as optimal as a
+    re-solved one.
+
+    Changes of the model other than prices (e.g. `PersistentSolver.update_diet_info`)
+    are not screened: call `solve` after them.
+
+    Example:
+        live_plan = LivePlan(solver)
+        live_plan.solve()
+        live_plan.update_prices({'Caesar Salad': 4.5})
+        plan = live_plan.get_plan()
+    """
+
+    def __init__(self, solver: PersistentSolver, screening: bool = True):
+        self.solver: PersistentSolver = solver
+        self.screening: bool = screening
+        self.cost: Optional[float] = None
+        self.lower_bound: Optional[float] = None
+        self._certificate: Optional[_Certificate] = None
+
+    def solve(self) -> bool:
+        """Solve the model, warm-started from the previous diet. Returns whether a diet
+        was found."""
+        self.solver.solve()
+        if not self.solver.solution_exists():
+            self.cost = self.lower_bound = None
+            self._certificate = None
+            return False
+        self._certificate = _Certificate(self.solver)
+        self.cost = self._certificate.cost
+        self.lower_bound = self._certificate.lower_bound
+        return True
+
+    def update_prices(self, dish_costs: Dict[str, float]) -> Optional[str]:
+        """Change the cost of some dishes, re-solving only if the plan may not be
+        optimal anymore. Returns the outcome of the update (PRICE_UPDATE_...), or None
+        if no cost changed."""
+        changed_dishes = self.solver.update_dish_costs(dish_costs)
+        if not changed_dishes:
+            return None
+        if self.screening and self._certificate is not None:
+            outcome = self._certificate.screen(changed_dishes)
+            if outcome is not None:
+                self.cost = self._certificate.new_cost
+                self.lower_bound = self._certificate.new_lower_bound
+                return outcome
+        self.solve()
+        return PRICE_UPDATE_RESOLVED
+
+    def get_plan(self) -> Optional[Plan]:
+        """Return the diet with the current prices, or None if there is none."""
+        if self.cost is None:
+            return None
+        return extract_plan(self.solver.concrete_model, lower_bound=self.lower_bound)
+
+
+class PriceUpdateReport:
+    """Outcome of a stream of price updates (see `apply_price_updates`)."""
+
+    def __init__(self, updates: int, outcomes: Counter, elapsed: float):
+        self.updates: int = updates
+        self.outcomes: Counter = outcomes
+        self.elapsed: float = elapsed
+
+    @property
+    def updates_per_second(self) -> float:
+        """Price updates absorbed per second, by all the plans."""
+        return self.updates / self.elapsed if self.elapsed > 0 else float('inf')
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Example of output:
+            {'updates': 500, 'elapsed': 2.1, 'updates_per_second': 238.1,
+             'outcomes': {'unaffected': 1712, 'bound': 211, 'resolved': 77}}
+        """
+        return {
+            'updates': self.updates,
+            'elapsed': self.elapsed,
+            'updates_per_second': self.updates_per_second,
+            'outcomes': dict(self.outcomes),
+        }
+
+
+def apply_price_updates(
+        live_plans: List[LivePlan],
+        updates: Iterable[PriceUpdate],
+        batch_size: int = 1,
+) -> PriceUpdateReport:
+    """Apply a stream of price updates to several live plans (e.g. one per profile).
+
+    The updates are applied in batches of `batch_size` updates (the last price of each
+    dish in a batch wins), so that a plan that has to be re-solved is re-solved once
+    per batch. The outcomes are counted per plan and batch.
+    """
+    start = time.perf_counter()
+    outcomes: Counter = Counter()
+    num_updates = 0
+    batch: Dict[str, float] = {}
+    for position, (dish, cost) in enumerate(updates, start=1):
+        num_updates = position
+        batch[dish] = cost
+        if position % batch_size == 0:
+            _apply_batch(live_plans, batch, outcomes)
+            batch = {}
+    if batch:
+        _apply_batch(live_plans, batch, outcomes)
+    return PriceUpdateReport(num_updates, outcomes, time.perf_counter() - start)
+
+
+def _apply_batch(
+        live_plans: List[LivePlan],
+        batch: Dict[str, float],
+        outcomes: Counter,
+) -> None:
+    for live_plan in live_plans:
+        outcome = live_plan.update_prices(batch)
+        if outcome is not None:
+            outcomes[outcome] += 1
+
+
+class _Certificate:
+    """Optimality certificate of the diet found by the last solve of a persistent
+    session, which bounds the new optimal cost after a change of dish costs.
+
+    With `delta` the change of cost of each variable (the variables of a dish change as
+    its cost), any diet x costs `old_cost(x) + delta @ x`, which gives three bounds:
+    - Diets that use no cheaper (unfixed) variable cost at least the lower bound of the
+      last search, plus the change of the fixed variables.
+    - Diets that use a cheaper variable j cost at least the bound of the LP relaxation
+      with the new costs, from the reduced costs r of the last one, `lp_bound +
+      sum(min(r' * lower, r' * upper) - min(r * lower, r * upper)) + max(0, r'_j)` with
+      `r' = r + delta` (r' of the variables at 1 in x are at least `max(0, r'_j)`).
+    - Any diet costs at least the lower bound of the last search, plus the change of the
+      fixed variables, plus the decreases of cost of each dish times the number of times
+      it can be selected.
+    The new optimal cost is at least the minimum of the first two, and at least the
+    third.
+    """
+
+    def __init__(self, solver: PersistentSolver):
+        model = solver.concrete_model
+        highs = solver.get_highs()
+        info = highs.getInfo()
+
+        dish_positions = {dish: position for position, dish in enumerate(model.dishes)}
+        dish_columns: Dict[str, List[int]] = {dish: [] for dish in model.dishes}
+        for (dish, _, _), var in model.use_dish_meal_day.items():
+            dish_columns[dish].append(solver.get_column(var))
+        self.dish_columns: Dict[str, np.ndarray] = {
+            dish: np.array(columns, dtype=int)
+            for dish, columns in dish_columns.items()
+        }
+        self.cost_dish: Any = model.cost_dish
+        self.base_costs: np.ndarray = np.array([
+            value(model.cost_dish[dish]) for dish in model.dishes
+        ])
+        self.dish_positions: Dict[str, int] = dish_positions
+
+        lp = highs.getLp()
+        self.col_lower: np.ndarray = np.array(lp.col_lower_)
+        self.col_upper: np.ndarray = np.array(lp.col_upper_)
+        self.solution: np.ndarray = np.round(highs.getSolution().col_value)
+        self.dish_selections_max: float = value(model.dish_selections_max)
+        self.cost: float = info.objective_function_value
+        self.lower_bound: float = min(info.mip_dual_bound, self.cost)
+        options = highs.getOptions()
+        self.tolerance: float = max(
+            options.mip_abs_gap,
+            options.mip_rel_gap * abs(self.cost),
+            self.cost - self.lower_bound,
+        )
+        self.reduced_costs: Optional[np.ndarray] = None
+        self.lp_bound: float = -np.inf
+        self._solve_lp_relaxation(lp)
+
+        self.changed_dishes: Set[str] = set()
+        self.new_cost: float = self.cost
+        self.new_lower_bound: float = self.lower_bound
+
+    def screen(self, changed_dishes: List[str]) -> Optional[str]:
+        """Check whether the diet is still optimal after the cost of some dishes
+        changed (since the last solve), updating `new_cost` and `new_lower_bound`.
+        Returns the outcome (PRICE_UPDATE_UNAFFECTED or PRICE_UPDATE_BOUND), or None if
+        the diet has to be re-solved."""
+        self.changed_dishes.update(changed_dishes)
+        dishes = [
+            dish for dish in self.changed_dishes if len(self.dish_columns[dish])
+        ]
+        if not dishes:
+            # Only dishes without variables (e.g. not admissible for the diet).
+            return PRICE_UPDATE_UNAFFECTED
+        dish_delta = np.array([
+            value(self.cost_dish[dish]) - self.base_costs[self.dish_positions[dish]]
+            for dish in dishes
+        ])
+        counts = [len(self.dish_columns[dish]) for dish in dishes]
+        columns = np.concatenate([self.dish_columns[dish] for dish in dishes])
+        delta = np.repeat(dish_delta, counts)
+        lower = self.col_lower[columns]
+        upper = self.col_upper[columns]
+        solution = self.solution[columns]
+        fixed = lower == upper
+        cheaper = ~fixed & (delta < 0)
+
+        self.new_cost = self.cost + float(delta @ solution)
+        fixed_change = float(delta[fixed] @ lower[fixed])
+        if not cheaper.any() and not solution[~fixed & (delta != 0)].any():
+            self.new_lower_bound = self.lower_bound + fixed_change
+            return PRICE_UPDATE_UNAFFECTED
+
+        free_counts = np.add.reduceat(~fixed, np.cumsum([0] + counts[:-1]))
+        max_selections = np.minimum(free_counts, self.dish_selections_max)
+        shift_bound = self.lower_bound + fixed_change + float(
+            np.minimum(dish_delta, 0) @ max_selections
+        )
+        cheaper_bound = np.inf
+        if cheaper.any():
+            cheaper_bound = -np.inf
+            if self.reduced_costs is not None:
+                reduced = self.reduced_costs[columns]
+                new_reduced = reduced + delta
+                cheaper_bound = self.lp_bound + float(
+                    np.minimum(new_reduced * lower, new_reduced * upper).sum()
+                    - np.minimum(reduced * lower, reduced * upper).sum()
+                    + np.maximum(new_reduced[cheaper], 0).min()
+                )
+        self.new_lower_bound = min(
+            max(shift_bound, min(self.lower_bound + fixed_change, cheaper_bound)),
+            self.new_cost,
+        )
+        if self.new_cost - self.new_lower_bound <= self.tolerance:
+            return PRICE_UPDATE_BOUND
+        return None
+
+    def _solve_lp_relaxation(self, lp: highspy.HighsLp) -> None:
+        """Solve the LP relaxation of the session (with its fixed variables and
+        removed constraints) in a separate HiGHS instance, for its reduced costs."""
+        lp.integrality_ = []
+        highs = highspy.Highs()
+        highs.setOptionValue('output_flag', False)
+        highs.passModel(lp)
+        highs.run()
+        if highs.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            return
+        info = highs.getInfo()
+        self.reduced_costs = np.array(highs.getSolution().col_dual)
+        # The reduced costs may be slightly infeasible, which would overestimate the
+        # bound.
+        self.lp_bound = info.objective_function_value - info.sum_dual_infeasibilities
+
+
+# Throughput check: a random walk of the prices of the catalog, applied to copies of
+# the default profile with different minimum protein.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply random price updates.')
+    parser.add_argument('--updates', type=int, default=500, help='Number of updates.')
+    parser.add_argument('--profiles', type=int, default=4, help='Number of profiles.')
+    parser.add_argument('--batch-size', type=int, default=1, help='Updates per batch.')
+    parser.add_argument('--dishes', default='dishes_db.json', help='Dish catalog.')
+    parser.add_argument('--days', type=int, default=7, help='Number of days.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the prices.')
+    parser.add_argument(
+        '--no-screening',
+        action='store_true',
+        help='Re-solve every plan after every batch, for comparison.',
+    )
+    args = parser.parse_args()
+
+    catalog_data = get_catalog_data(dishes_path=args.dishes, num_days=args.days)
+    live_plans = []
+    for position in range(args.profiles):
+        diet_info_df = get_diet_info_data()
+        diet_info_df['protein_min'] += position
+        concrete_model = get_abstract_model().create_instance(
+            name=DIET,
+            data=get_problem_data(diet_info_df=diet_info_df, catalog_data=catalog_data),
+        )
+        live_plan = LivePlan(
+            PersistentSolver(concrete_model, tee=False, options=SolverOptions()),
+            screening=not args.no_screening,
+        )
+        live_plan.solve()
+        live_plans.append(live_plan)
+
+    prices = dict(catalog_data[COST_DISH])
+    dishes = sorted(prices)
+    generator = random.Random(args.seed)
+    updates = []
+    for _ in range(args.updates):
+        dish = generator.choice(dishes)
+        prices[dish] = round(prices[dish] * generator.uniform(0.9, 1.1), 2)
+        updates.append((dish, prices[dish]))
+
+    report = apply_price_updates(live_plans, updates, batch_size=args.batch_size)
+    print(report.to_dict())
+    print(f'{report.updates_per_second:.2f} price updates/second')
@@ -0,0 +1,160 @@
+"""Instrumentation of the solve pipeline: time, memory and model statistics per phase,
+and import time of the command line.
+
+Only the standard library is imported at the top, since the command line uses this
+module before deciding whether it needs the heavy dependencies.
+"""
+import cProfile
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Dependencies that take long to import, and are only imported when needed.
+HEAVY_MODULES = ['highspy', 'numpy', 'pandas', 'pyomo', 'scipy']
+
+
+class PhaseProfiler:
+    """Records wall time, CPU time and peak memory of each phase of the pipeline.
+
+    Phases are measured with the `phase` context manager. A disabled profiler does
+    nothing, so it can be threaded through the pipeline at no cost. If a profile
+    directory is given, each phase is also run under cProfile and its stats are written
+    to `<profile_dir>/<phase>.prof`.
+    """
+
+    def __init__(self, enabled: bool = True, profile_dir: Optional[str] = None):
+        self.enabled: bool = enabled
+        self.profile_dir: Optional[str] = profile_dir
+        self.phases: List[Dict[str, Any]] = []
+        self.model_stats: Dict[str, int] = {}
+        self.solver_time: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profile = cProfile.Profile() if self.profile_dir is not None else None
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+            self.phases.append({
+                'name': name,
+                'wall_time': wall_time,
+                'cpu_time': cpu_time,
+                'peak_memory': peak_memory,
+            })
+            if profile is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profile.dump_stats(os.path.join(self.profile_dir, f'{name}.prof'))
+
+    def record_model_stats(self, model_stats: Dict[str, int]) -> None:
+        """Record the size of the model (variables, constraints and nonzeros)."""
+        if self.enabled:
+            self.model_stats = model_stats
+
+    def record_solver_time(self, solver_time: Optional[float]) -> None:
+        """Record the time reported by the solver itself. The rest of the time of the
+        solve phase is spent writing the problem file, launching the solver and reading
+        its solution."""
+        if self.enabled:
+            self.solver_time = solver_time
+
+    def get_report(self) -> Dict[str, Any]:
+        """Return the report of the recorded phases and model statistics.
+
+        Example of output:
+        {
+            'phases': [
+                {'name': 'load', 'wall_time': 0.1, 'cpu_time': 0.1, 'peak_memory': 1024},
+                ...
+            ],
+            'model': {'variables': 525, 'constraints': 173, 'nonzeros': 3654},
+            'solver_time': 0.5,
+        }
+        """
+        return {
+            'phases': self.phases,
+            'model': self.model_stats,
+            'solver_time': self.solver_time,
+        }
+
+    def write_report(self, path: str) -> None:
+        with open(path, 'wt') as f:
+            json.dump(self.get_report(), f, indent=2)
+
+
+def get_model_stats(concrete_model: Any) -> Dict[str, int]:
+    """Count the variables, constraints and nonzeros of a concrete model."""
+    from pyomo.environ import Constraint, Var
+    from pyomo.repn.standard_repn import generate_standard_repn
+
+    variables = sum(
+        1 for _ in concrete_model.component_data_objects(Var, active=True)
+    )
+    constraints = list(concrete_model.component_data_objects(Constraint, active=True))
+    nonzeros = sum(
+        len(generate_standard_repn(
+            constraint.body,
+            compute_values=False,
+            quadratic=False,
+        ).linear_vars)
+        for constraint in constraints
+    )
+    return {
+        'variables': variables,
+        'constraints': len(constraints),
+        'nonzeros': nonzeros,
+    }
+
+
+def get_import_time(module: str) -> Tuple[float, List[str]]:
+    """Import a module in a new interpreter, and return its cumulative import time [s]
+    (as measured by `python -X importtime`) and the heavy modules it imported.
+
+    Example of output:
+        (0.012, [])
+    """
+    code = (
+        f'import json, sys, {module}; '
+        f'print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))'
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_time = None
+    for line in result.stderr.splitlines():
+        # Lines are 'import time: <self [us]> | <cumulative [us]> | <module>'.
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            import_time = int(fields[1]) / 1e6
+    if import_time is None:
+        raise ValueError(f'No import time found for {module}')
+    return import_time, json.loads(result.stdout)
@@ -0,0 +1,185 @@
+"""Rolling-horizon re-planning: as the days of the diet are consumed, the rest of the
+diet is planned again taking into account what was actually eaten."""
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyomo.environ import value
+
+from constants import DIET
+from data_builder import get_problem_data
+from model import get_abstract_model
+from plan import Plan
+from solver import PersistentSolver
+from solver_backends import SolverOptions
+
+
+class RollingHorizonPlanner:
+    """Plans a diet and re-plans its remaining days as the first ones are consumed.
+
+    The model of the whole diet is built once and kept in a persistent HiGHS session
+    (see `solver.PersistentSolver`). Re-planning fixes the days consumed to the meals
+    actually eaten, which also reduces the remaining selections of those dishes, and
+    re-solves the remaining days warm-started from the previous plan, instead of
+    rebuilding and solving the whole diet from scratch.
+
+    If the days consumed were eaten as planned, the rest of an optimal plan is still
+    optimal for the remaining days (a better one would have given a better plan), so
+    it is kept without solving again. Otherwise, the previous plan is only used as a
+    warm start if it is still feasible for the remaining days, since HiGHS spends more
+    time trying to repair an infeasible start than solving without it.
+
+    Example:
+        planner = RollingHorizonPlanner()
+        plan = planner.plan()
+        # Monday and Tuesday are eaten as planned, except for one dinner.
+        realized = [s for s in plan.selections if s[0] in ('monday', 'tuesday')]
+        realized[-1] = ('tuesday', 'dinner', 'Mushroom Risotto')
+        plan = planner.replan(realized)
+    """
+
+    def __init__(
+            self,
+            problem_data: Optional[Dict[Optional[str], Any]] = None,
+            options: Optional[SolverOptions] = None,
+    ):
+        if problem_data is None:
+            problem_data = get_problem_data()
+        concrete_model = get_abstract_model().create_instance(
+            name=DIET,
+            data=problem_data,
+        )
+        self.solver: PersistentSolver = PersistentSolver(
+            concrete_model,
+            tee=False,
+            options=options,
+        )
+        self.realized: List[Tuple[str, str, str]] = []
+        self.unplanned_realized: List[Tuple[str, str, str]] = []
+        self._plan: Optional[Plan] = None
+
+    @property
+    def remaining_days(self) -> List[str]:
+        return [
+            day for day in self.solver.concrete_model.days
+            if day not in self.solver.fixed_days
+        ]
+
+    def plan(self) -> Optional[Plan]:
+        """Plan the remaining days of the diet (all of them, before any `replan`).
+
+        Returns the plan of the whole diet, where the days consumed have the meals
+        eaten, or None if the remaining days cannot meet the diet.
+        """
+        self.solver.solve()
+        if not self.solver.solution_exists():
+            self._plan = None
+            return None
+        self._plan = self.solver.get_plan()
+        return self._plan
+
+    def replan(
+            self,
+            realized: List[Tuple[str, str, str]],
+            days: Optional[List[str]] = None,
+    ) -> Optional[Plan]:
+        """Record the (day, meal, dish) selections eaten in the days consumed (by
+        default, the days of the selections) and plan the remaining days.
+
+        Selections of dishes that are not part of the model (outside the catalog or the
+        diet) are kept in `unplanned_realized`: they do not count towards the maximum
+        selections per dish.
+        """
+        as_planned = self._is_as_planned(realized, days)
+        self.unplanned_realized.extend(self.solver.fix_days(realized, days))
+        self.realized.extend(realized)
+        if as_planned:
+            return self._plan
+        if not self._is_warm_start_feasible():
+            self._clear_warm_start()
+        return self.plan()
+
+    def _is_as_planned(
+            self,
+            realized: List[Tuple[str, str, str]],
+            days: Optional[List[str]],
+    ) -> bool:
+        """Return whether the days consumed were eaten as in the current plan, and that
+        plan is optimal."""
+        if self._plan is None or not self.solver.is_optimal():
+            return False
+        if days is None:
+            days = [day for day, _, _ in realized]
+        days = set(days)
+        planned = {selection for selection in self._plan.selections
+                   if selection[0] in days}
+        return planned == set(realized)
+
+    def _is_warm_start_feasible(self) -> bool:
+        """Return whether the current values of the variables (the previous plan, with
+        the days consumed fixed) are a feasible diet for the remaining days.
+
+        The meal and nutrient constraints of the remaining days still hold, unless a
+        meal lost its dish because the dish was exhausted by the meals eaten, and the
+        maximum selections per dish may be exceeded by the meals eaten.
+        """
+        model = self.solver.concrete_model
+        remaining_days = set(self.remaining_days)
+        selections = Counter()
+        dishes_per_meal = Counter()
+        for (dish, meal, day), var in model.use_dish_meal_day.items():
+            if var.value is not None and var.value > 0.5:
+                selections[dish] += 1
+                if day in remaining_days:
+                    dishes_per_meal[meal, day] += 1
+        if any(
+                dishes_per_meal[meal, day] != 1
+                for meal in model.meals
+                for day in remaining_days
+        ):
+            return False
+        dish_selections_max = value(model.dish_selections_max)
+        return all(
+            count <= dish_selections_max
+            for dish, count in selections.items()
+            if dish not in self.solver.exhausted_dishes
+        )
+
+    def _clear_warm_start(self) -> None:
+        for var in self.solver.concrete_model.use_dish_meal_day.values():
+            if not var.fixed:
+                var.value = None
+
+
+# Re-planning check: consumes the planned diet day by day, eating the most expensive
+# dish of the catalog instead of the last planned meal every other day, and compares
+# the time of each re-plan with building and solving the whole diet from scratch.
+if __name__ == '__main__':
+    from data_provider import get_days_data
+
+    problem_data = get_problem_data()
+    start = time.perf_counter()
+    planner = RollingHorizonPlanner(problem_data)
+    diet_plan = planner.plan()
+    print(f'Plan: {diet_plan.cost:.2f}€ in {time.perf_counter() - start:.3f}s')
+
+    cost_dish = problem_data[None]['cost_dish']
+    treat = max(cost_dish, key=cost_dish.get)
+    for position, day in enumerate(get_days_data()[:-1]):
+        realized = [
+            selection for selection in diet_plan.selections if selection[0] == day
+        ]
+        if position % 2 == 0:
+            realized[-1] = (day, realized[-1][1], treat)
+
+        start = time.perf_counter()
+        diet_plan = planner.replan(realized)
+        replan_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        RollingHorizonPlanner(problem_data).plan()
+        scratch_time = time.perf_counter() - start
+        print(
+            f'{day}: re-plan {diet_plan.cost:.2f}€ in {replan_time:.3f}s '
+            f'(from scratch {scratch_time:.3f}s)'
+        )
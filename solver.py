@@ -1,49 +1,469 @@
-from typing import Optional
+import highspy
+import math
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
-from pyomo.environ import ConcreteModel, SolverFactory, SolverStatus, value
+from pyomo.environ import ConcreteModel, SolverFactory, value
+from pyomo.opt import TerminationCondition
 from pyomo.opt.results import SolverResults
 
+from constants import (
+    DISH_SELECTIONS_MAX,
+    SOLVER_AUTO,
+    SOLVER_HEURISTIC,
+    VEGAN,
+    VEGETARIAN,
+)
+from data_provider import get_nutrient_names
+from model import dish_respects_diet
+from plan import Plan, extract_plan
+from solver_backends import (
+    BACKENDS,
+    Incumbent,
+    IncumbentCallback,
+    SolverBackend,
+    SolverOptions,
+    get_backend,
+    get_highs_column,
+    get_highs_model,
+    set_highs_options,
+)
+
 
 class Solver:
-    def __init__(self, concrete_model: ConcreteModel):
+    """Solves a built model with one of the solver backends (see `solver_backends`).
+
+    By default, the backend is selected from the size of the model and the available
+    solvers. The options (time limit, gap and threads) are the same for every backend.
+
+    With `SOLVER_HEURISTIC`, a feasible (not necessarily optimal) diet is found in
+    milliseconds. With `heuristic_warm_start`, the diet of the heuristic is the starting
+    point of the exact backend (only HiGHS takes a warm start, see `set_warm_start`).
+
+    Long searches can be followed as they run: each improved diet found (see
+    `Incumbent`) is passed to a callback given to `solve`, or yielded by
+    `iter_incumbents`, and the search can be stopped early keeping the best diet found
+    so far. Backends that do not report their incumbents (SCIP and the heuristic) only
+    report the final diet.
+    """
+
+    def __init__(
+            self,
+            concrete_model: ConcreteModel,
+            tee: bool = True,
+            backend: str = SOLVER_AUTO,
+            options: Optional[SolverOptions] = None,
+            heuristic_warm_start: bool = False,
+    ):
         self.concrete_model: ConcreteModel = concrete_model
+        self.tee: bool = tee
+        self.backend_name: str = backend
+        self.options: SolverOptions = options if options is not None else SolverOptions()
+        self.heuristic_warm_start: bool = heuristic_warm_start
+        self.backend: Optional[SolverBackend] = None
         self._solution: Optional[SolverResults] = None
+        self._stop: threading.Event = threading.Event()
 
-    def solve(self) -> None:
-        solver = SolverFactory('scip')
-        self._solution = solver.solve(self.concrete_model, tee=True)
+    def solve(self, on_incumbent: Optional[IncumbentCallback] = None) -> None:
+        """Solve the model, loading the best diet found into its variables.
 
-    def solution_exists(self) -> bool:
-        solution_found = (
-            self._solution.solver.status == SolverStatus.ok or
-            self._solution.solver.status == SolverStatus.warning
+        `on_incumbent` is called with each improved diet found during the search.
+        Returning True from it stops the search, keeping the best diet found so far.
+        """
+        self._stop.clear()
+        self.backend = get_backend(self.concrete_model, self.backend_name)
+        if self.heuristic_warm_start and self.backend.name != SOLVER_HEURISTIC:
+            BACKENDS[SOLVER_HEURISTIC].solve(self.concrete_model, self.options, self.tee)
+        self._solution = self.backend.solve(
+            self.concrete_model,
+            self.options,
+            self.tee,
+            on_incumbent=on_incumbent,
+            stop=self._stop,
         )
-        return solution_found
+        if on_incumbent is not None and not self.backend.streams_incumbents:
+            self._report_final_incumbent(on_incumbent)
 
-    def print_solution(self) -> None:
+    def stop(self) -> None:
+        """Stop a search running in another thread (e.g. from `iter_incumbents`),
+        keeping the best diet found so far. Only backends that stream their incumbents
+        can be stopped."""
+        self._stop.set()
+
+    def iter_incumbents(self) -> Iterator[Incumbent]:
+        """Solve the model in a background thread, yielding each improved diet as soon
+        as it is found.
+
+        Leaving the loop early stops the search. Either way, once the loop is over the
+        best diet found is loaded into the model, as after `solve`.
+
+        Example:
+            for incumbent in solver.iter_incumbents():
+                if incumbent.gap is not None and incumbent.gap < 0.05:
+                    break
+            plan = solver.get_plan()
+        """
+        incumbents: queue.Queue = queue.Queue()
+        errors: List[BaseException] = []
+        finished = object()
+
+        def run() -> None:
+            try:
+                self.solve(on_incumbent=incumbents.put)
+            except BaseException as error:
+                errors.append(error)
+            finally:
+                incumbents.put(finished)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            while True:
+                incumbent = incumbents.get()
+                if incumbent is finished:
+                    break
+                yield incumbent
+        finally:
+            self.stop()
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def solution_exists(self) -> bool:
+        return self.backend.solution_exists(self._solution)
+
+    def get_termination_condition(self) -> str:
+        return str(self._solution.solver.termination_condition)
+
+    def is_optimal(self) -> bool:
+        """Return whether the diet found is proven optimal (within the gap option),
+        i.e. the search was not stopped early nor limited in time."""
+        termination_condition = self._solution.solver.termination_condition
+        return termination_condition == TerminationCondition.optimal
+
+    def set_warm_start(self, selections: List[Tuple[str, str, str]]) -> None:
+        """Initialize the variables with a known diet, given as (day, meal, dish)
+        selections, so that the solver can start from it.
+
+        Selections that are not part of the model (e.g. dishes that are not admissible
+        anymore) are ignored. Only the HiGHS backend starts from the diet; the SCIP one
+        ignores it (see `solver_backends.ScipBackend`).
+        """
+        selected = {(dish, meal, day) for day, meal, dish in selections}
+        use_dish_meal_day = self.concrete_model.use_dish_meal_day
+        for key in use_dish_meal_day:
+            use_dish_meal_day[key].value = int(key in selected)
+
+    def get_solver_time(self) -> Optional[float]:
+        """Return the solving time reported by the solver [s], if it reports it."""
+        for time_name in ('time', 'wallclock_time'):
+            solver_time = getattr(self._solution.solver, time_name, None)
+            if isinstance(solver_time, (int, float)):
+                return float(solver_time)
+        return None
+
+    def get_node_count(self) -> Optional[int]:
+        """Return the number of nodes of the search, if the solver reports it."""
+        nodes = getattr(self._solution.solver, 'nodes', None)
+        if isinstance(nodes, int):
+            return nodes
+        return None
+
+    def get_cost(self) -> float:
+        """Return the cost of the diet found."""
+        assert self.solution_exists(), 'The solver did not find any solution!'
+        return value(self.concrete_model.objective_function)
+
+    def get_lower_bound(self) -> Optional[float]:
+        """Return the lower bound of the optimal cost reported by the solver, if any
+        (the LP bound for the heuristic, the best bound of the search otherwise)."""
+        lower_bound = self._solution.problem.lower_bound
+        if isinstance(lower_bound, (int, float)) and math.isfinite(lower_bound):
+            return float(lower_bound)
+        return None
+
+    def get_plan(self) -> Plan:
+        """Return the diet found, as a structured plan (see `plan.Plan`)."""
         assert self.solution_exists(), 'The solver did not find any solution!'
+        return extract_plan(self.concrete_model, lower_bound=self.get_lower_bound())
+
+    def get_selected_dishes(self) -> List[Tuple[str, str, str]]:
+        """Return the (day, meal, dish) selections of the diet found."""
+        return self.get_plan().selections
+
+    def print_solution(self) -> None:
+        self.get_plan().print()
+
+    def _report_final_incumbent(self, on_incumbent: IncumbentCallback) -> None:
+        """Report the diet found by a backend that does not stream its incumbents."""
+        if not self.solution_exists():
+            return
+        on_incumbent(Incumbent(
+            objective=self.get_cost(),
+            bound=self.get_lower_bound(),
+            assignment={
+                (dish, meal, day): 1 for day, meal, dish in self.get_selected_dishes()
+            },
+            time=self.get_solver_time() or 0.0,
+        ))
+
+
+class PersistentSolver(Solver):
+    """Solver session that keeps the model loaded in an in-process HiGHS instance.
+
+    Diet information can be changed between solves with `update_diet_info`, dish costs
+    with `update_dish_costs`, and the days already consumed can be fixed with
+    `fix_days`. Only the affected right-hand sides, objective coefficients, variables
+    and constraints are sent to HiGHS, and each re-solve is
+    warm-started from the previous `use_dish_meal_day` solution, instead of writing a
+    new problem file and solving it cold.
+    """
 
-        print()
-        print('Diet cost: ' + str(value(self.concrete_model.objective_function)) + '€')
-        print()
+    def __init__(
+            self,
+            concrete_model: ConcreteModel,
+            tee: bool = True,
+            options: Optional[SolverOptions] = None,
+    ):
+        super().__init__(concrete_model=concrete_model, tee=tee, options=options)
+        self._solver = SolverFactory('appsi_highs')
+        set_highs_options(self._solver, self.options)
+        # The structure of the model does not change between solves: only mutable
+        # parameters (and variables explicitly updated) have to be checked.
+        update_config = self._solver.update_config
+        update_config.check_for_new_or_removed_constraints = False
+        update_config.check_for_new_or_removed_vars = False
+        update_config.check_for_new_or_removed_params = False
+        update_config.check_for_new_objective = False
+        update_config.update_constraints = False
+        update_config.update_vars = False
+        update_config.update_named_expressions = False
+        update_config.update_objective = False
+        update_config.update_params = True
+        self.fixed_days: List[str] = []
+        self.exhausted_dishes: Set[str] = set()
 
+    def solve(self, on_incumbent: Optional[IncumbentCallback] = None) -> None:
+        """Re-solve the model, warm-started from the previous solution. APPSI does not
+        expose the incumbents of HiGHS: only the final diet is reported."""
+        self._solution = self._solver.solve(
+            self.concrete_model,
+            tee=self.tee,
+            timelimit=self.options.time_limit,
+            load_solutions=False,
+            warmstart=True,
+        )
+        if self.solution_exists():
+            self._solver.load_vars()
+        if on_incumbent is not None:
+            self._report_final_incumbent(on_incumbent)
+
+    def solution_exists(self) -> bool:
+        # A solution is only reported when a feasible one was found.
+        return len(self._solution.solution) > 0
+
+    def set_options(self, options: SolverOptions) -> None:
+        """Change the time limit and the gap for the next solves. The number of threads
+        of the HiGHS instance cannot be changed once it has solved."""
+        self.options = options
+        self._solver.config.mip_gap = options.mip_gap
+
+    def update_diet_info(self, **diet_info: Any) -> None:
+        """Change the diet information (e.g. `calories_max=1200`) for the next solve.
+
+        The daily bounds of the nutrients are given with their names in the diet
+        information ('<nutrient>_min' and '<nutrient>_max').
+
+        Changing the vegetarian or vegan flags fixes to 0 the variables of the dishes
+        that no longer fit the diet. Relaxing those flags beyond the ones the model was
+        built with is not possible, since those dishes have no variables: the model has
+        to be rebuilt. Raises ValueError, changing nothing, for such a relaxation or an
+        unknown name.
+        """
+        model = self.concrete_model
+        params = {
+            VEGETARIAN: model.vegetarian,
+            VEGAN: model.vegan,
+            DISH_SELECTIONS_MAX: model.dish_selections_max,
+        }
+        for nutrient in model.nutrients:
+            _, min_name, max_name = get_nutrient_names(nutrient)
+            params[min_name] = model.nutrient_min[nutrient]
+            params[max_name] = model.nutrient_max[nutrient]
+
+        # Nothing changes unless the whole diet information can be applied.
+        for param_name in diet_info:
+            if param_name not in params:
+                raise ValueError(f'Unknown diet information: {param_name}')
+        self._check_diet_restrictions(
+            vegetarian=diet_info.get(VEGETARIAN, value(model.vegetarian)),
+            vegan=diet_info.get(VEGAN, value(model.vegan)),
+        )
+
+        changed_params = set()
+        for param_name, param_value in diet_info.items():
+            param = params[param_name]
+            if value(param) != param_value:
+                param.set_value(param_value)
+                changed_params.add(param_name)
+
+        if changed_params & {VEGETARIAN, VEGAN}:
+            self._apply_diet_restrictions()
+
+    def update_dish_costs(self, dish_costs: Dict[str, float]) -> List[str]:
+        """Change the cost of some dishes (e.g. `{'Caesar Salad': 4.5}`) for the next
+        solve. Only objective coefficients change, so the previous diet is still a
+        feasible warm start.
+
+        Returns the dishes whose cost changed. Raises ValueError, changing no cost, if
+        a dish is unknown.
+        """
+        model = self.concrete_model
+        for dish in dish_costs:
+            if dish not in model.dishes:
+                raise ValueError(f'Unknown dish: {dish}')
+        changed_dishes = []
+        for dish, cost in dish_costs.items():
+            if value(model.cost_dish[dish]) != cost:
+                model.cost_dish[dish].set_value(cost)
+                changed_dishes.append(dish)
+        return changed_dishes
+
+    def get_highs(self) -> highspy.Highs:
+        """Return the HiGHS instance of the session (once it has solved), e.g. to read
+        the solution of the last solve in bulk. Its columns are the variables of the
+        model (see `get_column`).
+
+        Raises RuntimeError if the pyomo version does not expose it as expected (see
+        `solver_backends.APPSI_PYOMO_VERSION`)."""
+        return get_highs_model(self._solver)
+
+    def get_column(self, var: Any) -> int:
+        """Return the column of a variable of the model in the HiGHS instance."""
+        return get_highs_column(self._solver, var)
+
+    def fix_days(
+            self,
+            realized: List[Tuple[str, str, str]],
+            days: Optional[List[str]] = None,
+    ) -> List[Tuple[str, str, str]]:
+        """Fix the diet of days already consumed to the (day, meal, dish) selections
+        actually eaten, so that the next solves only plan the remaining days.
+
+        The days fixed are the days of the selections, unless given. Their variables
+        are fixed (to 1 for the dishes eaten and 0 otherwise), so the selections eaten
+        count towards the maximum selections per dish of the remaining days. Their meal
+        and nutrient constraints are removed, since what was eaten may not meet them.
+        Dishes eaten as many times as allowed (or more) are not selected again: their
+        remaining variables are fixed to 0 and their maximum selections constraint is
+        removed.
+
+        Returns the selections that are not part of the model (e.g. dishes outside the
+        catalog or the diet), which do not count towards the maximum selections. Raises
+        ValueError, fixing nothing, if a day (of the selections or given) is not a day
+        of the model or is already fixed.
+        """
         model = self.concrete_model
-        for day in model.days:
-            print('--------' + day.upper() + '--------')
-            calories_day = protein_day = carbs_day = fat_day = 0
+        realized_days = {day for day, _, _ in realized}
+        unknown_days = (realized_days | set(days or [])) - set(model.days)
+        if unknown_days:
+            raise ValueError(f'Unknown days: {", ".join(sorted(unknown_days))}')
+        if days is None:
+            days = [day for day in model.days if day in realized_days]
+        fixed_again = [day for day in days if day in self.fixed_days]
+        if fixed_again:
+            raise ValueError(f'Days already fixed: {", ".join(fixed_again)}')
+        new_days = list(days)
+        new_days_set = set(new_days)
+        eaten = {(dish, meal, day) for day, meal, dish in realized}
+
+        changed_vars = []
+        for dish, meal, day in model.use_dish_meal_day:
+            if day in new_days_set:
+                var = model.use_dish_meal_day[dish, meal, day]
+                var.fix(int((dish, meal, day) in eaten))
+                changed_vars.append(var)
+
+        removed_constraints = []
+        fixed_days = new_days_set.union(self.fixed_days)
+        dish_selections_max = value(model.dish_selections_max)
+        for dish in model.dishes:
+            meals = model.admissible_meals_dish[dish]
+            if not meals or dish in self.exhausted_dishes:
+                continue
+            selections = sum(
+                value(model.use_dish_meal_day[dish, meal, day])
+                for meal in meals
+                for day in fixed_days
+            )
+            if selections < dish_selections_max:
+                continue
+            for meal in meals:
+                for day in model.days:
+                    var = model.use_dish_meal_day[dish, meal, day]
+                    if day not in fixed_days:
+                        var.fix(0)
+                        changed_vars.append(var)
+            removed_constraints.append(
+                model.constraint_maximum_selections_per_dish[dish])
+            self.exhausted_dishes.add(dish)
+        if changed_vars:
+            self._solver.update_variables(changed_vars)
+
+        for day in new_days:
             for meal in model.meals:
-                print('----' + meal.upper() + '----')
-                for dish in model.dishes:
-                    if model.use_dish_meal_day[dish, meal, day].value:
-                        calories_day += model.calories_dish[dish]
-                        protein_day += model.protein_dish[dish]
-                        carbs_day += model.carbs_dish[dish]
-                        fat_day += model.fat_dish[dish]
-                        print(dish)
-                print()
-            print('----STATS DAY----')
-            print('Calories: ' + str(calories_day))
-            print('Protein: ' + str(protein_day))
-            print('Carbs: ' + str(carbs_day))
-            print('Fat: ' + str(fat_day))
-            print()
+                removed_constraints.append(
+                    model.constraint_minimum_dishes_per_meal[meal, day])
+                removed_constraints.append(
+                    model.constraint_maximum_dishes_per_meal[meal, day])
+            for nutrient in model.nutrients:
+                removed_constraints.append(
+                    model.constraint_nutrients_per_day[nutrient, day])
+        for constraint in removed_constraints:
+            constraint.deactivate()
+        if removed_constraints:
+            self._solver.remove_constraints(removed_constraints)
+        self.fixed_days.extend(new_days)
+
+        return [
+            (day, meal, dish)
+            for day, meal, dish in realized
+            if (dish, meal, day) not in model.use_dish_meal_day
+        ]
+
+    def _check_diet_restrictions(self, vegetarian: int, vegan: int) -> None:
+        """Check that the dishes of a diet with these flags have variables in the
+        model, which is not the case if they are more relaxed than the ones the model
+        was built with."""
+        model = self.concrete_model
+        for dish in model.dishes:
+            if vegetarian and not model.vegetarian_dish[dish]:
+                continue
+            if vegan and not model.vegan_dish[dish]:
+                continue
+            for meal in model.meals:
+                if model.suitable[dish, meal] and dish not in (
+                        model.admissible_dishes_meal[meal]):
+                    raise ValueError(
+                        f'Dish {dish} is not part of the model, which was built with a '
+                        'stricter diet. Rebuild the model to relax the diet.'
+                    )
+
+    def _apply_diet_restrictions(self) -> None:
+        model = self.concrete_model
+        fixed_days = set(self.fixed_days)
+        changed_vars = []
+        for dish, meal, day in model.use_dish_meal_day:
+            if day in fixed_days or dish in self.exhausted_dishes:
+                continue
+            var = model.use_dish_meal_day[dish, meal, day]
+            respects_diet = dish_respects_diet(model, dish)
+            if var.fixed and respects_diet:
+                var.unfix()
+                changed_vars.append(var)
+            elif not var.fixed and not respects_diet:
+                var.fix(0)
+                changed_vars.append(var)
+        if changed_vars:
+            self._solver.update_variables(changed_vars)
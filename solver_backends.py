@@ -0,0 +1,626 @@
+"""Solver backends: how a built model is handed to a MIP solver.
+
+Shell backends (SCIP) write the model to a file, run the solver in a subprocess and read
+its solution file back, which dominates the solve time of small models. The HiGHS
+backend solves in memory instead, and can report each improved diet found during the
+search (see `Incumbent`) and be interrupted. The heuristic backend does not prove
+optimality, but finds a feasible diet and its gap with the LP bound in milliseconds.
+The patterns backend solves by column generation over day menus, which scales with the
+number of distinct menus instead of the number of days, and the decomposition backend
+solves the days separately with Lagrangian multipliers. All the backends take the same
+`SolverOptions`.
+"""
+import highspy
+import math
+import numpy as np
+import pyomo.kernel as pmo
+import pyomo.version
+import threading
+from pyomo.environ import Block, SolverFactory, SolverStatus
+from pyomo.opt import Solution, SolverResults, TerminationCondition
+from scipy.sparse import csr_matrix
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from constants import (
+    SOLVER_AUTO,
+    SOLVER_DECOMPOSITION,
+    SOLVER_HEURISTIC,
+    SOLVER_HIGHS,
+    SOLVER_PATTERNS,
+    SOLVER_SCIP,
+)
+
+# Models up to this number of variables are solved in memory when possible, since
+# writing and reading problem files takes most of their solve time. Bigger models
+# keep the reference solver (SCIP), if available.
+SMALL_MODEL_MAX_VARIABLES = 100000
+
+# Version of pyomo whose APPSI HiGHS solver has the private attributes read by the
+# HiGHS sessions (see `get_highs_model`), pinned in `conda-env.yaml`.
+APPSI_PYOMO_VERSION = '6.9.2'
+
+_HIGHS_TERMINATION_CONDITIONS = {
+    highspy.HighsModelStatus.kOptimal: TerminationCondition.optimal,
+    highspy.HighsModelStatus.kInfeasible: TerminationCondition.infeasible,
+    highspy.HighsModelStatus.kTimeLimit: TerminationCondition.maxTimeLimit,
+    highspy.HighsModelStatus.kSolutionLimit: TerminationCondition.maxEvaluations,
+    highspy.HighsModelStatus.kInterrupt: TerminationCondition.userInterrupt,
+}
+
+
+class SolverOptions:
+    """Options of a solve, understood by every backend. None keeps the solver default.
+
+    - time_limit: Maximum solving time [s].
+    - mip_gap: Relative gap between the best diet and the lower bound to stop at.
+    - threads: Maximum number of threads used by the solver (with SCIP, only by its
+      LP solver).
+    """
+
+    def __init__(
+            self,
+            time_limit: Optional[float] = None,
+            mip_gap: Optional[float] = None,
+            threads: Optional[int] = None,
+    ):
+        self.time_limit: Optional[float] = time_limit
+        self.mip_gap: Optional[float] = mip_gap
+        self.threads: Optional[int] = threads
+
+
+class Incumbent:
+    """Improved diet found during the search.
+
+    - objective: Cost of the diet.
+    - bound: Best lower bound of the optimal cost known at that point (None if the
+      solver does not know it yet).
+    - assignment: Keys (dish, meal, day) of the variables `use_dish_meal_day` equal to 1
+      (all the others are 0).
+    - time: Time since the start of the solve [s].
+    """
+
+    def __init__(
+            self,
+            objective: float,
+            bound: Optional[float],
+            assignment: Dict[Tuple[str, str, str], int],
+            time: float,
+    ):
+        self.objective: float = objective
+        self.bound: Optional[float] = bound
+        self.assignment: Dict[Tuple[str, str, str], int] = assignment
+        self.time: float = time
+
+    @property
+    def gap(self) -> Optional[float]:
+        """Relative gap with the bound: `(objective - bound) / objective`."""
+        if self.bound is None:
+            return None
+        return (self.objective - self.bound) / max(abs(self.objective), 1e-9)
+
+    @property
+    def selections(self) -> List[Tuple[str, str, str]]:
+        """The (day, meal, dish) selections of the diet."""
+        return [(day, meal, dish) for dish, meal, day in self.assignment]
+
+
+# Called with each incumbent. Returning True stops the search, keeping the best diet.
+IncumbentCallback = Callable[[Incumbent], Optional[bool]]
+
+
+class SolverBackend:
+    """Interface of a solver backend."""
+
+    name: str = ''
+    # Whether the backend reports the incumbents during the search and can be stopped.
+    streams_incumbents: bool = False
+
+    def is_available(self) -> bool:
+        raise NotImplementedError
+
+    def supports(self, model: Any) -> bool:
+        """Return whether the backend can solve this kind of model."""
+        raise NotImplementedError
+
+    def solve(
+            self,
+            model: Any,
+            options: SolverOptions,
+            tee: bool,
+            on_incumbent: Optional[IncumbentCallback] = None,
+            stop: Optional[threading.Event] = None,
+    ) -> SolverResults:
+        """Solve the model, loading the values of its variables if a solution exists.
+
+        Backends that stream incumbents call `on_incumbent` with each improved diet, and
+        interrupt the search when it returns True or `stop` is set (the others ignore
+        both).
+        """
+        raise NotImplementedError
+
+    def solution_exists(self, results: SolverResults) -> bool:
+        return len(results.solution) > 0
+
+
+class ScipBackend(SolverBackend):
+    """SCIP, run as an executable through pyomo's shell interface.
+
+    It does not take a warm start: pyomo's SCIP interface has no warm start support, so
+    the values of the variables (see `solver.Solver.set_warm_start`) are ignored. Its
+    search is sequential, so the threads option only goes to its LP solver.
+    """
+
+    name = SOLVER_SCIP
+
+    def is_available(self) -> bool:
+        return bool(SolverFactory('scip').available(exception_flag=False))
+
+    def supports(self, model: Any) -> bool:
+        return True
+
+    def solve(
+            self,
+            model: Any,
+            options: SolverOptions,
+            tee: bool,
+            on_incumbent: Optional[IncumbentCallback] = None,
+            stop: Optional[threading.Event] = None,
+    ) -> SolverResults:
+        solver = SolverFactory('scip')
+        if options.time_limit is not None:
+            solver.options['limits/time'] = options.time_limit
+        if options.mip_gap is not None:
+            solver.options['limits/gap'] = options.mip_gap
+        if options.threads is not None:
+            # The branch and bound of the SCIP executable is sequential: the threads
+            # only go to its LP solver.
+            solver.options['lp/threads'] = options.threads
+        return solver.solve(model, tee=tee)
+
+    def solution_exists(self, results: SolverResults) -> bool:
+        return results.solver.status in (SolverStatus.ok, SolverStatus.warning)
+
+
+class HighsBackend(SolverBackend):
+    """HiGHS, in memory.
+
+    Models built with pyomo rules are solved through pyomo's APPSI interface, warm
+    started from the current values of the variables. Kernel blocks built by the matrix
+    engine (which APPSI does not support) hand their constraint matrix straight to
+    HiGHS, and so do pyomo models when the incumbents are requested, since APPSI does
+    not expose the callbacks of HiGHS.
+    """
+
+    name = SOLVER_HIGHS
+    streams_incumbents = True
+
+    def is_available(self) -> bool:
+        return bool(SolverFactory('appsi_highs').available())
+
+    def supports(self, model: Any) -> bool:
+        return isinstance(model, Block) or _is_matrix_block(model)
+
+    def solve(
+            self,
+            model: Any,
+            options: SolverOptions,
+            tee: bool,
+            on_incumbent: Optional[IncumbentCallback] = None,
+            stop: Optional[threading.Event] = None,
+    ) -> SolverResults:
+        if _is_matrix_block(model) or on_incumbent is not None:
+            return self._solve_matrix(model, options, tee, on_incumbent, stop)
+
+        solver = SolverFactory('appsi_highs')
+        set_highs_options(solver, options)
+        results = solver.solve(
+            model,
+            tee=tee,
+            timelimit=options.time_limit,
+            load_solutions=False,
+            warmstart=True,
+        )
+        # APPSI does not report the number of nodes of the search.
+        results.solver.nodes = get_highs_model(solver).getInfo().mip_node_count
+        if self.solution_exists(results):
+            solver.load_vars()
+        return results
+
+    def _solve_matrix(
+            self,
+            model: Any,
+            options: SolverOptions,
+            tee: bool,
+            on_incumbent: Optional[IncumbentCallback],
+            stop: Optional[threading.Event],
+    ) -> SolverResults:
+        """Solve the matrix model of the model (see `model_matrix`) with `run_highs`."""
+        # Imported here, since model_matrix builds its kernel blocks with pyomo.kernel.
+        from model_matrix import get_instance_matrix_model
+
+        matrix_model = get_instance_matrix_model(model)
+        variable_keys: List[Tuple[str, str, str]] = []
+        if _is_matrix_block(model):
+            variables = list(model.constraints.x)
+        else:
+            variable_keys = matrix_model.variable_keys()
+            variables = [model.use_dish_meal_day[key] for key in variable_keys]
+        initial_solution = None
+        if all(variable.value is not None for variable in variables):
+            initial_solution = np.array([variable.value for variable in variables])
+
+        def report_incumbent(
+                objective: float,
+                bound: float,
+                solution: np.ndarray,
+                running_time: float,
+        ) -> Optional[bool]:
+            if not variable_keys:
+                variable_keys.extend(matrix_model.variable_keys())
+            return on_incumbent(Incumbent(
+                objective=objective,
+                bound=bound if math.isfinite(bound) else None,
+                assignment={
+                    variable_keys[column]: 1
+                    for column in np.flatnonzero(solution > 0.5).tolist()
+                },
+                time=running_time,
+            ))
+
+        highs = run_highs(
+            cost=matrix_model.cost,
+            matrix=matrix_model.matrix,
+            row_lower=matrix_model.row_lower,
+            row_upper=matrix_model.row_upper,
+            options=options,
+            initial_solution=initial_solution,
+            tee=tee,
+            on_solution=report_incumbent if on_incumbent is not None else None,
+            stop=stop,
+        )
+
+        results = SolverResults()
+        results.solver.name = self.name
+        results.solver.wallclock_time = highs.getRunTime()
+        model_status = highs.getModelStatus()
+        results.solver.termination_condition = _HIGHS_TERMINATION_CONDITIONS.get(
+            model_status, TerminationCondition.unknown
+        )
+        results.problem.lower_bound = highs.getInfo().mip_dual_bound
+        results.solver.nodes = highs.getInfo().mip_node_count
+        if model_status == highspy.HighsModelStatus.kOptimal:
+            results.solver.status = SolverStatus.ok
+        else:
+            results.solver.status = SolverStatus.warning
+        solution_status = highs.getInfo().primal_solution_status
+        if solution_status == highspy.SolutionStatus.kSolutionStatusFeasible:
+            results.solution.insert(Solution())
+            results.problem.upper_bound = highs.getInfo().objective_function_value
+            solution = highs.getSolution().col_value
+            for variable, variable_value in zip(variables, solution):
+                variable.value = round(variable_value)
+        return results
+
+
+class HeuristicBackend(SolverBackend):
+    """LP-relaxation rounding and local search (see `heuristic`), for a feasible diet in
+    milliseconds. The diet is not necessarily optimal: the results report the LP lower
+    bound of the optimal cost."""
+
+    name = SOLVER_HEURISTIC
+
+    def is_available(self) -> bool:
+        return True
+
+    def supports(self, model: Any) -> bool:
+        return isinstance(model, Block) or _is_matrix_block(model)
+
+    def solve(
+            self,
+            model: Any,
+            options: SolverOptions,
+            tee: bool,
+            on_incumbent: Optional[IncumbentCallback] = None,
+            stop: Optional[threading.Event] = None,
+    ) -> SolverResults:
+        # Imported here, since the heuristic solves its LP relaxation with `run_highs`.
+        from heuristic import solve_model_heuristic
+
+        heuristic_result = solve_model_heuristic(model, time_limit=options.time_limit)
+
+        results = SolverResults()
+        results.solver.name = self.name
+        results.solver.wallclock_time = heuristic_result.time
+        results.problem.lower_bound = heuristic_result.lower_bound
+        if heuristic_result.cost is not None:
+            results.solver.status = SolverStatus.ok
+            results.solver.termination_condition = TerminationCondition.feasible
+            results.problem.upper_bound = heuristic_result.cost
+            results.solution.insert(Solution())
+        else:
+            results.solver.status = SolverStatus.warning
+            results.solver.termination_condition = TerminationCondition.other
+        if tee:
+            print(
+                f'Heuristic: cost {heuristic_result.cost}, lower bound '
+                f'{heuristic_result.lower_bound}, gap {heuristic_result.gap}'
+            )
+        return results
+
+
+class PatternsBackend(SolverBackend):
+    """Column generation over day menus (see `column_generation`). The diet is proven
+    optimal when it reaches the lower bound of the pricing; otherwise, the results
+    report the bound. The menus generated are kept in the pool of the backend, and
+    reused by the next solves of the same catalog and profile class."""
+
+    name = SOLVER_PATTERNS
+
+    def __init__(self):
+        # Created on the first solve (see `column_generation.PatternPool`).
+        self.pool: Any = None
+
+    def is_available(self) -> bool:
+        return True
+
+    def supports(self, model: Any) -> bool:
+        return isinstance(model, Block) or _is_matrix_block(model)
+
+    def solve(
+            self,
+            model: Any,
+            options: SolverOptions,
+            tee: bool,
+            on_incumbent: Optional[IncumbentCallback] = None,
+            stop: Optional[threading.Event] = None,
+    ) -> SolverResults:
+        # Imported here, since column generation solves its problems with `run_highs`.
+        from column_generation import TOLERANCE, PatternPool, solve_model_patterns
+
+        if self.pool is None:
+            self.pool = PatternPool()
+        pattern_result = solve_model_patterns(model, pool=self.pool, options=options)
+
+        results = SolverResults()
+        results.solver.name = self.name
+        results.solver.wallclock_time = pattern_result.time
+        results.problem.lower_bound = pattern_result.lower_bound
+        if pattern_result.cost is not None:
+            results.solver.status = SolverStatus.ok
+            if pattern_result.gap <= TOLERANCE:
+                results.solver.termination_condition = TerminationCondition.optimal
+            else:
+                results.solver.termination_condition = TerminationCondition.feasible
+            results.problem.upper_bound = pattern_result.cost
+            results.solution.insert(Solution())
+        else:
+            results.solver.status = SolverStatus.warning
+            if math.isinf(pattern_result.lower_bound) and pattern_result.lower_bound > 0:
+                results.solver.termination_condition = TerminationCondition.infeasible
+            else:
+                results.solver.termination_condition = TerminationCondition.other
+        if tee:
+            print(
+                f'Patterns: cost {pattern_result.cost}, lower bound '
+                f'{pattern_result.lower_bound}, gap {pattern_result.gap} '
+                f'({pattern_result.reused_patterns} menus reused, '
+                f'{pattern_result.new_patterns} priced in '
+                f'{pattern_result.iterations} iterations)'
+            )
+        return results
+
+
+class DecompositionBackend(SolverBackend):
+    """Lagrangian decomposition by days (see `decomposition`), for long horizons. The
+    diet is proven optimal when it is within the gap of the Lagrangian lower bound;
+    otherwise, the results report the bound. Its threads are the worker processes that
+    solve the days."""
+
+    name = SOLVER_DECOMPOSITION
+
+    def is_available(self) -> bool:
+        return True
+
+    def supports(self, model: Any) -> bool:
+        return isinstance(model, Block) or _is_matrix_block(model)
+
+    def solve(
+            self,
+            model: Any,
+            options: SolverOptions,
+            tee: bool,
+            on_incumbent: Optional[IncumbentCallback] = None,
+            stop: Optional[threading.Event] = None,
+    ) -> SolverResults:
+        # Imported here, since the decomposition solves its days with `run_highs`.
+        from decomposition import DEFAULT_GAP_TOLERANCE, solve_model_by_days
+
+        decomposition_result = solve_model_by_days(model, options=options)
+        gap_tolerance = (
+            options.mip_gap if options.mip_gap is not None else DEFAULT_GAP_TOLERANCE
+        )
+
+        results = SolverResults()
+        results.solver.name = self.name
+        results.solver.wallclock_time = decomposition_result.time
+        results.problem.lower_bound = decomposition_result.lower_bound
+        if decomposition_result.cost is not None:
+            results.solver.status = SolverStatus.ok
+            if decomposition_result.gap <= gap_tolerance:
+                results.solver.termination_condition = TerminationCondition.optimal
+            else:
+                results.solver.termination_condition = TerminationCondition.feasible
+            results.problem.upper_bound = decomposition_result.cost
+            results.solution.insert(Solution())
+        else:
+            results.solver.status = SolverStatus.warning
+            if (math.isinf(decomposition_result.lower_bound)
+                    and decomposition_result.lower_bound > 0):
+                results.solver.termination_condition = TerminationCondition.infeasible
+            else:
+                results.solver.termination_condition = TerminationCondition.other
+        if tee:
+            print(
+                f'Decomposition: cost {decomposition_result.cost}, lower bound '
+                f'{decomposition_result.lower_bound}, gap {decomposition_result.gap} '
+                f'({decomposition_result.iterations} iterations)'
+            )
+        return results
+
+
+# Backends by name, in order of preference for small models (the heuristic, column
+# generation and the decomposition are only used when requested).
+BACKENDS: Dict[str, SolverBackend] = {
+    SOLVER_HIGHS: HighsBackend(),
+    SOLVER_SCIP: ScipBackend(),
+    SOLVER_HEURISTIC: HeuristicBackend(),
+    SOLVER_PATTERNS: PatternsBackend(),
+    SOLVER_DECOMPOSITION: DecompositionBackend(),
+}
+
+
+def get_backend(model: Any, name: str = SOLVER_AUTO) -> SolverBackend:
+    """Return the backend to solve the model with.
+
+    With `SOLVER_AUTO`, small models (see `SMALL_MODEL_MAX_VARIABLES`) are solved in
+    memory and bigger ones with the reference solver, among the available backends that
+    support the model.
+    """
+    if name != SOLVER_AUTO:
+        backend = BACKENDS[name]
+        if not backend.supports(model):
+            raise ValueError(f'Solver {name} does not support this model.')
+        if not backend.is_available():
+            raise RuntimeError(f'Solver {name} is not available.')
+        return backend
+
+    if len(model.use_dish_meal_day) <= SMALL_MODEL_MAX_VARIABLES:
+        preference = [SOLVER_HIGHS, SOLVER_SCIP]
+    else:
+        preference = [SOLVER_SCIP, SOLVER_HIGHS]
+    for backend_name in preference:
+        backend = BACKENDS[backend_name]
+        if backend.supports(model) and backend.is_available():
+            return backend
+    raise RuntimeError('No available solver supports this model.')
+
+
+def get_available_backends() -> List[str]:
+    return [name for name, backend in BACKENDS.items() if backend.is_available()]
+
+
+def set_highs_options(solver: Any, options: SolverOptions) -> None:
+    """Set the options on an APPSI HiGHS solver (the time limit is given on solve)."""
+    if options.mip_gap is not None:
+        solver.config.mip_gap = options.mip_gap
+    if options.threads is not None:
+        solver.highs_options['threads'] = options.threads
+
+
+def get_highs_model(solver: Any) -> highspy.Highs:
+    """Return the HiGHS instance of an APPSI HiGHS solver (once it has solved)."""
+    return _get_appsi_attribute(solver, '_solver_model')
+
+
+def get_highs_column(solver: Any, var: Any) -> int:
+    """Return the column of a variable of the model in the HiGHS instance of an APPSI
+    HiGHS solver."""
+    return _get_appsi_attribute(solver, '_pyomo_var_to_solver_var_map')[id(var)]
+
+
+def _get_appsi_attribute(solver: Any, name: str) -> Any:
+    """Return a private attribute of an APPSI HiGHS solver (APPSI has no public access
+    to the HiGHS instance), with a clear error if this pyomo version lacks it."""
+    try:
+        return getattr(solver, name)
+    except AttributeError:
+        raise RuntimeError(
+            f'The HiGHS sessions need the APPSI HiGHS solver of pyomo '
+            f'{APPSI_PYOMO_VERSION}: {type(solver).__name__} of pyomo '
+            f'{pyomo.version.version} has no {name}.'
+        ) from None
+
+
+def run_highs(
+        cost: np.ndarray,
+        matrix: csr_matrix,
+        row_lower: np.ndarray,
+        row_upper: np.ndarray,
+        options: Optional[SolverOptions] = None,
+        initial_solution: Optional[np.ndarray] = None,
+        tee: bool = False,
+        integer: bool = True,
+        on_solution: Optional[
+            Callable[[float, float, np.ndarray, float], Optional[bool]]
+        ] = None,
+        stop: Optional[threading.Event] = None,
+) -> highspy.Highs:
+    """Solve `min cost @ x` s.t. `row_lower <= matrix @ x <= row_upper` and x binary
+    (or in [0, 1], if not integer), with HiGHS in memory. Returns the HiGHS instance, to
+    read the status, solution and bounds from.
+
+    `on_solution(objective, bound, solution, running_time)` is called with each
+    improved solution of the MIP search. The search is interrupted, keeping the best
+    solution, when it returns True or when `stop` is set.
+    """
+    if options is None:
+        options = SolverOptions()
+
+    lp = highspy.HighsLp()
+    lp.num_col_ = matrix.shape[1]
+    lp.num_row_ = matrix.shape[0]
+    lp.col_cost_ = cost
+    lp.col_lower_ = np.zeros(matrix.shape[1])
+    lp.col_upper_ = np.ones(matrix.shape[1])
+    lp.row_lower_ = row_lower
+    lp.row_upper_ = row_upper
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.start_ = matrix.indptr
+    lp.a_matrix_.index_ = matrix.indices
+    lp.a_matrix_.value_ = matrix.data
+    if integer:
+        lp.integrality_ = [highspy.HighsVarType.kInteger] * matrix.shape[1]
+
+    highs = highspy.Highs()
+    highs.setOptionValue('output_flag', tee)
+    if options.time_limit is not None:
+        highs.setOptionValue('time_limit', float(options.time_limit))
+    if options.mip_gap is not None:
+        highs.setOptionValue('mip_rel_gap', float(options.mip_gap))
+    if options.threads is not None:
+        highs.setOptionValue('threads', int(options.threads))
+    highs.passModel(lp)
+    if initial_solution is not None:
+        solution = highspy.HighsSolution()
+        solution.col_value = initial_solution
+        highs.setSolution(solution)
+
+    if on_solution is not None or stop is not None:
+        interrupted = threading.Event() if stop is None else stop
+
+        def on_improving_solution(event: Any) -> None:
+            output = event.data_out
+            if on_solution(
+                    output.objective_function_value,
+                    output.mip_dual_bound,
+                    np.asarray(output.mip_solution),
+                    output.running_time,
+            ):
+                interrupted.set()
+
+        def on_interrupt(event: Any) -> None:
+            if interrupted.is_set():
+                event.interrupt()
+
+        if on_solution is not None:
+            highs.cbMipImprovingSolution.subscribe(on_improving_solution)
+        highs.cbMipInterrupt.subscribe(on_interrupt)
+    highs.run()
+    return highs
+
+
+def _is_matrix_block(model: Any) -> bool:
+    """Return whether the model is a kernel block built by `MatrixModel`."""
+    return isinstance(model, pmo.block) and isinstance(
+        getattr(model, 'constraints', None), pmo.matrix_constraint
+    )
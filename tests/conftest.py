@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules of the project are flat files at the root of the repository.
+sys.path.insert(0, ROOT_DIR)
+
+
+@pytest.fixture(autouse=True)
+def root_dir(monkeypatch):
+    """Run each test from the root of the repository, where the bundled catalog
+    (`dishes_db.json`) is."""
+    monkeypatch.chdir(ROOT_DIR)
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from batch import solve_batch
+from constants import CALORIES_MAX, PROTEIN_MIN, VEGAN
+from data_provider import get_diet_info_data
+
+
+def test_failing_profiles_do_not_stop_the_batch():
+    profiles_df = pd.concat([get_diet_info_data()] * 4, ignore_index=True)
+    profiles_df.loc[1, CALORIES_MAX] = 10
+    profiles_df.loc[2, VEGAN] = 1
+    profiles_df.loc[2, PROTEIN_MIN] = 900
+
+    results = sorted(solve_batch(profiles_df, max_workers=1))
+
+    assert [position for position, _, _, _ in results] == [0, 1, 2, 3]
+    for position, cost, selections, error in results:
+        if position in (1, 2):
+            assert cost is None and selections == [] and 'infeasible' in error
+        else:
+            assert cost is not None and selections and error is None
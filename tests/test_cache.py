@@ -0,0 +1,63 @@
+import os
+
+from cache import CachedSolution, SolutionCache
+from data_builder import get_catalog_data, get_problem_data
+from data_provider import get_diet_info_data
+from main import solve_problem
+
+
+def test_cache_hit_returns_the_plan_of_the_solve(tmp_path):
+    cache = SolutionCache(directory=str(tmp_path))
+
+    solved_plan = solve_problem(cache=cache)
+    cached_plan = solve_problem(cache=cache)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cached_plan.cost == solved_plan.cost
+    assert cached_plan.selections_df.equals(solved_plan.selections_df)
+
+
+def get_cached_problem(num_days):
+    problem_data = get_problem_data(
+        diet_info_df=get_diet_info_data(),
+        catalog_data=get_catalog_data(num_days=num_days),
+    )
+    return problem_data, CachedSolution(cost=1.0, selections=[('monday', 'lunch', 'x')])
+
+
+def test_eviction_counts_and_removes_the_catalog_indexes(tmp_path):
+    cache = SolutionCache(directory=str(tmp_path))
+    cache.put(*get_cached_problem(num_days=1))
+    # Room for a single entry and its index.
+    cache.max_size_bytes = sum(path.stat().st_size for path in tmp_path.iterdir())
+
+    for num_days in (2, 3):
+        cache.put(*get_cached_problem(num_days=num_days))
+
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == ['.catalog', '.json']
+    assert cache.get(get_cached_problem(num_days=3)[0]) is not None
+    assert cache.get_warm_start(get_cached_problem(num_days=1)[0]) is None
+
+
+def test_entries_removed_by_another_process_are_skipped(tmp_path, monkeypatch):
+    cache = SolutionCache(directory=str(tmp_path))
+    problem_data, solution = get_cached_problem(num_days=1)
+    cache.put(problem_data, solution)
+    utime, listdir = os.utime, os.listdir
+
+    # Another process evicts the entry between its read and the refresh of its time.
+    def evict_and_utime(path):
+        os.remove(path)
+        utime(path)
+
+    monkeypatch.setattr(os, 'utime', evict_and_utime)
+    assert cache.get(problem_data) is not None
+
+    # Or between the listing of the directory and the size of its files.
+    def listdir_with_evicted(path):
+        return listdir(path) + ['evicted.json', 'evicted.catalog']
+
+    monkeypatch.setattr(os, 'listdir', listdir_with_evicted)
+    cache.max_size_bytes = 0
+    cache.put(problem_data, solution)
+    assert listdir(str(tmp_path)) == []
@@ -0,0 +1,27 @@
+import pytest
+
+from column_generation import PatternPool, solve_patterns
+from constants import DIET, SOLVER_HIGHS
+from data_builder import get_problem_data
+from model import get_abstract_model
+from model_matrix import get_matrix_model
+from solver import Solver
+
+
+def test_patterns_reach_the_optimum_and_reuse_the_pool():
+    problem_data = get_problem_data()
+    concrete_model = get_abstract_model().create_instance(name=DIET, data=problem_data)
+    solver = Solver(concrete_model=concrete_model, backend=SOLVER_HIGHS)
+    solver.solve()
+    optimal_cost = solver.get_cost()
+    matrix_model = get_matrix_model(problem_data)
+    pool = PatternPool()
+
+    first_result = solve_patterns(matrix_model, pool=pool)
+    second_result = solve_patterns(matrix_model, pool=pool)
+
+    for result in (first_result, second_result):
+        assert result.cost == pytest.approx(optimal_cost)
+        assert result.lower_bound <= result.cost + 1e-6
+    assert first_result.reused_patterns == 0
+    assert second_result.reused_patterns > 0
@@ -0,0 +1,45 @@
+import pytest
+
+from constants import DIET, DISH_SELECTIONS_MAX, SOLVER_DECOMPOSITION, SOLVER_HIGHS
+from data_builder import get_problem_data
+from data_provider import get_diet_info_data
+from decomposition import solve_by_days
+from model import get_abstract_model
+from solver import Solver
+
+
+def get_default_problem_data(**diet_info):
+    diet_info_df = get_diet_info_data()
+    for diet_info_name, diet_info_value in diet_info.items():
+        diet_info_df[diet_info_name] = diet_info_value
+    return get_problem_data(diet_info_df=diet_info_df)
+
+
+def test_decomposition_bounds_the_optimum():
+    problem_data = get_default_problem_data()
+    concrete_model = get_abstract_model().create_instance(name=DIET, data=problem_data)
+    solver = Solver(concrete_model=concrete_model, backend=SOLVER_HIGHS)
+    solver.solve()
+    optimal_cost = solver.get_cost()
+
+    result = solve_by_days(problem_data, max_workers=1)
+
+    assert result.cost >= optimal_cost - 1e-6
+    assert optimal_cost >= result.lower_bound - 1e-6
+
+
+def test_decomposition_finds_a_diet_when_the_relaxation_respects_the_cap():
+    result = solve_by_days(
+        get_default_problem_data(**{DISH_SELECTIONS_MAX: 7}), max_workers=1
+    )
+    assert result.cost == pytest.approx(43.40)
+
+
+def test_decomposition_backend_loads_its_diet():
+    concrete_model = get_abstract_model().create_instance(
+        name=DIET, data=get_default_problem_data(**{DISH_SELECTIONS_MAX: 7})
+    )
+    solver = Solver(concrete_model=concrete_model, backend=SOLVER_DECOMPOSITION)
+    solver.solve()
+    assert solver.solution_exists()
+    assert solver.get_plan().cost == pytest.approx(43.40)
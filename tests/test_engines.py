@@ -0,0 +1,32 @@
+import pytest
+
+from constants import DIET, DISH_SELECTIONS_MAX, SOLVER_HIGHS, VEGETARIAN
+from data_builder import get_problem_data
+from data_provider import get_diet_info_data
+from model import get_abstract_model
+from model_matrix import get_matrix_model
+from solver import Solver
+
+
+def solve_cost(concrete_model) -> float:
+    solver = Solver(concrete_model=concrete_model, backend=SOLVER_HIGHS)
+    solver.solve()
+    assert solver.is_optimal()
+    return solver.get_cost()
+
+
+@pytest.mark.parametrize('diet_info', [
+    {},
+    {VEGETARIAN: 1},
+    {DISH_SELECTIONS_MAX: 1},
+])
+def test_pyomo_and_matrix_engines_have_the_same_optimum(diet_info):
+    diet_info_df = get_diet_info_data()
+    for diet_info_name, diet_info_value in diet_info.items():
+        diet_info_df[diet_info_name] = diet_info_value
+    problem_data = get_problem_data(diet_info_df=diet_info_df)
+
+    pyomo_model = get_abstract_model().create_instance(name=DIET, data=problem_data)
+    matrix_model = get_matrix_model(problem_data).to_kernel_block()
+
+    assert solve_cost(pyomo_model) == pytest.approx(solve_cost(matrix_model))
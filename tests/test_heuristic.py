@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+import pytest
+
+from constants import DISH_SELECTIONS_MAX, MEAL_SEPARATOR
+from data_builder import get_catalog_data, get_problem_data
+from data_provider import get_diet_info_data, get_meals_data
+from heuristic import _LocalSearch, solve_heuristic
+from model_matrix import get_matrix_model
+
+
+@pytest.fixture
+def shared_dishes_path(tmp_path):
+    """Bundled catalog where every dish is suitable for every meal, so that the
+    candidates of a slot can be the current dishes of the other slots of the day."""
+    with open('dishes_db.json') as f:
+        dishes = json.load(f)
+    for dish in dishes:
+        dish['meal'] = MEAL_SEPARATOR.join(get_meals_data())
+    path = tmp_path / 'dishes_db.json'
+    path.write_text(json.dumps(dishes))
+    return str(path)
+
+
+def get_shared_matrix_model(dishes_path, dish_selections_max):
+    diet_info_df = get_diet_info_data()
+    diet_info_df[DISH_SELECTIONS_MAX] = dish_selections_max
+    return get_matrix_model(get_problem_data(
+        diet_info_df=diet_info_df,
+        catalog_data=get_catalog_data(dishes_path=dishes_path),
+    ))
+
+
+@pytest.mark.parametrize('dish_selections_max', [1, 2])
+def test_pair_cap_change_counts_shared_dishes_once(
+        shared_dishes_path,
+        dish_selections_max,
+):
+    matrix_model = get_shared_matrix_model(shared_dishes_path, dish_selections_max)
+    var_dish = matrix_model.var_dish
+    local_search = _LocalSearch(matrix_model)
+    rng = np.random.default_rng(0)
+
+    for _ in range(50):
+        local_search.choice = np.array(
+            [rng.choice(columns) for columns in local_search.slot_columns]
+        )
+        local_search.selections = np.bincount(
+            var_dish[local_search.choice], minlength=len(matrix_model.dishes)
+        ).astype(float)
+        first_slot, second_slot = local_search.slot_pairs[
+            rng.integers(len(local_search.slot_pairs))
+        ]
+        first_current = local_search.choice[first_slot]
+        second_current = local_search.choice[second_slot]
+        # Candidates include the current column of each slot in the other one.
+        first_columns = np.append(
+            local_search.slot_candidates[first_slot],
+            local_search.slot_columns[first_slot][
+                var_dish[local_search.slot_columns[first_slot]]
+                == var_dish[second_current]
+            ],
+        )
+        second_columns = np.append(
+            local_search.slot_candidates[second_slot],
+            local_search.slot_columns[second_slot][
+                var_dish[local_search.slot_columns[second_slot]]
+                == var_dish[first_current]
+            ],
+        )
+
+        cap_change = local_search._get_pair_cap_change(
+            first_current, second_current, first_columns, second_columns
+        )
+        excess = np.maximum(local_search.selections - dish_selections_max, 0).sum()
+        for first, first_column in enumerate(first_columns):
+            for second, second_column in enumerate(second_columns):
+                selections = local_search.selections.copy()
+                selections[var_dish[first_current]] -= 1
+                selections[var_dish[second_current]] -= 1
+                selections[var_dish[first_column]] += 1
+                selections[var_dish[second_column]] += 1
+                new_excess = np.maximum(selections - dish_selections_max, 0).sum()
+                assert cap_change[first, second] == pytest.approx(new_excess - excess)
+
+
+def test_heuristic_diet_respects_the_selections_cap(shared_dishes_path):
+    matrix_model = get_shared_matrix_model(shared_dishes_path, 1)
+    result = solve_heuristic(matrix_model)
+    assert result.solution is not None
+    selections = np.bincount(
+        matrix_model.var_dish,
+        weights=result.solution,
+        minlength=len(matrix_model.dishes),
+    )
+    assert selections.max() <= 1
@@ -0,0 +1,8 @@
+from benchmark import IMPORT_TIME_BUDGET
+from profiling import get_import_time
+
+
+def test_main_imports_within_budget_without_heavy_modules():
+    import_time, heavy_modules = get_import_time('main')
+    assert heavy_modules == []
+    assert import_time < IMPORT_TIME_BUDGET
@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+from constants import DIET, VEGAN
+from data_builder import get_catalog_data, get_problem_data
+from data_provider import get_diet_info_data
+from feasibility import InfeasibleDietError
+from model import get_abstract_model
+
+
+def test_meal_without_admissible_dish_raises_infeasible_diet_error(tmp_path):
+    with open('dishes_db.json') as f:
+        dishes = json.load(f)
+    for dish in dishes:
+        if dish['meal'] == 'breakfast':
+            dish['vegan'] = False
+    dishes_path = tmp_path / 'dishes_db.json'
+    dishes_path.write_text(json.dumps(dishes))
+    diet_info_df = get_diet_info_data()
+    diet_info_df[VEGAN] = 1
+    problem_data = get_problem_data(
+        diet_info_df=diet_info_df,
+        catalog_data=get_catalog_data(dishes_path=str(dishes_path)),
+    )
+
+    with pytest.raises(InfeasibleDietError, match='No dish suits breakfast'):
+        get_abstract_model().create_instance(name=DIET, data=problem_data)
@@ -0,0 +1,62 @@
+from typing import Optional
+
+import pytest
+
+from catalog_generator import generate_dishes, write_dishes
+from constants import DIET, DISH_SELECTIONS_MAX, PROTEIN_MIN, SOLVER_HIGHS, VEGETARIAN
+from data_builder import get_catalog_data, get_problem_data
+from data_provider import get_diet_info_data
+from model import get_abstract_model
+from presolve import CatalogPresolver
+from solver import Solver
+
+# Days of the diets: enough for the selections cap to limit the replacements of the
+# removed dishes, while keeping the solves short.
+NUM_DAYS = 4
+
+
+@pytest.fixture(scope='module')
+def generated_dishes_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('catalog') / 'dishes_db.json'
+    write_dishes(generate_dishes(300, seed=0), str(path))
+    return str(path)
+
+
+def solve_cost(problem_data) -> Optional[float]:
+    """Return the optimal cost, or None if the diet is infeasible."""
+    concrete_model = get_abstract_model().create_instance(name=DIET, data=problem_data)
+    solver = Solver(concrete_model=concrete_model, backend=SOLVER_HIGHS)
+    solver.solve()
+    if not solver.solution_exists():
+        return None
+    assert solver.is_optimal()
+    return solver.get_cost()
+
+
+@pytest.mark.parametrize('catalog', ['bundled', 'generated'])
+@pytest.mark.parametrize('diet_info', [
+    {},
+    {VEGETARIAN: 1},
+    {DISH_SELECTIONS_MAX: 1},
+    {PROTEIN_MIN: 120},
+])
+def test_presolve_keeps_the_optimum(catalog, diet_info, generated_dishes_path):
+    dishes_path = generated_dishes_path if catalog == 'generated' else 'dishes_db.json'
+    diet_info_df = get_diet_info_data()
+    for diet_info_name, diet_info_value in diet_info.items():
+        diet_info_df[diet_info_name] = diet_info_value
+    presolver = CatalogPresolver(diet_info_df)
+
+    cost = solve_cost(get_problem_data(
+        diet_info_df=diet_info_df,
+        catalog_data=get_catalog_data(dishes_path=dishes_path, num_days=NUM_DAYS),
+    ))
+    presolved_cost = solve_cost(get_problem_data(
+        diet_info_df=diet_info_df,
+        catalog_data=get_catalog_data(
+            dishes_path=dishes_path, num_days=NUM_DAYS, presolver=presolver
+        ),
+    ))
+
+    assert presolver.removed
+    assert presolved_cost == pytest.approx(cost)
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from constants import COST_DISH, DIET
+from data_builder import get_catalog_data, get_problem_data
+from data_provider import get_diet_info_data
+from model import get_abstract_model
+from price_updates import LivePlan
+from solver import PersistentSolver
+from solver_backends import SolverOptions
+
+# Relative tolerance between a screened cost and the re-solved optimum: both are within
+# the default gap of HiGHS.
+COST_TOLERANCE = 1e-3
+# Days of the plans: a short horizon keeps each re-solve fast.
+NUM_DAYS = 3
+
+
+@pytest.fixture
+def catalog_data():
+    return get_catalog_data(num_days=NUM_DAYS)
+
+
+def get_live_plan(catalog_data, screening=True):
+    concrete_model = get_abstract_model().create_instance(
+        name=DIET,
+        data=get_problem_data(
+            diet_info_df=get_diet_info_data(),
+            catalog_data=catalog_data,
+        ),
+    )
+    live_plan = LivePlan(
+        PersistentSolver(concrete_model, tee=False, options=SolverOptions()),
+        screening=screening,
+    )
+    assert live_plan.solve()
+    return live_plan
+
+
+def test_screened_costs_match_a_re_solve_along_a_price_walk(catalog_data):
+    live_plan = get_live_plan(catalog_data)
+    reference_plan = get_live_plan(catalog_data, screening=False)
+    prices = dict(catalog_data[COST_DISH])
+    dishes = sorted(prices)
+    generator = random.Random(0)
+
+    for step in range(1, 301):
+        dish = generator.choice(dishes)
+        prices[dish] = round(prices[dish] * generator.uniform(0.8, 1.2), 2)
+        live_plan.update_prices({dish: prices[dish]})
+        if step % 30 == 0:
+            reference_plan.update_prices(prices)
+            assert live_plan.cost == pytest.approx(
+                reference_plan.cost, rel=COST_TOLERANCE
+            )
+            assert live_plan.lower_bound <= reference_plan.cost + COST_TOLERANCE
+
+
+def test_update_with_an_unknown_dish_changes_no_price(catalog_data):
+    live_plan = get_live_plan(catalog_data)
+    reference_plan = get_live_plan(catalog_data, screening=False)
+
+    with pytest.raises(ValueError, match='No Such Dish'):
+        live_plan.update_prices({'Banana Smoothie': 0.01, 'No Such Dish': 1.0})
+    assert live_plan.update_prices({'Banana Smoothie': 0.01}) is not None
+
+    reference_plan.update_prices({'Banana Smoothie': 0.01})
+    assert live_plan.cost == pytest.approx(reference_plan.cost, rel=COST_TOLERANCE)
@@ -0,0 +1,60 @@
+import pytest
+
+from constants import COST_DISH
+from data_builder import get_problem_data
+from replanning import RollingHorizonPlanner
+
+
+@pytest.fixture(scope='module')
+def problem_data():
+    return get_problem_data()
+
+
+def get_monday_with_another_dinner(problem_data, plan):
+    """Return the selections of Monday in the plan, with the most expensive dinner of
+    the catalog eaten instead of the planned one."""
+    data = problem_data[None]
+    cost_dish = data[COST_DISH]
+    treat = max(
+        (dish for (dish, meal), suitable in data['suitable'].items()
+         if meal == 'dinner' and suitable),
+        key=cost_dish.get,
+    )
+    realized = [selection for selection in plan.selections if selection[0] == 'monday']
+    assert ('monday', 'dinner', treat) not in realized
+    return [
+        (day, meal, treat if meal == 'dinner' else dish)
+        for day, meal, dish in realized
+    ]
+
+
+def test_replan_after_a_meal_not_eaten_as_planned(problem_data):
+    planner = RollingHorizonPlanner(problem_data)
+    realized = get_monday_with_another_dinner(problem_data, planner.plan())
+
+    plan = planner.replan(realized)
+
+    assert planner.remaining_days == [
+        'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'
+    ]
+    selections = plan.selections
+    assert {s for s in selections if s[0] == 'monday'} == set(realized)
+    assert len(selections) == len(plan.days) * len(plan.meals)
+    scratch_planner = RollingHorizonPlanner(problem_data)
+    scratch_planner.plan()
+    assert plan.cost == pytest.approx(scratch_planner.replan(realized).cost)
+
+
+def test_replan_rejects_unknown_and_fixed_days(problem_data):
+    planner = RollingHorizonPlanner(problem_data)
+    realized = get_monday_with_another_dinner(problem_data, planner.plan())
+
+    with pytest.raises(ValueError, match='Unknown days: mondya'):
+        planner.replan([('mondya', meal, dish) for _, meal, dish in realized])
+    with pytest.raises(ValueError, match='Unknown days: mondya'):
+        planner.replan(realized, days=['mondya'])
+    assert len(planner.remaining_days) == 7
+
+    planner.replan(realized)
+    with pytest.raises(ValueError, match='Days already fixed: monday'):
+        planner.replan(realized)
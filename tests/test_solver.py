@@ -0,0 +1,35 @@
+import pytest
+from pyomo.environ import value
+
+from constants import CALORIES_MAX, DIET, VEGETARIAN
+from data_builder import get_problem_data
+from data_provider import get_diet_info_data
+from model import get_abstract_model
+from solver import PersistentSolver
+from solver_backends import SolverOptions
+
+
+@pytest.fixture
+def vegetarian_solver():
+    diet_info_df = get_diet_info_data()
+    diet_info_df[VEGETARIAN] = 1
+    concrete_model = get_abstract_model().create_instance(
+        name=DIET,
+        data=get_problem_data(diet_info_df=diet_info_df),
+    )
+    return PersistentSolver(concrete_model, tee=False, options=SolverOptions())
+
+
+@pytest.mark.parametrize('diet_info', [
+    {CALORIES_MAX: 1200, VEGETARIAN: 0},
+    {CALORIES_MAX: 1200, 'no_such_bound': 1},
+])
+def test_rejected_diet_info_changes_nothing(vegetarian_solver, diet_info):
+    model = vegetarian_solver.concrete_model
+    calories_max = value(model.nutrient_max['calories'])
+
+    with pytest.raises(ValueError):
+        vegetarian_solver.update_diet_info(**diet_info)
+
+    assert value(model.nutrient_max['calories']) == calories_max
+    assert value(model.vegetarian) == 1
@@ -0,0 +1,710 @@
+"""Work queue of plan jobs, to spread plan generation over several machines.
+
+A job (`PlanJob`) asks for the plan of a diet profile with a version of the dish catalog
+(see `get_catalog_version`). Jobs are submitted to a queue backend (`JobQueue`), and
+workers (`PlanWorker`) pull them, solve them with their own catalog and models kept in
+memory, and push the results back:
+- `SQLiteJobQueue`: Queue stored in a SQLite file, shared by the processes of a host
+  (or a shared file system).
+- `SocketJobQueue`: Client of a queue served over TCP by `JobQueueServer`, for workers
+  on other hosts.
+
+A worker holds a job for its timeout (which is also the time limit of the solver) plus
+a margin. If it dies or hangs, the job is given to another worker when its lease
+expires, up to its maximum number of attempts. Jobs that cannot be solved (e.g. an
+infeasible diet) fail without being retried.
+
+The TCP server has no authentication: it listens on the local host by default, and
+should only be exposed (`--host`) on a trusted network.
+
+Only the standard library is imported at the top, so that the queue can be served, fed
+and monitored without the dependencies of the solver. To submit jobs without them, give
+the catalog version printed by the workers (`submit --catalog-version`): otherwise it is
+computed from the catalog, with pandas and NumPy.
+
+Example of usage:
+$ python work_queue.py serve --db jobs.sqlite --host 0.0.0.0 --port 8765 &
+$ python work_queue.py worker --queue tcp://queue-host:8765 &
+$ python work_queue.py submit --queue tcp://queue-host:8765 --diet-info '{"vegan": 1}'
+$ python work_queue.py metrics --queue tcp://queue-host:8765
+"""
+import argparse
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import statistics
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from constants import JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING
+
+# Prefix of the addresses of queues served over TCP (e.g. 'tcp://queue-host:8765').
+TCP_PREFIX = 'tcp://'
+# Default timeout of a job [s].
+DEFAULT_JOB_TIMEOUT = 300.0
+# Time given to a worker on top of the timeout of a job before its lease expires [s],
+# e.g. to build the model of a new diet profile.
+LEASE_MARGIN = 60.0
+# Default maximum number of attempts of a job (the first one and the retries).
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class PlanJob:
+    """Request of the plan of a diet profile with a version of the catalog.
+
+    The diet information only has the values that differ from the default one (see
+    `data_provider.get_diet_info_data`). The times are set by the queue: when the job
+    was submitted, when its last attempt started and when it finished, and until when
+    the worker of its last attempt holds it (`lease_deadline`). The result is the plan
+    found (see `Plan.to_dict`), and whether it is proven optimal.
+    """
+
+    def __init__(
+            self,
+            diet_info: Dict[str, Any],
+            catalog_version: str,
+            timeout: float = DEFAULT_JOB_TIMEOUT,
+            max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+            job_id: Optional[str] = None,
+            status: str = JOB_PENDING,
+            attempts: int = 0,
+            worker_id: Optional[str] = None,
+            submitted_at: Optional[float] = None,
+            started_at: Optional[float] = None,
+            finished_at: Optional[float] = None,
+            lease_deadline: Optional[float] = None,
+            result: Optional[Dict[str, Any]] = None,
+            error: Optional[str] = None,
+    ):
+        self.job_id: str = job_id if job_id is not None else uuid.uuid4().hex
+        self.diet_info: Dict[str, Any] = diet_info
+        self.catalog_version: str = catalog_version
+        self.timeout: float = timeout
+        self.max_attempts: int = max_attempts
+        self.status: str = status
+        self.attempts: int = attempts
+        self.worker_id: Optional[str] = worker_id
+        self.submitted_at: Optional[float] = submitted_at
+        self.started_at: Optional[float] = started_at
+        self.finished_at: Optional[float] = finished_at
+        self.lease_deadline: Optional[float] = lease_deadline
+        self.result: Optional[Dict[str, Any]] = result
+        self.error: Optional[str] = error
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Time from the submission to the end of the job [s], if it finished."""
+        if self.finished_at is None or self.submitted_at is None:
+            return None
+        return self.finished_at - self.submitted_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, job_dict: Dict[str, Any]) -> 'PlanJob':
+        return cls(**job_dict)
+
+
+class JobQueue:
+    """Interface of a queue backend.
+
+    Workers only get the jobs of the catalog versions they have, oldest first. A job
+    claimed is leased to the worker until its timeout plus `LEASE_MARGIN`: once the
+    lease expires, the job is pending again (or failed, after its maximum number of
+    attempts), and the result of the late worker is discarded.
+    """
+
+    def submit(self, job: PlanJob) -> str:
+        """Add a job to the queue. Returns its id."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, catalog_versions: List[str]) -> Optional[PlanJob]:
+        """Lease the oldest pending job of the catalog versions to a worker. Returns
+        None if there is none."""
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Store the result of a job. Returns False if the worker does not hold the job
+        anymore (its lease expired), in which case the result is discarded."""
+        raise NotImplementedError
+
+    def fail(
+            self,
+            job_id: str,
+            worker_id: str,
+            error: str,
+            retry: bool = False,
+    ) -> bool:
+        """Record the failure of an attempt of a job, which is retried if `retry` and it
+        has attempts left. Returns False if the worker does not hold the job anymore."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[PlanJob]:
+        raise NotImplementedError
+
+    def list_jobs(self) -> List[PlanJob]:
+        raise NotImplementedError
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return the aggregate metrics of the jobs (see `get_queue_metrics`)."""
+        return get_queue_metrics(self.list_jobs())
+
+
+class SQLiteJobQueue(JobQueue):
+    """Queue stored in a SQLite file. Claims are done in a write transaction, so that
+    several processes can share the file without giving a job to two workers."""
+
+    COLUMNS = (
+        'job_id', 'diet_info', 'catalog_version', 'timeout', 'max_attempts', 'status',
+        'attempts', 'worker_id', 'submitted_at', 'started_at', 'finished_at',
+        'lease_deadline', 'result', 'error',
+    )
+    # Columns stored as JSON.
+    JSON_COLUMNS = ('diet_info', 'result')
+
+    def __init__(self, path: str):
+        self.path: str = path
+        # Transactions are explicit, and the connection can be used by the threads of
+        # `JobQueueServer` (the calls are serialized by a lock).
+        self._connection = sqlite3.connect(
+            path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._lock = threading.Lock()
+        with self._transaction() as cursor:
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'job_id TEXT PRIMARY KEY, diet_info TEXT, catalog_version TEXT, '
+                'timeout REAL, max_attempts INTEGER, status TEXT, attempts INTEGER, '
+                'worker_id TEXT, submitted_at REAL, started_at REAL, finished_at REAL, '
+                'lease_deadline REAL, result TEXT, error TEXT)'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS jobs_status '
+                'ON jobs (status, catalog_version, submitted_at)'
+            )
+
+    def submit(self, job: PlanJob) -> str:
+        job.status = JOB_PENDING
+        job.submitted_at = time.time()
+        row = self._to_row(job)
+        with self._transaction() as cursor:
+            cursor.execute(
+                f'INSERT INTO jobs ({", ".join(self.COLUMNS)}) '
+                f'VALUES ({", ".join("?" * len(self.COLUMNS))})',
+                row,
+            )
+        return job.job_id
+
+    def claim(self, worker_id: str, catalog_versions: List[str]) -> Optional[PlanJob]:
+        now = time.time()
+        with self._transaction() as cursor:
+            self._expire_leases(cursor, now)
+            cursor.execute(
+                f'SELECT {", ".join(self.COLUMNS)} FROM jobs '
+                f'WHERE status = ? AND catalog_version IN '
+                f'({", ".join("?" * len(catalog_versions))}) '
+                'ORDER BY submitted_at LIMIT 1',
+                (JOB_PENDING, *catalog_versions),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = self._from_row(row)
+            job.status = JOB_RUNNING
+            job.attempts += 1
+            job.worker_id = worker_id
+            job.started_at = now
+            job.lease_deadline = now + job.timeout + LEASE_MARGIN
+            cursor.execute(
+                'UPDATE jobs SET status = ?, attempts = ?, worker_id = ?, '
+                'started_at = ?, lease_deadline = ? WHERE job_id = ?',
+                (job.status, job.attempts, worker_id, now, job.lease_deadline,
+                 job.job_id),
+            )
+        return job
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        with self._transaction() as cursor:
+            self._expire_leases(cursor, time.time())
+            cursor.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = NULL '
+                'WHERE job_id = ? AND status = ? AND worker_id = ?',
+                (JOB_DONE, time.time(), json.dumps(result), job_id, JOB_RUNNING,
+                 worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def fail(
+            self,
+            job_id: str,
+            worker_id: str,
+            error: str,
+            retry: bool = False,
+    ) -> bool:
+        with self._transaction() as cursor:
+            self._expire_leases(cursor, time.time())
+            cursor.execute(
+                'UPDATE jobs SET '
+                'status = CASE WHEN ? AND attempts < max_attempts THEN ? ELSE ? END, '
+                'finished_at = CASE WHEN ? AND attempts < max_attempts THEN NULL '
+                'ELSE ? END, '
+                'error = ? '
+                'WHERE job_id = ? AND status = ? AND worker_id = ?',
+                (retry, JOB_PENDING, JOB_FAILED, retry, time.time(), error, job_id,
+                 JOB_RUNNING, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[PlanJob]:
+        with self._transaction() as cursor:
+            self._expire_leases(cursor, time.time())
+            cursor.execute(
+                f'SELECT {", ".join(self.COLUMNS)} FROM jobs WHERE job_id = ?',
+                (job_id,),
+            )
+            row = cursor.fetchone()
+        return self._from_row(row) if row is not None else None
+
+    def list_jobs(self) -> List[PlanJob]:
+        with self._transaction() as cursor:
+            self._expire_leases(cursor, time.time())
+            cursor.execute(
+                f'SELECT {", ".join(self.COLUMNS)} FROM jobs ORDER BY submitted_at'
+            )
+            rows = cursor.fetchall()
+        return [self._from_row(row) for row in rows]
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        """Write transaction, taking the lock of the database from its start."""
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+
+    @staticmethod
+    def _expire_leases(cursor: sqlite3.Cursor, now: float) -> None:
+        """Give the jobs of expired leases back to the queue, or fail them if they have
+        no attempts left."""
+        cursor.execute(
+            'UPDATE jobs SET status = ?, finished_at = ?, '
+            "error = 'Lease expired after ' || attempts || ' attempts' "
+            'WHERE status = ? AND lease_deadline < ? AND attempts >= max_attempts',
+            (JOB_FAILED, now, JOB_RUNNING, now),
+        )
+        cursor.execute(
+            "UPDATE jobs SET status = ?, error = 'Lease expired' "
+            'WHERE status = ? AND lease_deadline < ?',
+            (JOB_PENDING, JOB_RUNNING, now),
+        )
+
+    def _to_row(self, job: PlanJob) -> Tuple[Any, ...]:
+        job_dict = job.to_dict()
+        for column in self.JSON_COLUMNS:
+            job_dict[column] = json.dumps(job_dict[column])
+        return tuple(job_dict[column] for column in self.COLUMNS)
+
+    def _from_row(self, row: Tuple[Any, ...]) -> PlanJob:
+        job_dict = dict(zip(self.COLUMNS, row))
+        for column in self.JSON_COLUMNS:
+            if job_dict[column] is not None:
+                job_dict[column] = json.loads(job_dict[column])
+        return PlanJob.from_dict(job_dict)
+
+
+class JobQueueServer(socketserver.ThreadingTCPServer):
+    """TCP server of a queue backend, for the workers of other hosts (see
+    `SocketJobQueue`). Requests and responses are JSON objects, one per line."""
+
+    # Methods of `JobQueue` that the clients can call.
+    METHODS = ('submit', 'claim', 'complete', 'fail', 'get', 'list_jobs', 'get_metrics')
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], queue: JobQueue):
+        self.queue: JobQueue = queue
+        super().__init__(address, JobQueueRequestHandler)
+
+    def call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a method of the queue with the parameters of a request."""
+        method = request.get('method')
+        if method not in self.METHODS:
+            return _get_error_response(f'Unknown method: {method}')
+        params = request.get('params', {})
+        try:
+            if method == 'submit':
+                params = {'job': PlanJob.from_dict(params['job'])}
+            result = getattr(self.queue, method)(**params)
+        except (TypeError, ValueError, sqlite3.Error) as error:
+            return _get_error_response(str(error))
+        except Exception as error:
+            # Any other failure (e.g. a submit without its job) is reported to the
+            # client, and the server keeps serving.
+            return _get_error_response(f'{type(error).__name__}: {error}')
+        if isinstance(result, PlanJob):
+            result = result.to_dict()
+        elif method == 'list_jobs':
+            result = [job.to_dict() for job in result]
+        return {'result': result, 'error': None}
+
+
+def _get_error_response(error: str) -> Dict[str, Any]:
+    return {'result': None, 'error': error}
+
+
+class JobQueueRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            response = self._get_response(line)
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+    def _get_response(self, line: bytes) -> Dict[str, Any]:
+        """Call the queue with the request of a line, or return the error if it is not
+        valid."""
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return _get_error_response(f'Invalid request: {error}')
+        if not isinstance(request, dict):
+            return _get_error_response('Invalid request: not a JSON object')
+        return self.server.call(request)
+
+
+class SocketJobQueue(JobQueue):
+    """Client of a queue served by `JobQueueServer`, keeping a connection open."""
+
+    def __init__(self, host: str, port: int):
+        self.host: str = host
+        self.port: int = port
+        self._socket = socket.create_connection((host, port))
+        self._stream = self._socket.makefile('rwb')
+        self._lock = threading.Lock()
+
+    def submit(self, job: PlanJob) -> str:
+        return self._call('submit', job=job.to_dict())
+
+    def claim(self, worker_id: str, catalog_versions: List[str]) -> Optional[PlanJob]:
+        job_dict = self._call(
+            'claim', worker_id=worker_id, catalog_versions=catalog_versions
+        )
+        return PlanJob.from_dict(job_dict) if job_dict is not None else None
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        return self._call('complete', job_id=job_id, worker_id=worker_id, result=result)
+
+    def fail(
+            self,
+            job_id: str,
+            worker_id: str,
+            error: str,
+            retry: bool = False,
+    ) -> bool:
+        return self._call(
+            'fail', job_id=job_id, worker_id=worker_id, error=error, retry=retry
+        )
+
+    def get(self, job_id: str) -> Optional[PlanJob]:
+        job_dict = self._call('get', job_id=job_id)
+        return PlanJob.from_dict(job_dict) if job_dict is not None else None
+
+    def list_jobs(self) -> List[PlanJob]:
+        return [PlanJob.from_dict(job_dict) for job_dict in self._call('list_jobs')]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return self._call('get_metrics')
+
+    def close(self) -> None:
+        self._stream.close()
+        self._socket.close()
+
+    def _call(self, method: str, **params: Any) -> Any:
+        with self._lock:
+            request = {'method': method, 'params': params}
+            self._stream.write(json.dumps(request).encode() + b'\n')
+            self._stream.flush()
+            line = self._stream.readline()
+        if not line:
+            raise ConnectionError(f'Queue {self.host}:{self.port} closed the connection')
+        response = json.loads(line)
+        if response['error'] is not None:
+            raise ValueError(response['error'])
+        return response['result']
+
+
+def get_job_queue(address: str) -> JobQueue:
+    """Return the queue of an address: 'tcp://host:port' for a queue served over TCP,
+    or the path of a SQLite file."""
+    if address.startswith(TCP_PREFIX):
+        host, port = address[len(TCP_PREFIX):].rsplit(':', 1)
+        return SocketJobQueue(host, int(port))
+    return SQLiteJobQueue(address)
+
+
+def get_catalog_version(catalog_data: Dict[str, Any]) -> str:
+    """Return the version of a converted catalog (see `data_builder.get_catalog_data`):
+    the hash of its data (see `cache.get_catalog_key`), so that the workers only solve
+    the jobs of the catalog they have."""
+    from cache import get_catalog_key
+    from data_builder import get_problem_data
+
+    return get_catalog_key(get_problem_data(catalog_data=catalog_data))
+
+
+def get_queue_metrics(jobs: List[PlanJob]) -> Dict[str, Any]:
+    """Return the aggregate metrics of jobs: the number of jobs of each status, the
+    retries, the throughput of the jobs done (from the first submission to the last
+    end) [jobs/s], the percentiles of their latency (from submission to end) [s], the
+    mean time of their last attempt [s] and the jobs done by each worker.
+
+    Example of output:
+        {'jobs': 16, 'pending': 0, 'running': 0, 'done': 15, 'failed': 1, 'retries': 2,
+         'throughput': 1.91, 'latency_p50': 3.2, 'latency_p95': 7.5, 'latency_max': 8.1,
+         'attempt_time_mean': 0.52, 'jobs_per_worker': {'host-a-1234': 8,
+         'host-b-987': 7}}
+    """
+    metrics: Dict[str, Any] = {'jobs': len(jobs)}
+    for status in (JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED):
+        metrics[status] = sum(job.status == status for job in jobs)
+    metrics['retries'] = sum(max(job.attempts - 1, 0) for job in jobs)
+
+    done_jobs = [job for job in jobs if job.status == JOB_DONE]
+    latencies = sorted(job.latency for job in done_jobs)
+    metrics['throughput'] = None
+    metrics['latency_p50'] = metrics['latency_p95'] = metrics['latency_max'] = None
+    metrics['attempt_time_mean'] = None
+    if done_jobs:
+        elapsed = (
+            max(job.finished_at for job in done_jobs)
+            - min(job.submitted_at for job in done_jobs)
+        )
+        metrics['throughput'] = len(done_jobs) / elapsed if elapsed > 0 else None
+        metrics['latency_p50'] = statistics.median(latencies)
+        metrics['latency_p95'] = latencies[
+            min(int(0.95 * len(latencies)), len(latencies) - 1)
+        ]
+        metrics['latency_max'] = latencies[-1]
+        metrics['attempt_time_mean'] = statistics.mean(
+            job.finished_at - job.started_at for job in done_jobs
+        )
+    jobs_per_worker: Dict[str, int] = {}
+    for job in done_jobs:
+        jobs_per_worker[job.worker_id] = jobs_per_worker.get(job.worker_id, 0) + 1
+    metrics['jobs_per_worker'] = jobs_per_worker
+    return metrics
+
+
+class PlanWorker:
+    """Worker that pulls the jobs of its catalog from a queue and solves them.
+
+    The catalog is read and converted once, and the models are kept in memory: a
+    persistent solver per combination of diet flags (see `batch.get_profile_solver`),
+    only changing the diet information between jobs.
+    """
+
+    def __init__(
+            self,
+            queue: JobQueue,
+            dishes_path: str = 'dishes_db.json',
+            worker_id: Optional[str] = None,
+            threads: Optional[int] = None,
+            poll_interval: float = 1.0,
+    ):
+        from data_builder import get_catalog_data
+        from data_provider import get_diet_info_data
+
+        self.queue: JobQueue = queue
+        self.worker_id: str = (
+            worker_id if worker_id is not None
+            else f'{socket.gethostname()}-{os.getpid()}'
+        )
+        self.threads: Optional[int] = threads
+        self.poll_interval: float = poll_interval
+        self.catalog_data: Dict[str, Any] = get_catalog_data(dishes_path=dishes_path)
+        self.catalog_version: str = get_catalog_version(self.catalog_data)
+        self.default_diet_info: Dict[str, Any] = get_diet_info_data().to_dict(
+            'records'
+        )[0]
+        self.solvers: Dict[Any, Any] = {}
+
+    def run(
+            self,
+            max_jobs: Optional[int] = None,
+            idle_timeout: Optional[float] = None,
+    ) -> int:
+        """Solve jobs until `max_jobs` are done or the queue has had no job for
+        `idle_timeout` seconds (forever, by default). Returns the number of jobs
+        done."""
+        done = 0
+        idle_since = time.perf_counter()
+        while max_jobs is None or done < max_jobs:
+            job = self.queue.claim(self.worker_id, [self.catalog_version])
+            if job is None:
+                if (idle_timeout is not None
+                        and time.perf_counter() - idle_since > idle_timeout):
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            self.run_job(job)
+            done += 1
+            idle_since = time.perf_counter()
+        return done
+
+    def run_job(self, job: PlanJob) -> None:
+        """Solve a job claimed, and push its result (or its failure) to the queue.
+        Jobs that cannot be solved fail without retries, while unexpected errors are
+        retried (by any worker)."""
+        from feasibility import InfeasibleDietError
+
+        try:
+            result = self.solve(job)
+        except (InfeasibleDietError, ValueError) as error:
+            self.queue.fail(job.job_id, self.worker_id, str(error))
+        except Exception as error:
+            self.queue.fail(job.job_id, self.worker_id, repr(error), retry=True)
+        else:
+            if not self.queue.complete(job.job_id, self.worker_id, result):
+                print(f'Job {job.job_id} was given to another worker (lease expired).')
+
+    def solve(self, job: PlanJob) -> Dict[str, Any]:
+        """Solve the plan of a job within its timeout. Returns the plan found (see
+        `Plan.to_dict`) and whether it is proven optimal, raising `ValueError` if the
+        diet information is unknown or no diet is found."""
+        import pandas as pd
+        from batch import get_profile_solver
+        from data_builder import get_problem_data
+        from feasibility import assert_feasible
+        from solver_backends import SolverOptions
+
+        diet_info = dict(self.default_diet_info)
+        for name, value in job.diet_info.items():
+            if name not in diet_info:
+                raise ValueError(f'Unknown diet information: {name}')
+            diet_info[name] = value
+        assert_feasible(get_problem_data(
+            diet_info_df=pd.DataFrame([diet_info]),
+            catalog_data=self.catalog_data,
+        ))
+        options = SolverOptions(time_limit=job.timeout, threads=self.threads)
+        solver = get_profile_solver(
+            self.solvers, self.catalog_data, diet_info, options=options
+        )
+        solver.set_options(options)
+        solver.solve()
+        if not solver.solution_exists():
+            raise ValueError(f'No diet found ({solver.get_termination_condition()})')
+        return {
+            'optimal': solver.is_optimal(),
+            'plan': solver.get_plan().to_dict(),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Work queue of plan jobs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Serve a queue over TCP.')
+    serve_parser.add_argument('--db', required=True, help='SQLite file of the queue.')
+    serve_parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='Address to listen on. The queue has no authentication, so it is only '
+             'served to the local host unless another address is given (e.g. 0.0.0.0 '
+             'for every interface of a trusted network).',
+    )
+    serve_parser.add_argument('--port', type=int, default=8765, help='Port.')
+
+    queue_help = "Queue: 'tcp://host:port' or the path of a SQLite file."
+    worker_parser = subparsers.add_parser('worker', help='Solve the jobs of a queue.')
+    worker_parser.add_argument('--queue', required=True, help=queue_help)
+    worker_parser.add_argument('--dishes', default='dishes_db.json', help='Catalog.')
+    worker_parser.add_argument('--threads', type=int, help='Threads of the solver.')
+    worker_parser.add_argument('--max-jobs', type=int, help='Stop after N jobs.')
+    worker_parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        help='Stop after this time without jobs [s].',
+    )
+
+    submit_parser = subparsers.add_parser('submit', help='Submit plan jobs.')
+    submit_parser.add_argument('--queue', required=True, help=queue_help)
+    submit_parser.add_argument(
+        '--diet-info',
+        metavar='JSON',
+        type=json.loads,
+        default={},
+        help='Diet information that differs from the default one.',
+    )
+    catalog_group = submit_parser.add_mutually_exclusive_group()
+    catalog_group.add_argument('--dishes', default='dishes_db.json', help='Catalog.')
+    catalog_group.add_argument(
+        '--catalog-version',
+        help='Version of the catalog, as printed by the workers. Given it, the catalog '
+             'is not read, and the dependencies of the solver are not needed.',
+    )
+    submit_parser.add_argument('--count', type=int, default=1, help='Number of jobs.')
+    submit_parser.add_argument(
+        '--timeout',
+        type=float,
+        default=DEFAULT_JOB_TIMEOUT,
+        help='Timeout of each job [s].',
+    )
+    submit_parser.add_argument(
+        '--max-attempts',
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS,
+        help='Maximum number of attempts of each job.',
+    )
+
+    metrics_parser = subparsers.add_parser('metrics', help='Print the queue metrics.')
+    metrics_parser.add_argument('--queue', required=True, help=queue_help)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        with JobQueueServer((args.host, args.port), SQLiteJobQueue(args.db)) as server:
+            print(f'Serving {args.db} on {args.host}:{args.port}', flush=True)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    elif args.command == 'worker':
+        worker = PlanWorker(
+            get_job_queue(args.queue),
+            dishes_path=args.dishes,
+            threads=args.threads,
+        )
+        print(f'Worker {worker.worker_id}, catalog {worker.catalog_version}', flush=True)
+        jobs_done = worker.run(max_jobs=args.max_jobs, idle_timeout=args.idle_timeout)
+        print(f'{jobs_done} jobs done')
+    elif args.command == 'submit':
+        catalog_version = args.catalog_version
+        if catalog_version is None:
+            from data_builder import get_catalog_data
+
+            catalog_data = get_catalog_data(dishes_path=args.dishes)
+            catalog_version = get_catalog_version(catalog_data)
+        job_queue = get_job_queue(args.queue)
+        for _ in range(args.count):
+            print(job_queue.submit(PlanJob(
+                diet_info=args.diet_info,
+                catalog_version=catalog_version,
+                timeout=args.timeout,
+                max_attempts=args.max_attempts,
+            )))
+    else:
+        print(json.dumps(get_job_queue(args.queue).get_metrics(), indent=2))